@@ -0,0 +1,101 @@
+# benchmarks/bench_debt_queries.py
+#
+# Qarzdorlik so'rovlari uchun mikro-benchmark: sotuvchilar va mahsulotlar soni oshganda
+# queries.py dagi so'rovlar soni o'zgarmasligini (N+1 yo'qligini) tekshiradi.
+#
+# Ishga tushirish (loyiha papkasidan):
+#     pip install aiosqlite
+#     python benchmarks/bench_debt_queries.py
+#
+# Vaqtinchalik SQLite bazasi ishlatiladi, DATABASE_URL o'zgartirilmaydi.
+
+import os
+import sys
+import time
+import asyncio
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_db_file = os.path.join(tempfile.mkdtemp(prefix="bench_"), "bench.sqlite3")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{_db_file}"
+
+from db_models import Base, Seller, Product, SellerProduct
+from dbpool import get_engine, dispose_engine, start_query_count, stop_query_count
+from queries import seller_debt_totals, iter_seller_product_rows
+
+try:
+    # Eski usul bilan solishtirish uchun (har bir sotuvchi uchun alohida chaqiruv)
+    from db import get_seller_products_info
+except ImportError:
+    get_seller_products_info = None
+
+SIZES = [(10, 10), (100, 20), (1000, 20)] # (sotuvchilar, har biridagi mahsulotlar)
+PRODUCTS = 200
+
+
+async def seed(sellers: int, per_seller: int):
+    engine = get_engine()
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(Product.__table__.insert(), [
+            {"id": i, "name": f"Mahsulot {i}", "price": 1000 + i} for i in range(1, PRODUCTS + 1)
+        ])
+        await conn.execute(Seller.__table__.insert(), [
+            {"id": i, "name": f"Sotuvchi {i}", "neighborhood": f"Mahalla {i % 7}",
+             "phone_number": f"99890{i:07d}", "password": f"bench-{i}"}
+            for i in range(1, sellers + 1)
+        ])
+        await conn.execute(SellerProduct.__table__.insert(), [
+            {"seller_id": s, "product_id": (s * 7 + k) % PRODUCTS + 1, "quantity": k + 1}
+            for s in range(1, sellers + 1) for k in range(per_seller)
+        ])
+
+
+async def measure(coro_factory):
+    """(so'rovlar soni, soniya, natija)"""
+    token, counter = start_query_count()
+    started = time.perf_counter()
+    try:
+        result = await coro_factory()
+    finally:
+        stop_query_count(token)
+    return counter[0], time.perf_counter() - started, result
+
+
+async def collect_rows():
+    return [row async for row in iter_seller_product_rows()]
+
+
+async def legacy_totals(sellers: int):
+    return [await get_seller_products_info(seller_id) for seller_id in range(1, sellers + 1)]
+
+
+async def main():
+    print(f"{'sotuvchi':>9} {'qator':>7} | {'jami: so`rov':>12} {'ms':>8} | {'qatorlar: so`rov':>16} {'ms':>8} | {'eski: so`rov':>12} {'ms':>8}")
+    counts = set()
+    for sellers, per_seller in SIZES:
+        await seed(sellers, per_seller)
+        totals_q, totals_t, totals = await measure(seller_debt_totals)
+        rows_q, rows_t, rows = await measure(collect_rows)
+        assert len(totals) == sellers and len(rows) == sellers * per_seller
+        counts.add((totals_q, rows_q))
+
+        legacy = ""
+        if get_seller_products_info is not None:
+            legacy_q, legacy_t, _ = await measure(lambda: legacy_totals(sellers))
+            legacy = f"{legacy_q:>12} {legacy_t * 1000:>8.1f}"
+        print(
+            f"{sellers:>9} {sellers * per_seller:>7} | {totals_q:>12} {totals_t * 1000:>8.1f} | "
+            f"{rows_q:>16} {rows_t * 1000:>8.1f} | {legacy}"
+        )
+
+    await dispose_engine()
+    if len(counts) != 1:
+        sys.exit(f"XATO: so'rovlar soni hajmga bog'liq: {sorted(counts)}")
+    print("OK: so'rovlar soni sotuvchilar va mahsulotlar soniga bog'liq emas.")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
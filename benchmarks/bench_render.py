@@ -0,0 +1,109 @@
+# benchmarks/bench_render.py
+#
+# Hisobot matnini yig'ish uchun mikro-benchmark: render.py dagi shablonlar va
+# handlerlardagi eski usul (satrga ketma-ket qo'shish + butun blokka .replace(",", " "))
+# 1000 ta mahsulotli hisobotda solishtiriladi. Eski usul nomlarni ekranlamaydi, shuning
+# uchun render ning qo'shimcha ishi (Markdown ekranlash, har bir sonni alohida formatlash)
+# ham shu yerda ko'rinadi.
+#
+# Ishga tushirish (loyiha papkasidan):
+#     python benchmarks/bench_render.py
+
+import os
+import sys
+import timeit
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from render import render_seller_debt, render_seller_products, render_products
+
+ITEMS = 1000
+REPEAT = 5
+NUMBER = 20
+
+
+def make_items(count: int) -> list:
+    # Har 10-mahsulot nomida vergul bor - eski usul uni bo'sh joyga aylantirib yuboradi
+    items = []
+    for i in range(1, count + 1):
+        name = f"Mahsulot {i}, 1 kg" if i % 10 == 0 else f"Mahsulot {i}"
+        quantity, price = i % 50 + 1, 1000 + i * 37
+        items.append({'product_name': name, 'quantity': quantity, 'unit_price': price, 'subtotal': quantity * price})
+    return items
+
+
+# --- Eski usul (main.py dagi handlerlardan ko'chirilgan) ---
+
+def legacy_seller_debt(seller_name, neighborhood, products_list, goods_total, paid):
+    total_debt = goods_total - paid
+    text = f"💰 **{seller_name}** ({neighborhood}) dagi Mahsulotlar Ro'yxati:\n\n"
+    for i, item in enumerate(products_list, 1):
+        text += (
+            f"{i}. **{item['product_name']}**\n"
+            f"   Miqdor: {item['quantity']} dona\n"
+            f"   Narxi: {item['unit_price']:,} so'm (dona)\n"
+            f"   Summa: **{item['subtotal']:,} so'm**\n"
+        ).replace(",", " ")
+    text += "\n"
+    if paid:
+        text += f"Tovarlar summasi: {goods_total:,} so'm\nQabul qilingan to'lovlar: {paid:,} so'm\n".replace(",", " ")
+    text += f"**💵 JAMI QARZDORLIK SUMMASI:** **{total_debt:,} so'm**".replace(",", " ")
+    return text
+
+
+def legacy_seller_products(seller_name, products_list):
+    text = f"📦 **{seller_name}** dagi Mahsulotlaringiz:\n\n"
+    for i, item in enumerate(products_list, 1):
+        text += (
+            f"{i}. **{item['product_name']}** - {item['unit_price']:,} so'm\n"
+            f"   Miqdor: **{item['quantity']} dona**\n"
+        ).replace(",", " ")
+    return text
+
+
+def legacy_products(products):
+    lines = ["📋 **Barcha Mahsulotlar Ro'yxati:**", ""]
+    for i, prod in enumerate(products, 1):
+        formatted_price = f"{prod.price:,}".replace(",", " ")
+        lines.append(f"{i}. **{prod.name}** - *{formatted_price} so'm*")
+    return "\n".join(lines)
+
+
+def best_ms(func) -> float:
+    return min(timeit.repeat(func, repeat=REPEAT, number=NUMBER)) / NUMBER * 1000
+
+
+def main():
+    items = make_items(ITEMS)
+    goods_total = sum(item['subtotal'] for item in items)
+    paid = goods_total // 3
+    products = [SimpleNamespace(name=item['product_name'], price=item['unit_price']) for item in items]
+
+    cases = [
+        ("show_seller_debt",
+         lambda: legacy_seller_debt("Sotuvchi", "Mahalla", items, goods_total, paid),
+         lambda: render_seller_debt("Sotuvchi", "Mahalla", items, goods_total, paid)),
+        ("show_seller_products",
+         lambda: legacy_seller_products("Sotuvchi", items),
+         lambda: render_seller_products("Sotuvchi", items)),
+        ("show_all_products",
+         lambda: legacy_products(products),
+         lambda: render_products(products)),
+    ]
+
+    print(f"{ITEMS} ta mahsulot, {NUMBER} marta x {REPEAT} takror (eng yaxshi natija)")
+    print(f"{'hisobot':<22} {'eski, ms':>10} {'render, ms':>11} {'render/eski':>12}")
+    for name, legacy, new in cases:
+        legacy_ms, new_ms = best_ms(legacy), best_ms(new)
+        print(f"{name:<22} {legacy_ms:>10.3f} {new_ms:>11.3f} {new_ms / legacy_ms:>11.2f}x")
+
+    # Vergulli nom saqlanganini tekshirish
+    text = render_seller_products("Sotuvchi", items)
+    if "Mahsulot 10, 1 kg" not in text or "Mahsulot 10, 1 kg" in legacy_seller_products("Sotuvchi", items):
+        sys.exit("XATO: mahsulot nomidagi vergul kutilganidek ishlanmadi.")
+    print("OK: mahsulot nomlaridagi vergullar o'zgarmadi.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+# catalog.py
+
+import bisect
+import logging
+from collections import Counter
+from dataclasses import dataclass
+
+from sqlalchemy import select, update, case
+from sqlalchemy.dialects import postgresql, sqlite
+
+from db import get_all_products, get_or_create_product, get_product_by_name
+from db_models import Product
+from dbpool import get_engine
+
+logger = logging.getLogger(__name__)
+
+
+# --- 1. KESHLANGAN MAHSULOT ---
+
+@dataclass(frozen=True)
+class CachedProduct:
+    """Mahsulotning yengil nusxasi (ORM sessiyasiga bog'liq emas)."""
+    id: int
+    name: str
+    price: int
+
+
+def normalize_name(name: str) -> str:
+    """Mahsulot nomini qidiruv uchun bir xil ko'rinishga keltiradi (registr va bo'shliqlar)."""
+    return " ".join(name.split()).casefold()
+
+
+# Kirill -> lotin (o'zbek) transliteratsiyasi: "Олма" va "olma" bir xil qidiriladi
+_CYRILLIC_TO_LATIN = {
+    "а": "a", "б": "b", "в": "v", "г": "g", "д": "d", "е": "e", "ё": "yo", "ж": "j",
+    "з": "z", "и": "i", "й": "y", "к": "k", "л": "l", "м": "m", "н": "n", "о": "o",
+    "п": "p", "р": "r", "с": "s", "т": "t", "у": "u", "ф": "f", "х": "x", "ц": "s",
+    "ч": "ch", "ш": "sh", "щ": "sh", "ъ": "", "ы": "i", "ь": "", "э": "e", "ю": "yu",
+    "я": "ya", "ў": "o", "қ": "q", "ғ": "g", "ҳ": "h",
+}
+# Tutuq belgilari olib tashlanadi: o'/oʻ/o` -> o, g'/gʻ -> g
+for _apostrophe in "'`ʻʼ‘’":
+    _CYRILLIC_TO_LATIN[_apostrophe] = ""
+_FOLD_TABLE = str.maketrans(_CYRILLIC_TO_LATIN)
+
+
+def fold_name(name: str) -> str:
+    """Qidiruv uchun nomni soddalashtiradi: registr, kirill/lotin yozuvi va tutuq belgilari."""
+    return " ".join(name.casefold().translate(_FOLD_TABLE).split())
+
+
+def _trigrams(folded: str) -> set:
+    padded = f"  {folded} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+# --- 2. TEZKOR QIDIRUV INDEKSI ---
+
+class ProductSearchIndex:
+    """
+    Mahsulot nomlari bo'yicha trigram va prefiks indeksi.
+    Xato yozilgan yoki qisman kiritilgan nom uchun eng o'xshash mahsulotlarni topadi.
+    """
+
+    def __init__(self):
+        self._trigrams = {} # trigram -> {product_id}
+        self._folded = {} # product_id -> soddalashtirilgan nom
+        self._gram_counts = {} # product_id -> trigramlar soni (o'xshashlikni hisoblash uchun)
+        self._prefix_keys = None # [(soddalashtirilgan nom, product_id)] - bisect uchun
+
+    def add(self, product_id: int, name: str):
+        self.remove(product_id)
+        folded = fold_name(name)
+        self._folded[product_id] = folded
+        grams = _trigrams(folded)
+        self._gram_counts[product_id] = len(grams)
+        for gram in grams:
+            self._trigrams.setdefault(gram, set()).add(product_id)
+        self._prefix_keys = None
+
+    def remove(self, product_id: int):
+        folded = self._folded.pop(product_id, None)
+        if folded is None:
+            return
+        del self._gram_counts[product_id]
+        for gram in _trigrams(folded):
+            ids = self._trigrams.get(gram)
+            if ids:
+                ids.discard(product_id)
+                if not ids:
+                    del self._trigrams[gram]
+        self._prefix_keys = None
+
+    def clear(self):
+        self._trigrams.clear()
+        self._folded.clear()
+        self._gram_counts.clear()
+        self._prefix_keys = None
+
+    def search(self, query: str, limit: int = 5) -> list:
+        """Eng mos product_id lar ro'yxati (eng yaxshisi birinchi)."""
+        folded = fold_name(query)
+        if not folded:
+            return []
+
+        scores = {}
+
+        # 1. Prefiks bo'yicha moslik (nom shu so'rov bilan boshlanadi) - eng yuqori ball
+        if self._prefix_keys is None:
+            self._prefix_keys = sorted((name, pid) for pid, name in self._folded.items())
+        start = bisect.bisect_left(self._prefix_keys, (folded,))
+        for name, pid in self._prefix_keys[start:start + limit]:
+            if not name.startswith(folded):
+                break
+            scores[pid] = 2.0
+
+        # 2. Trigram o'xshashligi (Jaccard koeffitsienti) - imlo xatolariga chidamli
+        query_grams = _trigrams(folded)
+        shared = Counter()
+        for gram in query_grams:
+            shared.update(self._trigrams.get(gram, ()))
+        query_count = len(query_grams)
+        for pid, common in shared.items():
+            similarity = common / (query_count + self._gram_counts[pid] - common)
+            if similarity >= 0.2:
+                scores[pid] = max(scores.get(pid, 0.0), similarity)
+
+        best = sorted(scores.items(), key=lambda item: (-item[1], self._folded[item[0]]))
+        return [pid for pid, _ in best[:limit]]
+
+
+# --- 3. MAHSULOTLAR KATALOGI KESHI ---
+
+class ProductCache:
+    """
+    Mahsulotlar katalogini jarayon xotirasida saqlaydi (nom va ID bo'yicha).
+    init_db dan keyin bir marta yuklanadi, mahsulot yaratilganda yoki narxi
+    o'zgarganda darhol yangilanadi (write-through).
+    """
+
+    def __init__(self):
+        self._by_id = {}
+        self._by_name = {}
+        self._sorted = None # Ro'yxat ko'rinishi uchun (nom bo'yicha saralangan)
+        self._index = ProductSearchIndex()
+        self.loaded = False
+
+        # Statistika
+        self.hits = 0
+        self.misses = 0
+
+    async def load(self):
+        """Barcha mahsulotlarni DB dan bir marta yuklaydi."""
+        products = await get_all_products()
+        self._by_id.clear()
+        self._by_name.clear()
+        self._index.clear()
+        for product in products:
+            self.put(product)
+        self.loaded = True
+        logger.info(f"Mahsulotlar keshi yuklandi: {len(self._by_id)} ta mahsulot.")
+
+    def put(self, product) -> CachedProduct:
+        """Mahsulotni keshga yozadi (yangi yoki narxi o'zgargan)."""
+        cached = CachedProduct(id=product.id, name=product.name, price=product.price)
+        old = self._by_id.get(cached.id)
+        if old is not None and normalize_name(old.name) != normalize_name(cached.name):
+            self._by_name.pop(normalize_name(old.name), None)
+        self._by_id[cached.id] = cached
+        self._by_name[normalize_name(cached.name)] = cached
+        if old is None or old.name != cached.name:
+            self._index.add(cached.id, cached.name)
+        self._sorted = None
+        return cached
+
+    async def reprice(self, product_id: int, price: int) -> CachedProduct:
+        """
+        Mahsulot narxini o'zgartiradi (write-through): avval DB da bitta tranzaksiyada yangilanadi,
+        keyin keshga yoziladi. DB yozuvi muvaffaqiyatsiz bo'lsa, kesh o'zgarmaydi.
+        """
+        async with get_engine().begin() as conn:
+            result = await conn.execute(update(Product).where(Product.id == product_id).values(price=price))
+        if not result.rowcount:
+            raise LookupError(f"Mahsulot topilmadi: {product_id}")
+        product = self._by_id[product_id]
+        return self.put(CachedProduct(id=product.id, name=product.name, price=price))
+
+    def get_by_id(self, product_id: int):
+        """ID bo'yicha mahsulot (DB ga murojaat qilmaydi)."""
+        product = self._by_id.get(product_id)
+        self._count(product)
+        return product
+
+    def get_by_name(self, name: str):
+        """Nom bo'yicha mahsulot (DB ga murojaat qilmaydi)."""
+        product = self._by_name.get(normalize_name(name))
+        self._count(product)
+        return product
+
+    async def find_by_name(self, name: str):
+        """
+        Nom bo'yicha qidiradi. Keshda bo'lmasa (masalan, boshqa jarayon qo'shgan bo'lsa)
+        DB dan tekshiradi va topilganini keshga qo'shadi.
+        """
+        product = self.get_by_name(name)
+        if product is not None:
+            return product
+
+        product = await get_product_by_name(name)
+        return self.put(product) if product else None
+
+    async def upsert_many(self, items: list) -> list:
+        """
+        [(nomi, narx)] ni bitta tranzaksiyada yozadi: keshda bor mahsulotlar narxi bitta UPDATE bilan,
+        yangilari bitta INSERT ... ON CONFLICT (name) DO UPDATE bilan. Kesh RETURNING qatorlaridan,
+        tranzaksiya muvaffaqiyatli yakunlangandan keyin yangilanadi.
+        [(CachedProduct, holat)] qaytaradi, holat: "created", "updated" yoki "unchanged".
+        """
+        results, changed, fresh = [], {}, {}
+        for name, price in items:
+            product = self._by_name.get(normalize_name(name))
+            if product is None:
+                fresh[name] = price
+            elif product.price != price:
+                changed[product.id] = price
+            else:
+                results.append((product, "unchanged"))
+
+        written = []
+        async with get_engine().begin() as conn:
+            if changed:
+                rows = await conn.execute(
+                    update(Product).where(Product.id.in_(changed))
+                    .values(price=case(changed, value=Product.id))
+                    .returning(Product.id, Product.name, Product.price)
+                )
+                written += [(row, "updated") for row in rows]
+            if fresh:
+                # Boshqa jarayon qo'shgan (keshda yo'q) mahsulotlar ham shu yerda aniqlanadi
+                existing = dict((await conn.execute(
+                    select(Product.name, Product.price).where(Product.name.in_(fresh))
+                )).all())
+                dialect = postgresql if conn.dialect.name == "postgresql" else sqlite
+                stmt = dialect.insert(Product).values([{"name": name, "price": price} for name, price in fresh.items()])
+                stmt = stmt.on_conflict_do_update(index_elements=[Product.name], set_={"price": stmt.excluded.price})
+                for row in await conn.execute(stmt.returning(Product.id, Product.name, Product.price)):
+                    if row.name not in existing:
+                        written.append((row, "created"))
+                    else:
+                        written.append((row, "unchanged" if existing[row.name] == row.price else "updated"))
+
+        return results + [(self.put(row), status) for row, status in written]
+
+    async def get_or_create(self, name: str, price: int):
+        """get_or_create_product ni chaqiradi va natijani keshga yozadi."""
+        product, is_new = await get_or_create_product(name=name, price=price)
+        return self.put(product), is_new
+
+    def search(self, query: str, limit: int = 5) -> list:
+        """Nomi so'rovga eng o'xshash mahsulotlar (prefiks va imlo xatolarini hisobga oladi)."""
+        return [self._by_id[pid] for pid in self._index.search(query, limit)]
+
+    def all(self) -> list:
+        """Barcha mahsulotlar nom bo'yicha saralangan holda."""
+        if self._sorted is None:
+            self._sorted = sorted(self._by_id.values(), key=lambda p: (normalize_name(p.name), p.id))
+        return self._sorted
+
+    def _count(self, product):
+        if product is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def stats(self) -> dict:
+        """Kesh statistikasi."""
+        return {"size": len(self._by_id), "hits": self.hits, "misses": self.misses}
+
+
+# Butun jarayon uchun yagona kesh
+product_cache = ProductCache()
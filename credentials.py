@@ -0,0 +1,373 @@
+# credentials.py
+
+import os
+import hmac
+import time
+import base64
+import asyncio
+import hashlib
+import secrets
+import sqlite3
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import MetaData, Table, Column, Integer, BigInteger, String, Float, Boolean, select, insert, update, delete, or_
+from sqlalchemy.dialects import postgresql, sqlite
+
+from db_models import Seller
+from dbpool import get_engine, connection
+
+logger = logging.getLogger(__name__)
+
+# --- 1. SOZLAMALAR ---
+# Qidiruv kaliti (HMAC) uchun maxfiy kalit - majburiy. O'zgartirilsa, barcha sotuvchilar parolini tiklash kerak bo'ladi.
+PASSWORD_PEPPER = os.getenv("PASSWORD_PEPPER")
+# Oldingi versiyalardagi lokal xeshlar fayli. Bor bo'lsa, ishga tushishda asosiy DB ga bir marta ko'chiriladi.
+CREDENTIALS_DB_PATH = os.getenv("CREDENTIALS_DB_PATH", "credentials.sqlite3")
+CREDENTIALS_WORKERS = int(os.getenv("CREDENTIALS_WORKERS", "2"))
+
+# scrypt parametrlari (taxminan 16 MB xotira, bitta tekshiruv ~50 ms)
+SCRYPT_N, SCRYPT_R, SCRYPT_P = 2 ** 14, 8, 1
+
+# Noto'g'ri urinishlar: har bir telegram_id uchun LOGIN_MAX_ATTEMPTS ta urinish,
+# har LOGIN_REFILL_SECONDS soniyada bittadan tiklanadi
+LOGIN_MAX_ATTEMPTS = int(os.getenv("LOGIN_MAX_ATTEMPTS", "5"))
+LOGIN_REFILL_SECONDS = float(os.getenv("LOGIN_REFILL_SECONDS", "60"))
+
+# Bir martalik tiklash kodining amal qilish muddati (soniya)
+RESET_CODE_TTL = int(os.getenv("RESET_CODE_TTL", "86400"))
+
+# Seller.password ustunidagi ishlatib bo'lmaydigan qiymat prefiksi (parolning o'zi ham, kaliti ham saqlanmaydi)
+UNUSABLE_PASSWORD_PREFIX = "!"
+
+if not PASSWORD_PEPPER:
+    raise RuntimeError("PASSWORD_PEPPER o'rnatilmagan. Sotuvchi parollari uchun maxfiy kalitni muhit o'zgaruvchisida bering.")
+_pepper = PASSWORD_PEPPER.encode("utf-8")
+
+
+# --- 2. XESHLASH ---
+
+def lookup_key(password: str) -> str:
+    """
+    Parolning kalitli HMAC qiymati. DB dagi indekslangan ustunda saqlanadi va
+    tizimga kirishda sotuvchini O(1) topish uchun ishlatiladi (parolning o'zi saqlanmaydi).
+    """
+    return hmac.new(_pepper, password.encode("utf-8"), hashlib.sha256).hexdigest()
+
+
+def hash_password(password: str) -> str:
+    """Tuzli (salted) scrypt xeshi: "scrypt$N$r$p$tuz$xesh"."""
+    salt = secrets.token_bytes(16)
+    digest = hashlib.scrypt(password.encode("utf-8"), salt=salt, n=SCRYPT_N, r=SCRYPT_R, p=SCRYPT_P)
+    b64 = lambda value: base64.b64encode(value).decode("ascii")
+    return f"scrypt${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}${b64(salt)}${b64(digest)}"
+
+
+def verify_password(password: str, encoded: str) -> bool:
+    """Parolni saqlangan xesh bilan doimiy vaqtda (constant-time) solishtiradi."""
+    try:
+        _, n, r, p, salt, digest = encoded.split("$")
+        expected = base64.b64decode(digest)
+        actual = hashlib.scrypt(
+            password.encode("utf-8"), salt=base64.b64decode(salt), n=int(n), r=int(r), p=int(p), dklen=len(expected)
+        )
+    except (ValueError, TypeError):
+        return False
+    return hmac.compare_digest(actual, expected)
+
+
+# scrypt CPU va xotirani band qiladi - event loop to'xtab qolmasligi uchun alohida oqimlarda bajariladi
+_hash_pool = ThreadPoolExecutor(max_workers=max(1, CREDENTIALS_WORKERS), thread_name_prefix="password")
+
+
+async def hash_password_async(password: str) -> str:
+    return await asyncio.get_running_loop().run_in_executor(_hash_pool, hash_password, password)
+
+
+async def verify_password_async(password: str, encoded: str) -> bool:
+    return await asyncio.get_running_loop().run_in_executor(_hash_pool, verify_password, password, encoded)
+
+
+def new_reset_code() -> str:
+    """Sotuvchiga beriladigan bir martalik kod (8 raqam)."""
+    return f"{secrets.randbelow(10 ** 8):08d}"
+
+
+def unusable_password() -> str:
+    """Seller.password ustuniga yoziladigan tasodifiy qiymat - unga mos parol yo'q."""
+    return UNUSABLE_PASSWORD_PREFIX + secrets.token_hex(16)
+
+
+def _looks_like_key(value: str) -> bool:
+    # Oldingi versiya Seller.password ga lookup_key (64 ta hex belgi) yozgan - u parol sifatida qabul qilinmaydi
+    return len(value) == 64 and all(c in "0123456789abcdef" for c in value)
+
+
+# --- 3. XESHLAR OMBORI (ASOSIY DB) ---
+
+metadata = MetaData()
+
+seller_credentials = Table(
+    "seller_credentials", metadata,
+    Column("seller_id", Integer, primary_key=True, autoincrement=False),
+    Column("lookup_key", String(64), nullable=False, unique=True),
+    Column("password_hash", String(255), nullable=False),
+    Column("one_time", Boolean, nullable=False, default=False),
+    Column("expires_at", Float),
+    Column("updated_at", Float, nullable=False),
+)
+
+
+class CredentialStore:
+    """
+    seller_id -> (qidiruv kaliti, scrypt xeshi) asosiy DB da. Qidiruv kaliti UNIQUE indeksga ega,
+    shuning uchun kirishda sotuvchi bitta indeks so'rovi bilan topiladi.
+    Bir martalik (tiklash) kodlari muddati o'tgach o'qilmaydi va birinchi ishlatilishida o'chiriladi.
+    Seller.password ustunida parol ham, uning kaliti ham saqlanmaydi (unusable_password()).
+    """
+
+    async def create_tables(self):
+        """Jadvalni yaratadi (bor bo'lsa tegmaydi)."""
+        async with get_engine().begin() as conn:
+            await conn.run_sync(metadata.create_all)
+            await self._retire_seller_passwords(conn)
+
+    async def _retire_seller_passwords(self, conn):
+        # Xeshi bor sotuvchilarning Seller.password qiymati bitta UPDATE bilan yaroqsiz qilinadi: oldingi
+        # versiya bu ustunga lookup_key yozgan - uni bilgan odam u bilan kira olmasligi kerak.
+        # Qiymat har bir qator uchun alohida tasodifiy bo'lishi shart emas: "!" bilan boshlanadigan
+        # qiymat hech qachon parol sifatida qabul qilinmaydi (migrate_legacy ga qarang)
+        result = await conn.execute(
+            update(Seller)
+            .where(
+                Seller.id.in_(select(seller_credentials.c.seller_id)),
+                or_(Seller.password.is_(None), ~Seller.password.startswith(UNUSABLE_PASSWORD_PREFIX)),
+            )
+            .values(password=unusable_password())
+        )
+        if result.rowcount:
+            logger.info(f"{result.rowcount} ta sotuvchining Seller.password qiymati yaroqsiz qilindi.")
+
+    async def import_local(self, path: str = CREDENTIALS_DB_PATH) -> int:
+        """
+        Oldingi versiyadagi lokal xeshlar faylini asosiy DB ga ko'chiradi (DB da bor sotuvchilarga tegmaydi).
+        Ko'chirilgan fayl ".imported" nomi bilan qoldiriladi.
+        """
+        if not os.path.exists(path):
+            return 0
+
+        def read() -> list:
+            local = sqlite3.connect(path)
+            try:
+                return local.execute(
+                    "SELECT seller_id, lookup_key, password_hash, one_time, expires_at, updated_at FROM seller_credentials"
+                ).fetchall()
+            except sqlite3.OperationalError:
+                return []
+            finally:
+                local.close()
+
+        rows = await asyncio.to_thread(read)
+        async with get_engine().begin() as conn:
+            dialect = postgresql if conn.dialect.name == "postgresql" else sqlite
+            for seller_id, key, password_hash, one_time, expires_at, updated_at in rows:
+                await conn.execute(dialect.insert(seller_credentials).values(
+                    seller_id=seller_id, lookup_key=key, password_hash=password_hash, one_time=bool(one_time),
+                    expires_at=expires_at, updated_at=updated_at,
+                ).on_conflict_do_nothing())
+            await self._retire_seller_passwords(conn)
+        os.replace(path, path + ".imported")
+        logger.info(f"Lokal parol xeshlari asosiy DB ga ko'chirildi: {len(rows)} ta ({path}).")
+        return len(rows)
+
+    async def find(self, key: str):
+        """Qidiruv kaliti bo'yicha {'seller_id', 'password_hash', 'one_time'} yoki None."""
+        stmt = select(
+            seller_credentials.c.seller_id, seller_credentials.c.password_hash, seller_credentials.c.one_time
+        ).where(
+            seller_credentials.c.lookup_key == key,
+            or_(seller_credentials.c.expires_at.is_(None), seller_credentials.c.expires_at > time.time()),
+        )
+        async with get_engine().connect() as conn:
+            row = (await conn.execute(stmt)).first()
+        if row is None:
+            return None
+        return {"seller_id": row[0], "password_hash": row[1], "one_time": bool(row[2])}
+
+    async def is_taken(self, key: str, seller_id: int = None) -> bool:
+        """Bu kalit boshqa sotuvchiga tegishlimi (bir xil parol ikki sotuvchida bo'lmasligi kerak)."""
+        async with get_engine().connect() as conn:
+            owner = (await conn.execute(
+                select(seller_credentials.c.seller_id).where(seller_credentials.c.lookup_key == key)
+            )).scalar()
+        return owner is not None and owner != seller_id
+
+    async def put(self, seller_id: int, key: str, password_hash: str, one_time: bool = False, ttl: int = RESET_CODE_TTL,
+                  conn=None):
+        """
+        Sotuvchi xeshini yozadi (eskisi almashtiriladi). Kalit band bo'lsa IntegrityError.
+        Bir martalik kod yozilganda sotuvchining telegram bog'lanishi ham bekor qilinadi -
+        kod bilan kirgan akkaunt yangi parol o'rnatgandan keyin bog'lanadi.
+        conn berilsa, yozuv o'sha tranzaksiyada bajariladi (masalan, sotuvchini qo'shish bilan birga).
+        """
+        now = time.time()
+        values = {
+            "lookup_key": key, "password_hash": password_hash, "one_time": one_time,
+            "expires_at": now + ttl if one_time else None, "updated_at": now,
+        }
+        async with connection(conn, begin=True) as conn:
+            dialect = postgresql if conn.dialect.name == "postgresql" else sqlite
+            await conn.execute(
+                dialect.insert(seller_credentials).values(seller_id=seller_id, **values)
+                .on_conflict_do_update(index_elements=["seller_id"], set_=values)
+            )
+            if one_time:
+                await conn.execute(update(Seller).where(Seller.id == seller_id).values(telegram_id=None))
+
+    async def add_seller(self, name: str, neighborhood: str, phone_number: str, key: str, password_hash: str):
+        """
+        Yangi sotuvchini va uning parol xeshini bitta tranzaksiyada qo'shadi - xato bo'lsa (telefon yoki
+        kalit band) parolsiz sotuvchi qolmaydi. (id, name, neighborhood, phone_number) qatorini qaytaradi.
+        """
+        async with get_engine().begin() as conn:
+            seller = (await conn.execute(
+                insert(Seller)
+                .values(name=name, neighborhood=neighborhood, phone_number=phone_number, password=unusable_password())
+                .returning(Seller.id, Seller.name, Seller.neighborhood, Seller.phone_number)
+            )).one()
+            await self.put(seller.id, key, password_hash, conn=conn)
+        return seller
+
+    async def consume_one_time(self, seller_id: int, key: str) -> bool:
+        """
+        Bir martalik kodni bitta atomik DELETE bilan o'chiradi. Faqat bitta urinish True oladi -
+        kodni ikkinchi marta (yoki parallel ravishda) ishlatib bo'lmaydi.
+        """
+        async with get_engine().begin() as conn:
+            result = await conn.execute(delete(seller_credentials).where(
+                seller_credentials.c.seller_id == seller_id,
+                seller_credentials.c.lookup_key == key,
+                seller_credentials.c.one_time.is_(True),
+                seller_credentials.c.expires_at > time.time(),
+            ))
+        return result.rowcount == 1
+
+    async def link_telegram(self, seller_id: int, telegram_id: int) -> bool:
+        """Sotuvchini telegram_id ga bog'laydi. Boshqa akkauntga bog'langan bo'lsa False."""
+        async with get_engine().begin() as conn:
+            result = await conn.execute(
+                update(Seller)
+                .where(Seller.id == seller_id, or_(Seller.telegram_id.is_(None), Seller.telegram_id == telegram_id))
+                .values(telegram_id=telegram_id)
+            )
+        return result.rowcount == 1
+
+    async def migrate_legacy(self, password: str):
+        """
+        Xeshlashdan oldin qo'shilgan (Seller.password da parol ochiq turgan) sotuvchi birinchi
+        kirganda xeshga o'tkaziladi: xesh yoziladi, Seller.password esa yaroqsiz qiymat bilan almashtiriladi.
+        Faqat xeshi hali yo'q sotuvchilar tekshiriladi. seller_id yoki None qaytaradi.
+        """
+        if password.startswith(UNUSABLE_PASSWORD_PREFIX) or _looks_like_key(password):
+            return None
+        legacy = (
+            select(Seller.id)
+            .outerjoin(seller_credentials, seller_credentials.c.seller_id == Seller.id)
+            .where(Seller.password == password, seller_credentials.c.seller_id.is_(None))
+        )
+        async with get_engine().connect() as conn:
+            seller_id = (await conn.execute(legacy)).scalar()
+        if seller_id is None:
+            return None
+
+        password_hash = await hash_password_async(password)
+        async with get_engine().begin() as conn:
+            # Tekshiruv qulf ostida takrorlanadi - parallel kirishda faqat bittasi ko'chiradi.
+            # SQLite FOR UPDATE ni e'tiborsiz qoldiradi, u yerda yozish qulfi bo'sh UPDATE bilan olinadi
+            if conn.dialect.name == "sqlite":
+                await conn.execute(update(Seller).where(Seller.id == seller_id).values(id=Seller.id))
+            if (await conn.execute(legacy.where(Seller.id == seller_id).with_for_update(of=Seller))).scalar() is None:
+                return None
+            await conn.execute(seller_credentials.insert().values(
+                seller_id=seller_id, lookup_key=lookup_key(password), password_hash=password_hash,
+                one_time=False, expires_at=None, updated_at=time.time(),
+            ))
+            await conn.execute(update(Seller).where(Seller.id == seller_id).values(password=unusable_password()))
+        logger.info(f"Sotuvchi {seller_id} paroli xeshga o'tkazildi.")
+        return seller_id
+
+    async def authenticate(self, password: str, telegram_id: int):
+        """
+        Parolni tekshiradi: (seller_id, bir martalik kodmi) yoki (None, False).
+        Oddiy parolda sotuvchi darhol telegram_id ga bog'lanadi. Bir martalik kod shu yerda
+        o'chiriladi, bog'lash esa yangi parol saqlangandan keyin bajariladi.
+        """
+        key = lookup_key(password)
+        credential = await self.find(key)
+        if credential is None:
+            seller_id = await self.migrate_legacy(password)
+            if seller_id is not None:
+                credential = {"seller_id": seller_id, "one_time": False}
+            else:
+                # Parallel kirish shu parolni endigina xeshga o'tkazgan bo'lishi mumkin
+                credential = await self.find(key)
+                if credential is None:
+                    return None, False
+        if "password_hash" in credential and not await verify_password_async(password, credential['password_hash']):
+            return None, False
+
+        seller_id = credential['seller_id']
+        if credential['one_time']:
+            return (seller_id, True) if await self.consume_one_time(seller_id, key) else (None, False)
+        if not await self.link_telegram(seller_id, telegram_id):
+            return None, False
+        return seller_id, False
+
+
+# --- 4. NOTO'G'RI URINISHLARNI CHEKLASH ---
+
+class LoginThrottle:
+    """
+    Har bir telegram_id uchun token bucket: faqat noto'g'ri urinishlar token sarflaydi.
+    Tokenlar tugasa, keyingisi tiklanguncha parol tekshirilmaydi (scrypt ham ishlamaydi).
+    """
+
+    def __init__(self, capacity: int = LOGIN_MAX_ATTEMPTS, refill_seconds: float = LOGIN_REFILL_SECONDS,
+                 max_users: int = 10000):
+        self.capacity = max(1, capacity)
+        self.refill_seconds = refill_seconds
+        self.max_users = max_users
+        self._buckets = {} # telegram_id -> (tokenlar, oxirgi yangilanish)
+
+        # Statistika
+        self.blocked = 0
+
+    def _tokens(self, user_id: int, now: float) -> float:
+        tokens, updated = self._buckets.get(user_id, (self.capacity, now))
+        return min(self.capacity, tokens + (now - updated) / self.refill_seconds)
+
+    def retry_after(self, user_id: int) -> float:
+        """0 - urinish mumkin, aks holda necha soniya kutish kerak."""
+        now = time.monotonic()
+        tokens = self._tokens(user_id, now)
+        if tokens >= 1:
+            return 0.0
+        self.blocked += 1
+        return (1 - tokens) * self.refill_seconds
+
+    def fail(self, user_id: int):
+        now = time.monotonic()
+        self._buckets[user_id] = (self._tokens(user_id, now) - 1, now)
+        if len(self._buckets) > self.max_users:
+            # To'lib qolgan (to'liq tiklangan) chelaklarni tashlab yuboramiz
+            self._buckets = {
+                uid: bucket for uid, bucket in self._buckets.items() if self._tokens(uid, now) < self.capacity
+            }
+
+    def reset(self, user_id: int):
+        self._buckets.pop(user_id, None)
+
+
+# Butun jarayon uchun yagona ombor va cheklovchi
+credential_store = CredentialStore()
+login_throttle = LoginThrottle()
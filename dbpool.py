@@ -0,0 +1,189 @@
+# dbpool.py
+
+import os
+import time
+import logging
+import contextvars
+import contextlib
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.pool import Pool, AsyncAdaptedQueuePool
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+logger = logging.getLogger(__name__)
+
+# --- 1. SOZLAMALAR ---
+DATABASE_URL = os.getenv("DATABASE_URL")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5")) # doimiy ochiq ulanishlar
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "5")) # yuklama oshganda qo'shimcha ulanishlar
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10")) # bo'sh ulanishni kutish (soniya)
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800")) # server uzib qo'ymasidan oldin yangilash
+DB_POOL_USE_LIFO = os.getenv("DB_POOL_USE_LIFO", "1") == "1" # oxirgi qaytgan ulanish birinchi beriladi (ortiqchasi bo'sh turib yopiladi)
+DB_QUERY_CACHE_SIZE = int(os.getenv("DB_QUERY_CACHE_SIZE", "500")) # SQLAlchemy kompilyatsiya qilingan so'rovlar keshi
+DB_PREPARED_STATEMENT_CACHE_SIZE = int(os.getenv("DB_PREPARED_STATEMENT_CACHE_SIZE", "256")) # asyncpg, har bir ulanishda
+
+# Bitta update (handler) uchun so'rovlar chegarasi - oshsa ogohlantirish yoziladi (N+1 belgisi)
+DB_QUERY_BUDGET = int(os.getenv("DB_QUERY_BUDGET", "20"))
+
+
+# --- 2. ULANISHLAR HOVUZI (POOL) ---
+
+class PoolMetrics:
+    """Hovuz ko'rsatkichlari: band ulanishlar, ulanish kutish vaqti va kutishlar soni."""
+
+    def __init__(self):
+        self.in_use = 0
+        self.max_in_use = 0
+        self.checkouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.timeouts = 0
+
+    def record_wait(self, seconds: float):
+        self.wait_total += seconds
+        self.wait_max = max(self.wait_max, seconds)
+
+    def stats(self) -> dict:
+        return {
+            "in_use": self.in_use,
+            "max_in_use": self.max_in_use,
+            "checkouts": self.checkouts,
+            "avg_wait_ms": round(self.wait_total / self.checkouts * 1000, 2) if self.checkouts else 0.0,
+            "max_wait_ms": round(self.wait_max * 1000, 2),
+            "timeouts": self.timeouts,
+        }
+
+
+pool_metrics = PoolMetrics()
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """Bo'sh ulanish kutilgan vaqtni o'lchaydigan hovuz (create_async_engine(poolclass=...) orqali)."""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except Exception:
+            pool_metrics.timeouts += 1
+            raise
+        finally:
+            pool_metrics.record_wait(time.perf_counter() - started)
+
+
+# Pool sinfiga ulangan - qaysi hovuz bo'lishidan qat'i nazar band ulanishlar hisoblanadi
+@event.listens_for(Pool, "checkout")
+def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+    pool_metrics.checkouts += 1
+    pool_metrics.in_use += 1
+    pool_metrics.max_in_use = max(pool_metrics.max_in_use, pool_metrics.in_use)
+
+
+@event.listens_for(Pool, "checkin")
+def _on_checkin(dbapi_connection, connection_record):
+    pool_metrics.in_use -= 1
+
+
+def engine_options(url: str) -> dict:
+    """
+    create_async_engine() parametrlari: hovuz (DB_* sozlamalari) va so'rovlar keshlari.
+    Xotiradagi SQLite hovuzsiz (bitta ulanish) ishlaydi - unga hovuz parametrlari berilmaydi.
+    """
+    url = make_url(url)
+    options = {"query_cache_size": DB_QUERY_CACHE_SIZE}
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        return options
+
+    options.update(
+        poolclass=InstrumentedPool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=True, # uzilgan ulanish so'rovdan oldin aniqlanadi va almashtiriladi
+        pool_use_lifo=DB_POOL_USE_LIFO,
+    )
+    if url.get_driver_name() == "asyncpg":
+        # Server tomonida tayyorlangan so'rovlar (PREPARE) keshi - takroriy so'rovlar qayta tahlil qilinmaydi
+        options["connect_args"] = {"prepared_statement_cache_size": DB_PREPARED_STATEMENT_CACHE_SIZE}
+    return options
+
+
+_engine = None
+_sessionmaker = None
+
+
+def get_engine():
+    """
+    Jarayon uchun yagona engine (DATABASE_URL, birinchi chaqiruvda yaratiladi).
+    Bot modullari (history, ledger, credentials, catalog, queries) shu hovuzdan foydalanadi.
+    """
+    global _engine
+    if _engine is None:
+        if not DATABASE_URL:
+            raise RuntimeError("DATABASE_URL sozlanmagan.")
+        options = engine_options(DATABASE_URL)
+        _engine = create_async_engine(DATABASE_URL, **options)
+        logger.info(
+            f"DB hovuzi: {DB_POOL_SIZE} + {DB_MAX_OVERFLOW} ulanish, kutish {DB_POOL_TIMEOUT} s, "
+            f"yangilash {DB_POOL_RECYCLE} s, so'rovlar keshi {DB_QUERY_CACHE_SIZE}"
+            if "poolclass" in options else f"DB: hovuzsiz ulanish, so'rovlar keshi {DB_QUERY_CACHE_SIZE}"
+        )
+    return _engine
+
+
+def get_sessionmaker():
+    """Umumiy engine ustidagi AsyncSession fabrikasi."""
+    global _sessionmaker
+    if _sessionmaker is None:
+        _sessionmaker = async_sessionmaker(get_engine(), expire_on_commit=False)
+    return _sessionmaker
+
+
+@contextlib.asynccontextmanager
+async def connection(conn=None, begin: bool = False):
+    """
+    Umumiy engine ulanishi. conn berilsa, o'sha ulanish (va uning tranzaksiyasi) ishlatiladi -
+    bir nechta modul yozuvlari bitta tranzaksiyaga birlashadi. begin=True - yozish uchun tranzaksiya.
+    """
+    if conn is not None:
+        yield conn
+    elif begin:
+        async with get_engine().begin() as new_conn:
+            yield new_conn
+    else:
+        async with get_engine().connect() as new_conn:
+            yield new_conn
+
+
+async def dispose_engine():
+    """Bot to'xtaganda hovuzdagi ulanishlarni yopadi (keyingi get_engine() yangi engine yaratadi)."""
+    global _engine, _sessionmaker
+    if _engine is not None:
+        await _engine.dispose()
+        _engine = _sessionmaker = None
+
+
+# --- 3. SO'ROVLAR HISOBLAGICHI ---
+
+# Joriy update uchun hisoblagich (ro'yxat - fon vazifalari ham shu obyektni ko'radi)
+_query_count = contextvars.ContextVar("db_query_count", default=None)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    # Engine sinfiga ulangan - barcha so'rovlar (db.py engine i ham) hisoblanadi
+    counter = _query_count.get()
+    if counter is not None:
+        counter[0] += 1
+
+
+def start_query_count():
+    """Yangi hisoblagichni boshlaydi: (token, hisoblagich)."""
+    counter = [0]
+    return _query_count.set(counter), counter
+
+
+def stop_query_count(token):
+    _query_count.reset(token)
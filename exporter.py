@@ -0,0 +1,182 @@
+# exporter.py
+
+import os
+import csv
+import asyncio
+import shlex
+import datetime
+import tempfile
+import logging
+from dataclasses import dataclass
+
+from queries import iter_seller_product_rows, seller_balances, find_seller_ids
+from history import PAYMENT_NOTE
+
+# Tashqi kutubxona (faqat .xlsx eksport uchun)
+# pip install openpyxl
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+logger = logging.getLogger(__name__)
+
+# Faylga bir marta (alohida oqimda) yoziladigan qatorlar soni
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+
+DEBT_COLUMNS = ["Sotuvchi", "Mahalla", "Mahsulot", "Miqdor", "Narxi", "Summa"]
+HISTORY_COLUMNS = ["Sana/Vaqt", "Sotuvchi", "Mahsulot", "Miqdor", "Narxi", "Jami Summa", "Izoh", "Tranzaksiya ID"]
+
+
+# --- 1. BUYRUQ PARAMETRLARI ---
+
+@dataclass
+class ExportFilters:
+    kind: str = "qarz" # "qarz" yoki "tarix"
+    fmt: str = "csv" # "csv" yoki "xlsx"
+    seller: str = None
+    neighborhood: str = None
+    date_from: datetime.date = None
+    date_to: datetime.date = None # shu kun ham kiradi
+
+
+def parse_export_args(args: str) -> ExportFilters:
+    """
+    /export buyrug'i parametrlarini o'qiydi, masalan:
+        /export qarz xlsx mahalla="Yangi hayot"
+        /export tarix dan=2026-10-01 gacha=2026-10-31 sotuvchi=Ali
+    Noto'g'ri parametr bo'lsa ValueError ko'taradi.
+    """
+    filters = ExportFilters()
+    for token in shlex.split(args or ""):
+        key, _, value = token.partition("=")
+        key = key.lower()
+        if not value:
+            if key in ("qarz", "tarix"):
+                filters.kind = key
+            elif key in ("csv", "xlsx"):
+                filters.fmt = key
+            else:
+                raise ValueError(f"Noma'lum parametr: {token}")
+        elif key == "sotuvchi":
+            filters.seller = value
+        elif key == "mahalla":
+            filters.neighborhood = value
+        elif key == "dan":
+            filters.date_from = datetime.date.fromisoformat(value)
+        elif key == "gacha":
+            filters.date_to = datetime.date.fromisoformat(value)
+        else:
+            raise ValueError(f"Noma'lum parametr: {token}")
+
+    if filters.fmt == "xlsx" and openpyxl is None:
+        raise ValueError("XLSX uchun openpyxl kutubxonasi o'rnatilmagan. csv tanlang.")
+    return filters
+
+
+# --- 2. QATORLAR GENERATORLARI ---
+# Sotuvchi/mahalla filtri avval sotuvchi ID lariga aylantiriladi va so'rovlarning o'zida
+# (WHERE seller_id IN ...) qo'llanadi - filtrlanmagan qatorlar DB dan o'qilmaydi.
+
+async def _filtered_seller_ids(filters: ExportFilters):
+    if not filters.seller and not filters.neighborhood:
+        return None
+    return await find_seller_ids(filters.seller, filters.neighborhood)
+
+
+async def iter_debt_rows(filters: ExportFilters):
+    """
+    Sotuvchilardagi mahsulotlar va qarzdorlik qatorlari (bitta JOIN so'rovi, oqim bilan o'qiladi).
+    Har bir sotuvchi qatorlaridan keyin qabul qilingan to'lovlar manfiy summa bilan yoziladi -
+    "Summa" ustunining yig'indisi qarzdorlik daftaridagi balansga teng.
+    """
+    seller_ids = await _filtered_seller_ids(filters)
+
+    # To'lov qilgan sotuvchilar: seller_id -> (seller_id, ism, mahalla, tovarlar, to'lovlar)
+    paid = {row[0]: row for row in await seller_balances(seller_ids) if row[4]}
+    previous = None
+    async for seller_id, name, hood, product_name, quantity, unit_price, subtotal in iter_seller_product_rows(seller_ids=seller_ids):
+        if previous != seller_id and previous in paid:
+            yield _payment_row(paid.pop(previous))
+        previous = seller_id
+        yield [name, hood, product_name, quantity, unit_price, subtotal]
+    if previous in paid:
+        yield _payment_row(paid.pop(previous))
+
+    # Tovari qolmagan, lekin to'lov qilgan sotuvchilar
+    for row in paid.values():
+        yield _payment_row(row)
+
+
+def _payment_row(balance_row) -> list:
+    _, name, hood, _, paid = balance_row
+    return [name, hood, PAYMENT_NOTE, "", "", -paid]
+
+
+async def iter_history_rows(filters: ExportFilters, history):
+    """
+    Tovar berish tarixi. history.iter_between(start_ts, end_ts) qatorlarni
+    asosiy DB dan bo'laklab o'qiydigan manba (history.HandoutHistory).
+    """
+    start = datetime.datetime.combine(filters.date_from or datetime.date(2000, 1, 1), datetime.time())
+    end_date = (filters.date_to or datetime.date.today()) + datetime.timedelta(days=1)
+    end = datetime.datetime.combine(end_date, datetime.time())
+
+    seller_ids = await _filtered_seller_ids(filters)
+    async for row in history.iter_between(start.timestamp(), end.timestamp(), seller_ids=seller_ids):
+        yield row
+
+
+# --- 3. FAYLGA YOZISH ---
+# Qatorlar DB dan async o'qiladi, faylga yozish (csv / openpyxl) esa EXPORT_BATCH_SIZE talik
+# bo'laklar bilan alohida oqimda (asyncio.to_thread) bajariladi - katta eksport event loop ni band qilmaydi.
+
+async def _batches(rows, size: int = EXPORT_BATCH_SIZE):
+    batch = []
+    async for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _append_rows(sheet, rows: list):
+    for row in rows:
+        sheet.append(row)
+
+
+async def write_export(rows, columns: list, fmt: str) -> str:
+    """
+    Qatorlarni vaqtinchalik faylga oqim bilan yozadi va fayl yo'lini qaytaradi.
+    Faylni yuborgandan keyin o'chirish chaqiruvchining vazifasi.
+    """
+    suffix = f".{fmt}"
+    handle, path = tempfile.mkstemp(suffix=suffix, prefix="export_")
+    os.close(handle)
+    count = 0
+
+    try:
+        if fmt == "xlsx":
+            # write_only rejimida qatorlar xotirada to'planmaydi
+            workbook = openpyxl.Workbook(write_only=True)
+            sheet = workbook.create_sheet()
+            sheet.append(columns)
+            async for batch in _batches(rows):
+                await asyncio.to_thread(_append_rows, sheet, batch)
+                count += len(batch)
+            await asyncio.to_thread(workbook.save, path)
+        else:
+            with open(path, "w", encoding="utf-8-sig", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow(columns)
+                async for batch in _batches(rows):
+                    await asyncio.to_thread(writer.writerows, batch)
+                    count += len(batch)
+    except Exception:
+        os.remove(path)
+        raise
+
+    logger.info(f"Eksport tayyor: {path} ({count} qator)")
+    return path
@@ -0,0 +1,146 @@
+# fsm_storage.py
+
+import os
+import json
+import time
+import sqlite3
+import asyncio
+import logging
+from typing import Any, Dict, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StorageKey, StateType
+from aiogram.fsm.storage.memory import MemoryStorage
+
+logger = logging.getLogger(__name__)
+
+# --- 1. SOZLAMALAR ---
+# FSM_STORAGE: "memory" (standart, sinov uchun), "sqlite" (qayta ishga tushishda saqlanadi)
+# yoki "redis" (bir nechta jarayon bitta holatni ulashadi, REDIS_URL kerak).
+FSM_STORAGE = os.getenv("FSM_STORAGE", "memory")
+FSM_STORAGE_PATH = os.getenv("FSM_STORAGE_PATH", "fsm.sqlite3")
+REDIS_URL = os.getenv("REDIS_URL")
+# Tashlab ketilgan jarayonlar (masalan, yarmida qolgan sotuvchi qo'shish) shuncha soniyadan keyin o'chadi
+FSM_STATE_TTL = int(os.getenv("FSM_STATE_TTL", "86400"))
+
+
+def _key(key: StorageKey) -> str:
+    return f"{key.bot_id}:{key.chat_id}:{key.user_id}:{key.thread_id or ''}:{key.destiny}"
+
+
+def _dumps(data: Dict[str, Any]) -> str:
+    # Ixcham JSON: bo'shliqlarsiz, kirill/lotin harflari escape qilinmaydi
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+
+# --- 2. SQLITE OMBORI ---
+
+class SQLiteStorage(BaseStorage):
+    """
+    FSM holati va ma'lumotlarini SQLite faylida saqlaydi.
+    Bot qayta ishga tushganda ham boshlangan admin jarayonlari davom etadi.
+    TTL dan eski yozuvlar o'qilmaydi va vaqti-vaqti bilan o'chiriladi.
+    sqlite3 chaqiruvlari event loop ni to'xtatmasligi uchun alohida oqimda (asyncio.to_thread)
+    bajariladi; ulanishga bir vaqtda bitta so'rov kiradi (asyncio.Lock).
+    """
+
+    def __init__(self, path: str = FSM_STORAGE_PATH, ttl: int = FSM_STATE_TTL):
+        self.ttl = ttl
+        # Qulf birinchi so'rovda, ishlayotgan event loop ichida yaratiladi
+        self._lock = None
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS fsm (
+                key TEXT PRIMARY KEY,
+                state TEXT,
+                data TEXT,
+                updated_at REAL NOT NULL
+            )
+            """
+        )
+        self._next_purge = 0.0
+
+    def _expired_before(self) -> float:
+        return time.time() - self.ttl
+
+    def _query(self, sql: str, params: tuple):
+        # Oqim ichida bajariladi: SELECT uchun birinchi qator, qolganlari uchun o'zgargan qatorlar soni
+        cursor = self._conn.execute(sql, params)
+        return cursor.fetchone() if sql.startswith("SELECT") else cursor.rowcount
+
+    async def _execute(self, sql: str, params: tuple):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            return await asyncio.to_thread(self._query, sql, params)
+
+    async def _read(self, key: StorageKey):
+        return await self._execute(
+            "SELECT state, data FROM fsm WHERE key = ? AND updated_at >= ?",
+            (_key(key), self._expired_before()),
+        )
+
+    async def _purge_expired(self):
+        # Eskirgan yozuvlarni soatiga bir martadan ko'p bo'lmagan holda tozalash
+        now = time.time()
+        if now < self._next_purge:
+            return
+        self._next_purge = now + 3600
+        deleted = await self._execute("DELETE FROM fsm WHERE updated_at < ?", (self._expired_before(),))
+        if deleted:
+            logger.info(f"FSM: {deleted} ta eskirgan holat o'chirildi.")
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        state = state.state if isinstance(state, State) else state
+        await self._execute(
+            "INSERT INTO fsm (key, state, data, updated_at) VALUES (?, ?, '{}', ?) "
+            "ON CONFLICT(key) DO UPDATE SET state = excluded.state, updated_at = excluded.updated_at",
+            (_key(key), state, time.time()),
+        )
+        await self._purge_expired()
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        row = await self._read(key)
+        return row[0] if row else None
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        await self._execute(
+            "INSERT INTO fsm (key, state, data, updated_at) VALUES (?, NULL, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at",
+            (_key(key), _dumps(data), time.time()),
+        )
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        row = await self._read(key)
+        return json.loads(row[1]) if row and row[1] else {}
+
+    async def close(self) -> None:
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            await asyncio.to_thread(self._conn.close)
+
+
+# --- 3. OMBORNI TANLASH ---
+
+def create_storage() -> BaseStorage:
+    """FSM_STORAGE sozlamasiga ko'ra FSM omborini yaratadi."""
+    if FSM_STORAGE == "sqlite":
+        logger.info(f"FSM ombori: SQLite ({FSM_STORAGE_PATH}), TTL {FSM_STATE_TTL} s")
+        return SQLiteStorage()
+
+    if FSM_STORAGE == "redis":
+        if not REDIS_URL:
+            logger.error("FSM_STORAGE=redis, lekin REDIS_URL berilmagan. Xotiradagi ombor ishlatiladi.")
+            return MemoryStorage()
+        # pip install redis
+        from aiogram.fsm.storage.redis import RedisStorage
+        logger.info(f"FSM ombori: Redis, TTL {FSM_STATE_TTL} s")
+        return RedisStorage.from_url(REDIS_URL, state_ttl=FSM_STATE_TTL, data_ttl=FSM_STATE_TTL)
+
+    if FSM_STORAGE != "memory":
+        logger.warning(f"Noma'lum FSM_STORAGE qiymati: {FSM_STORAGE}. Xotiradagi ombor ishlatiladi.")
+    return MemoryStorage()
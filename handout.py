@@ -0,0 +1,98 @@
+# handout.py
+
+import os
+from dataclasses import dataclass
+
+from catalog import ProductCache
+from render import number, som, escape_md
+
+# --- 1. SOZLAMALAR ---
+# Bitta xabarda nechta qator (mahsulot) qabul qilinadi
+BULK_HANDOUT_MAX_LINES = int(os.getenv("BULK_HANDOUT_MAX_LINES", "200"))
+
+
+# --- 2. KO'P QATORLI TOVAR BERISH RO'YXATINI TAHLIL QILISH ---
+
+@dataclass
+class HandoutLine:
+    """Ro'yxatdagi bitta qator: mahsulot, miqdor va (yangi mahsulot uchun) narx."""
+    line_no: int
+    name: str
+    quantity: int
+    price: int
+    product: object = None # CachedProduct, yangi mahsulot bo'lsa None
+
+    @property
+    def total_cost(self) -> int:
+        return self.quantity * self.price
+
+
+def _positive_int(token: str):
+    # isdigit() "²" kabi belgilarni ham qabul qiladi, int() esa ularni o'qiy olmaydi
+    token = token.replace("_", "")
+    if not token.isdecimal():
+        return None
+    try:
+        value = int(token)
+    except ValueError:
+        return None
+    return value if value > 0 else None
+
+
+def parse_handout_lines(text: str, catalog: ProductCache):
+    """
+    Har bir qator: `nomi miqdor [narx]`. Masalan:
+        Olma 10
+        Shakar 1 kg 5 14000
+    Mavjud mahsulotlar katalog narxi bilan olinadi, yangi mahsulot uchun narx majburiy.
+    (qatorlar, xatolar) qaytaradi; xato bo'lsa hech narsa yozilmasligi kerak.
+    Xato matnlari parse_mode="Markdown" bilan yuboriladi - foydalanuvchi yozgan nomlar ekranlanadi.
+    """
+    lines, errors = [], []
+    raw_lines = [line.strip() for line in text.splitlines()]
+    numbered = [(i, line) for i, line in enumerate(raw_lines, 1) if line]
+
+    if not numbered:
+        return [], ["Ro'yxat bo'sh."]
+    if len(numbered) > BULK_HANDOUT_MAX_LINES:
+        return [], [f"Ro'yxat juda uzun: {len(numbered)} qator (maksimal {BULK_HANDOUT_MAX_LINES})."]
+
+    for line_no, line in numbered:
+        tokens = line.split()
+        if len(tokens) < 2:
+            errors.append(f"{line_no}-qator: `nomi miqdor [narx]` ko'rinishida yozing.")
+            continue
+
+        # 1-variant: oxirgi ikki so'z - miqdor va narx. 2-variant: oxirgi so'z - miqdor.
+        # Nomi raqam bilan tugaydigan mahsulotlar uchun avval katalogda borini tanlaymiz.
+        candidates = []
+        if len(tokens) >= 3 and _positive_int(tokens[-2]) and _positive_int(tokens[-1]):
+            candidates.append((" ".join(tokens[:-2]), _positive_int(tokens[-2]), _positive_int(tokens[-1])))
+        if _positive_int(tokens[-1]):
+            candidates.append((" ".join(tokens[:-1]), _positive_int(tokens[-1]), None))
+        if not candidates:
+            errors.append(f"{line_no}-qator: miqdor musbat butun son bo'lishi kerak.")
+            continue
+
+        for name, qty, price in candidates:
+            product = catalog.get_by_name(name)
+            if product:
+                break
+        if product and price is not None and price != product.price:
+            # "Cola 1 5": katalogda "Cola" ham, "Cola 1" ham bo'lsa, narx jimgina tashlab yuborilmasin
+            errors.append(
+                f"{line_no}-qator: **{escape_md(product.name)}** katalogda {som(product.price)}, qatorda esa {number(price)} yozilgan. "
+                f"Mavjud mahsulot uchun narx yozmang yoki nomini aniqlashtiring."
+            )
+            continue
+        if product:
+            lines.append(HandoutLine(line_no, product.name, qty, product.price, product))
+            continue
+
+        name, qty, price = candidates[0]
+        if price is None:
+            errors.append(f"{line_no}-qator: **{escape_md(name)}** bazada topilmadi. Yangi mahsulot uchun narxni ham yozing.")
+            continue
+        lines.append(HandoutLine(line_no, name, qty, price))
+
+    return lines, errors
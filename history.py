@@ -0,0 +1,361 @@
+# history.py
+
+import os
+import time
+import asyncio
+import sqlite3
+import datetime
+import logging
+
+from sqlalchemy import (
+    MetaData, Table, Column, Index, Integer, BigInteger, String, Float,
+    select, func, and_, or_, tuple_,
+)
+from sqlalchemy.dialects import postgresql, sqlite
+
+from dbpool import get_engine, connection
+
+logger = logging.getLogger(__name__)
+
+# --- 1. SOZLAMALAR ---
+# Oldingi versiyalardagi lokal tarix fayli. Bor bo'lsa, ishga tushishda asosiy DB ga bir marta ko'chiriladi.
+HISTORY_DB_PATH = os.getenv("HISTORY_DB_PATH", "history.sqlite3")
+
+# Admin ko'rinishlarida bir sahifadagi yozuvlar soni
+HISTORY_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", "20"))
+
+HANDOUT_NOTE = "Bot orqali berildi"
+PAYMENT_NOTE = "To'lov qabul qilindi"
+RETURN_NOTE = "Qaytarildi"
+
+# seller_entries.kind qiymatlari
+ENTRY_PAYMENT = "payment"
+ENTRY_RETURN = "return"
+
+
+# --- 2. JADVALLAR (ASOSIY DB) ---
+# Tarix asosiy DB da saqlanadi: qayta deploy yoki bir nechta nusxa (replica) ishlaganda ham
+# hamma bir xil yozuvlarni ko'radi, to'lovlar esa SellerProduct bilan bitta tranzaksiyada yoziladi.
+
+metadata = MetaData()
+
+handouts = Table(
+    "handouts", metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("transaction_id", String(64), nullable=False, unique=True),
+    Column("seller_id", Integer, nullable=False),
+    Column("seller_name", String(255), nullable=False),
+    Column("product_id", Integer, nullable=False),
+    Column("product_name", String(255), nullable=False),
+    Column("quantity", Integer, nullable=False),
+    Column("unit_price", BigInteger, nullable=False),
+    Column("created_at", Float, nullable=False),
+    Column("actor_id", BigInteger),
+    Index("ix_handouts_seller_created", "seller_id", "created_at"),
+    Index("ix_handouts_product_created", "product_id", "created_at"),
+    Index("ix_handouts_created", "created_at"),
+)
+
+# Sotuvchidan qabul qilingan to'lovlar va qaytarilgan tovarlar (qarzni kamaytiradi)
+seller_entries = Table(
+    "seller_entries", metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("transaction_id", String(64), nullable=False, unique=True),
+    Column("kind", String(16), nullable=False),
+    Column("seller_id", Integer, nullable=False),
+    Column("seller_name", String(255), nullable=False),
+    Column("product_id", Integer),
+    Column("product_name", String(255)),
+    Column("quantity", Integer),
+    Column("unit_price", BigInteger),
+    Column("amount", BigInteger, nullable=False),
+    Column("created_at", Float, nullable=False),
+    Column("actor_id", BigInteger),
+    Index("ix_seller_entries_seller_created", "seller_id", "kind", "created_at"),
+    Index("ix_seller_entries_created", "created_at"),
+)
+
+
+def _insert_ignore(conn, table):
+    """transaction_id allaqachon bor qatorlarni e'tiborsiz qoldiradigan INSERT (PostgreSQL / SQLite)."""
+    dialect = postgresql if conn.dialect.name == "postgresql" else sqlite
+    return dialect.insert(table).on_conflict_do_nothing(index_elements=["transaction_id"])
+
+
+# --- 3. TOVAR BERISH TARIXI ---
+
+class HandoutHistory:
+    """
+    Har bir tovar berish alohida qator sifatida saqlanadi (SellerProduct esa faqat
+    joriy holatni saqlaydi). Narx berilgan paytdagi qiymat bilan yoziladi.
+
+    So'rovlar (seller_id, created_at), (product_id, created_at) va (created_at)
+    indekslari bo'yicha bajariladi, sahifalash esa (created_at, id) kaliti bilan -
+    jadval millionlab qatorga yetganda ham OFFSET ishlatilmaydi.
+
+    Yozuvchi metodlar conn qabul qiladi: qarzdorlik daftari tarix yozuvini SellerProduct
+    o'zgarishi bilan bitta tranzaksiyada bajaradi.
+    """
+
+    def __init__(self):
+        # Shu jarayondagi har bir yozuvdan keyin oshadi (hisobot keshlari uchun)
+        self.version = 0
+
+    async def create_tables(self):
+        """Jadvallar va indekslarni yaratadi (bor bo'lsa tegmaydi)."""
+        async with get_engine().begin() as conn:
+            await conn.run_sync(metadata.create_all)
+
+    async def import_local(self, path: str = HISTORY_DB_PATH, batch_size: int = 1000) -> int:
+        """
+        Oldingi versiyadagi lokal SQLite tarixini asosiy DB ga ko'chiradi (transaction_id bo'yicha
+        takrorlanmaydi). Muvaffaqiyatli ko'chirilgan fayl ".imported" nomi bilan qoldiriladi.
+        """
+        if not os.path.exists(path):
+            return 0
+
+        def read(table: Table) -> list:
+            columns = [c.name for c in table.columns if c.name != "id"]
+            local = sqlite3.connect(path)
+            try:
+                cur = local.execute(f"SELECT {', '.join(columns)} FROM {table.name}")
+                return [dict(zip(columns, row)) for row in cur.fetchall()]
+            except sqlite3.OperationalError:
+                return [] # Jadval eski faylda yo'q
+            finally:
+                local.close()
+
+        copied = 0
+        for table in (handouts, seller_entries):
+            rows = await asyncio.to_thread(read, table)
+            async with get_engine().begin() as conn:
+                for i in range(0, len(rows), batch_size):
+                    await conn.execute(_insert_ignore(conn, table), rows[i:i + batch_size])
+            copied += len(rows)
+
+        os.replace(path, path + ".imported")
+        self.version += 1
+        logger.info(f"Lokal tarix asosiy DB ga ko'chirildi: {copied} qator ({path}).")
+        return copied
+
+    async def record_many(self, seller_id: int, seller_name: str, items: list, actor_id: int = None,
+                          conn=None) -> float:
+        """
+        Tovar berishlarni bitta tranzaksiyada yozadi.
+        items: [(transaction_id, product_id, product_name, quantity, unit_price)]
+        Yozilgan vaqtni qaytaradi (Sheets qatori ham shu vaqt bilan yoziladi).
+        Avval yozilgan transaction_id lar e'tiborsiz qoldiriladi.
+        """
+        now = time.time()
+        async with connection(conn, begin=True) as conn:
+            await conn.execute(_insert_ignore(conn, handouts), [
+                {
+                    "transaction_id": txn_id, "seller_id": seller_id, "seller_name": seller_name,
+                    "product_id": product_id, "product_name": product_name, "quantity": quantity,
+                    "unit_price": unit_price, "created_at": now, "actor_id": actor_id,
+                }
+                for txn_id, product_id, product_name, quantity, unit_price in items
+            ])
+        self.version += 1
+        return now
+
+    async def record_entries(self, kind: str, seller_id: int, seller_name: str, items: list, actor_id: int = None,
+                             conn=None):
+        """
+        To'lov yoki qaytarish yozuvlarini bitta tranzaksiyada yozadi.
+        items: [(transaction_id, product_id, product_name, quantity, unit_price, amount)]
+        (to'lov uchun mahsulot, miqdor va narx None). Yozilgan vaqtni qaytaradi;
+        transaction_id lardan biri avval yozilgan bo'lsa, hech narsa yozilmaydi va None qaytadi.
+        """
+        now = time.time()
+        async with connection(conn, begin=True) as conn:
+            if await self.has_entry(*(item[0] for item in items), conn=conn):
+                # Qayta yetkazilgan update - yozuv allaqachon bor
+                return None
+            await conn.execute(seller_entries.insert(), [
+                {
+                    "transaction_id": txn_id, "kind": kind, "seller_id": seller_id, "seller_name": seller_name,
+                    "product_id": product_id, "product_name": product_name, "quantity": quantity,
+                    "unit_price": unit_price, "amount": amount, "created_at": now, "actor_id": actor_id,
+                }
+                for txn_id, product_id, product_name, quantity, unit_price, amount in items
+            ])
+        self.version += 1
+        return now
+
+    async def has_handout(self, *transaction_ids: str, conn=None) -> bool:
+        """Shu ID lardan birortasi bilan tovar berish yozilganmi."""
+        async with connection(conn) as conn:
+            return (await conn.execute(
+                select(handouts.c.id).where(handouts.c.transaction_id.in_(transaction_ids)).limit(1)
+            )).first() is not None
+
+    async def has_entry(self, *transaction_ids: str, conn=None) -> bool:
+        """Shu ID lardan birortasi bilan to'lov/qaytarish yozilganmi."""
+        async with connection(conn) as conn:
+            return (await conn.execute(
+                select(seller_entries.c.id).where(seller_entries.c.transaction_id.in_(transaction_ids)).limit(1)
+            )).first() is not None
+
+    async def paid_total(self, seller_id: int, conn=None) -> int:
+        """Bitta sotuvchidan qabul qilingan jami to'lov."""
+        stmt = select(func.coalesce(func.sum(seller_entries.c.amount), 0)).where(
+            seller_entries.c.seller_id == seller_id, seller_entries.c.kind == ENTRY_PAYMENT
+        )
+        async with connection(conn) as conn:
+            return int((await conn.execute(stmt)).scalar())
+
+    def _where(self, start_ts: float = None, end_ts: float = None, seller_id: int = None, product_id: int = None) -> list:
+        # Bitta filtr - bitta kompozit indeks. Ikkalasi berilsa, sotuvchi indeksi ishlatiladi.
+        clauses = []
+        if seller_id is not None:
+            clauses.append(handouts.c.seller_id == seller_id)
+        if product_id is not None:
+            clauses.append(handouts.c.product_id == product_id)
+        if start_ts is not None:
+            clauses.append(handouts.c.created_at >= start_ts)
+        if end_ts is not None:
+            clauses.append(handouts.c.created_at < end_ts)
+        return clauses
+
+    async def page(self, start_ts: float = None, end_ts: float = None, seller_id: int = None,
+                   product_id: int = None, before_id: int = None, limit: int = HISTORY_PAGE_SIZE) -> list:
+        """
+        [start_ts, end_ts) oralig'idagi eng yangi yozuvlar, yangidan eskiga.
+        before_id - oldingi sahifaning oxirgi yozuvi (keyingi sahifa undan eskilardan boshlanadi).
+        """
+        clauses = self._where(start_ts, end_ts, seller_id, product_id)
+        if before_id is not None:
+            before_ts = select(handouts.c.created_at).where(handouts.c.id == before_id).scalar_subquery()
+            clauses.append(or_(
+                handouts.c.created_at < before_ts,
+                and_(handouts.c.created_at == before_ts, handouts.c.id < before_id),
+            ))
+
+        stmt = select(handouts).where(*clauses).order_by(handouts.c.created_at.desc(), handouts.c.id.desc()).limit(limit)
+        async with get_engine().connect() as conn:
+            return [dict(row._mapping) for row in await conn.execute(stmt)]
+
+    async def summary(self, start_ts: float = None, end_ts: float = None, seller_id: int = None,
+                      product_id: int = None) -> dict:
+        """Oraliqdagi yozuvlar soni, jami miqdor va jami summa (indeks oralig'i bo'yicha hisoblanadi)."""
+        stmt = select(
+            func.count(),
+            func.coalesce(func.sum(handouts.c.quantity), 0),
+            func.coalesce(func.sum(handouts.c.quantity * handouts.c.unit_price), 0),
+        ).where(*self._where(start_ts, end_ts, seller_id, product_id))
+        async with get_engine().connect() as conn:
+            count, quantity, amount = (await conn.execute(stmt)).one()
+        return {"count": count, "quantity": int(quantity), "amount": int(amount)}
+
+    async def top_products(self, start_ts: float, limit: int = 10) -> list:
+        """
+        start_ts dan beri eng ko'p berilgan mahsulotlar (qaytarilganlari ayirilgan holda).
+        Bitta GROUP BY so'rovi: [(mahsulot, sof miqdor, sof summa)].
+        """
+        given = (
+            select(
+                handouts.c.product_id,
+                func.max(handouts.c.product_name).label("name"),
+                func.sum(handouts.c.quantity).label("qty"),
+                func.sum(handouts.c.quantity * handouts.c.unit_price).label("amount"),
+            )
+            .where(handouts.c.created_at >= start_ts)
+            .group_by(handouts.c.product_id)
+            .cte("given")
+        )
+        returned = (
+            select(
+                seller_entries.c.product_id,
+                func.sum(seller_entries.c.quantity).label("qty"),
+                func.sum(seller_entries.c.amount).label("amount"),
+            )
+            .where(seller_entries.c.kind == ENTRY_RETURN, seller_entries.c.created_at >= start_ts)
+            .group_by(seller_entries.c.product_id)
+            .cte("returned")
+        )
+        net_qty = given.c.qty - func.coalesce(returned.c.qty, 0)
+        stmt = (
+            select(given.c.name, net_qty, given.c.amount - func.coalesce(returned.c.amount, 0))
+            .select_from(given.outerjoin(returned, returned.c.product_id == given.c.product_id))
+            .where(net_qty > 0)
+            .order_by(net_qty.desc())
+            .limit(limit)
+        )
+        async with get_engine().connect() as conn:
+            return [(name, int(qty), int(amount)) for name, qty, amount in await conn.execute(stmt)]
+
+    async def _scan(self, table: Table, columns: list, start_ts: float, end_ts: float, batch_size: int,
+                    seller_ids=None):
+        # (created_at, id) kaliti bo'yicha bo'laklab o'qish; har bir bo'lak - alohida qisqa so'rov
+        key = tuple_(table.c.created_at, table.c.id)
+        last_key = (start_ts, 0)
+        while True:
+            stmt = (
+                select(table.c.id, table.c.created_at, *columns)
+                .where(key > tuple_(*last_key), table.c.created_at < end_ts)
+                .order_by(table.c.created_at, table.c.id)
+                .limit(batch_size)
+            )
+            if seller_ids is not None:
+                stmt = stmt.where(table.c.seller_id.in_(seller_ids))
+            async with get_engine().connect() as conn:
+                rows = (await conn.execute(stmt)).all()
+            for row in rows:
+                yield row
+            if len(rows) < batch_size:
+                return
+            last_key = (rows[-1][1], rows[-1][0])
+
+    async def iter_between(self, start_ts: float, end_ts: float, batch_size: int = 500, seller_ids=None):
+        """
+        [start_ts, end_ts) oralig'idagi yozuvlarni Sheets qatori ko'rinishida, vaqt tartibida beradi.
+        Tovar berishlar, to'lovlar va qaytarishlar bitta oqimga birlashtiriladi (qarzni kamaytiruvchilar manfiy).
+        seller_ids berilsa, faqat shu sotuvchilar yozuvlari (filtr SQL da bajariladi).
+        Eksport va Sheets solishtiruvi shu generatordan foydalanadi.
+        """
+        given = self._scan(
+            handouts,
+            [handouts.c.seller_name, handouts.c.product_name, handouts.c.quantity, handouts.c.unit_price,
+             handouts.c.transaction_id],
+            start_ts, end_ts, batch_size, seller_ids,
+        )
+        entries = self._scan(
+            seller_entries,
+            [seller_entries.c.kind, seller_entries.c.seller_name, seller_entries.c.product_name,
+             seller_entries.c.quantity, seller_entries.c.unit_price, seller_entries.c.amount,
+             seller_entries.c.transaction_id],
+            start_ts, end_ts, batch_size, seller_ids,
+        )
+
+        # Ikkala oqim ham created_at bo'yicha saralangan - birlashtirishda xotirada faqat ikkita bo'lak turadi
+        handout = await _next(given)
+        entry = await _next(entries)
+        while handout is not None or entry is not None:
+            if entry is None or (handout is not None and handout[1] <= entry[1]):
+                _, created_at, seller_name, product_name, quantity, unit_price, txn_id = handout
+                row = [seller_name, product_name, quantity, unit_price, quantity * unit_price, HANDOUT_NOTE, txn_id]
+                handout = await _next(given)
+            else:
+                created_at, row = entry[1], _entry_row(*entry[2:])
+                entry = await _next(entries)
+            yield [datetime.datetime.fromtimestamp(created_at).strftime("%Y-%m-%d %H:%M:%S"), *row]
+
+
+async def _next(stream):
+    """Oqimning keyingi elementi, tugagan bo'lsa None (anext(stream, None) Python 3.10+ da bor)."""
+    try:
+        return await stream.__anext__()
+    except StopAsyncIteration:
+        return None
+
+
+def _entry_row(kind, seller_name, product_name, quantity, unit_price, amount, transaction_id) -> list:
+    """To'lov/qaytarish yozuvining Sheets qatori (vaqt ustunisiz). Qarzni kamaytirgani uchun summa manfiy."""
+    if kind == ENTRY_PAYMENT:
+        return [seller_name, "", "", "", -amount, PAYMENT_NOTE, transaction_id]
+    return [seller_name, product_name, -quantity, unit_price, -amount, RETURN_NOTE, transaction_id]
+
+
+# Butun jarayon uchun yagona tarix jadvali
+handout_history = HandoutHistory()
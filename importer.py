@@ -0,0 +1,199 @@
+# importer.py
+
+import io
+import os
+import csv
+import asyncio
+import logging
+import itertools
+from dataclasses import dataclass, field
+
+from catalog import product_cache, normalize_name
+from ledger import debt_ledger
+from credentials import lookup_key, hash_password_async, credential_store
+
+# Tashqi kutubxona (faqat .xlsx fayllar uchun)
+# pip install openpyxl
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+logger = logging.getLogger(__name__)
+
+# --- 1. SOZLAMALAR ---
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "100"))
+IMPORT_MAX_FILE_SIZE = 20 * 1024 * 1024 # Telegram Bot API orqali yuklab olish chegarasi
+
+# Fayl ustunlari tartibi (birinchi qator sarlavha bo'lishi mumkin)
+PRODUCT_COLUMNS = ["nomi", "narxi"]
+SELLER_COLUMNS = ["ismi", "mahallasi", "telefon", "parol"]
+
+
+@dataclass
+class ImportResult:
+    processed: int = 0
+    created: int = 0
+    updated: int = 0
+    errors: list = field(default_factory=list) # [(qator raqami, qator, xato matni)]
+
+
+# --- 2. FAYLNI OQIM BILAN O'QISH ---
+
+def iter_rows(filename: str, buffer: io.BytesIO):
+    """
+    CSV yoki XLSX fayl qatorlarini birma-bir (qator raqami, [qiymatlar]) ko'rinishida beradi.
+    Bo'sh qatorlar o'tkazib yuboriladi.
+    """
+    if filename.lower().endswith(".xlsx"):
+        if openpyxl is None:
+            raise ValueError("XLSX fayllar uchun openpyxl kutubxonasi o'rnatilmagan. CSV yuboring.")
+        workbook = openpyxl.load_workbook(buffer, read_only=True, data_only=True)
+        try:
+            for line_no, values in enumerate(workbook.active.iter_rows(values_only=True), 1):
+                row = ["" if v is None else str(v).strip() for v in values]
+                if any(row):
+                    yield line_no, row
+        finally:
+            workbook.close()
+        return
+
+    text = io.TextIOWrapper(buffer, encoding="utf-8-sig", newline="")
+    sample = text.read(4096)
+    text.seek(0)
+    try:
+        # Excel ba'zi tillarda ";" bilan saqlaydi
+        dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+    except csv.Error:
+        dialect = csv.excel
+    for line_no, values in enumerate(csv.reader(text, dialect), 1):
+        row = [v.strip() for v in values]
+        if any(row):
+            yield line_no, row
+
+
+def _take(rows, size: int) -> list:
+    return list(itertools.islice(rows, size))
+
+
+async def iter_chunks(rows, size: int = IMPORT_CHUNK_SIZE):
+    """
+    Qatorlarni size tadan bo'laklarga ajratadi (butun fayl xotiraga olinmaydi).
+    Faylni o'qish va tahlil qilish (csv / openpyxl) alohida oqimda bajariladi - event loop band bo'lmaydi.
+    """
+    rows = iter(rows)
+    while True:
+        chunk = await asyncio.to_thread(_take, rows, size)
+        if not chunk:
+            return
+        yield chunk
+
+
+def _is_header(row: list, columns: list) -> bool:
+    return bool(row) and normalize_name(row[0]) in {normalize_name(columns[0]), "name"}
+
+
+def _to_price(value: str) -> int:
+    price = int(float(value.replace(" ", "").replace(",", ".")))
+    if price <= 0:
+        raise ValueError
+    return price
+
+
+# --- 3. IMPORT QILISH ---
+
+async def import_products(rows, progress=None) -> ImportResult:
+    """
+    Mahsulotlar katalogini yangilaydi: yangi nomlar qo'shiladi, mavjudlarining narxi yangilanadi.
+    progress - har bir bo'lakdan keyin qayta ishlangan qatorlar soni bilan chaqiriladi.
+    """
+    result = ImportResult()
+    async for chunk in iter_chunks(rows):
+        # Bir bo'lak ichida bir xil nom bir necha marta kelsa, oxirgisi olinadi
+        latest = {}
+        for line_no, row in chunk:
+            result.processed += 1
+            if line_no == 1 and _is_header(row, PRODUCT_COLUMNS):
+                result.processed -= 1
+                continue
+            try:
+                name, price = row[0], _to_price(row[1])
+                if not name:
+                    raise ValueError
+            except (ValueError, IndexError):
+                result.errors.append((line_no, row, "Nomi yoki narxi noto'g'ri"))
+                continue
+            latest[normalize_name(name)] = (line_no, row, name, price)
+
+        # Bo'lak bitta tranzaksiyada yoziladi (bitta UPDATE + bitta INSERT ... ON CONFLICT)
+        try:
+            saved = await product_cache.upsert_many([(name, price) for _, _, name, price in latest.values()])
+        except Exception as e:
+            result.errors += [(line_no, row, f"Saqlashda xato: {e}") for line_no, row, _, _ in latest.values()]
+        else:
+            result.created += sum(status == "created" for _, status in saved)
+            result.updated += sum(status == "updated" for _, status in saved)
+
+        if progress:
+            await progress(result.processed)
+
+    if result.updated:
+        # Narxlar o'zgardi - sotuvchilar balansini DB bilan qayta solishtirish kerak
+        debt_ledger.mark_stale()
+    return result
+
+
+async def import_sellers(rows, progress=None) -> ImportResult:
+    """Sotuvchilar ro'yxatini qo'shadi. Bazada bor telefon raqamlari xato sifatida qaytadi."""
+    result = ImportResult()
+    async for chunk in iter_chunks(rows):
+        for line_no, row in chunk:
+            result.processed += 1
+            if line_no == 1 and _is_header(row, SELLER_COLUMNS):
+                result.processed -= 1
+                continue
+            try:
+                name, neighborhood, phone, password = row[:4]
+            except ValueError:
+                result.errors.append((line_no, _redacted(row), "Ustunlar yetarli emas (ismi, mahallasi, telefon, parol)"))
+                continue
+
+            phone = phone.replace(" ", "").lstrip("+")
+            if not name or not phone.isdigit() or len(password) < 4:
+                result.errors.append((line_no, _redacted(row), "Ism bo'sh, telefon noto'g'ri yoki parol 4 belgidan qisqa"))
+                continue
+
+            # Parol ochiq saqlanmaydi: qidiruv kaliti va tuzli xesh seller_credentials jadvaliga
+            key = lookup_key(password)
+            if await credential_store.is_taken(key):
+                result.errors.append((line_no, _redacted(row), "Bu parol boshqa sotuvchida bor"))
+                continue
+
+            try:
+                password_hash = await hash_password_async(password)
+                # Sotuvchi va uning paroli bitta tranzaksiyada - xato bo'lsa parolsiz sotuvchi qolmaydi
+                seller = await credential_store.add_seller(name, neighborhood, phone, key, password_hash)
+                debt_ledger.register_seller(seller)
+                result.created += 1
+            except Exception as e:
+                result.errors.append((line_no, _redacted(row), f"Saqlanmadi (ehtimol telefon raqami bazada bor): {e}"))
+
+        if progress:
+            await progress(result.processed)
+    return result
+
+
+def _redacted(row: list) -> list:
+    # Xato qatorlar fayli chatga yuboriladi - sotuvchi paroli (4-ustun) unga yozilmaydi
+    password_index = SELLER_COLUMNS.index("parol")
+    return [("***" if i == password_index and value else value) for i, value in enumerate(row)]
+
+
+def errors_csv(result: ImportResult) -> bytes:
+    """Xato qatorlar faylini (CSV) tayyorlaydi: qator raqami, xato, asl qiymatlar."""
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(["qator", "xato", "qiymatlar"])
+    for line_no, row, error in result.errors:
+        writer.writerow([line_no, error, *row])
+    return out.getvalue().encode("utf-8-sig")
@@ -5,6 +5,12 @@ import logging
 import datetime
 import json
 import asyncio # Asinxron ishlov berish uchun
+import time
+import threading
+import uuid
+import collections
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
 
 # Tashqi kutubxonalar
 # pip install gspread oauth2client
@@ -16,6 +22,7 @@ except ImportError:
     gspread = None
     ServiceAccountCredentials = None
 
+from outbox import SheetsOutbox
 
 logger = logging.getLogger(__name__)
 
@@ -60,82 +67,631 @@ def get_sheets_client():
         logger.error(f"Integratsiya: Google Sheets ulanishida xato: {e}")
         return None
 
-# --- 3. MA'LUMOT YOZISH FUNKSIYASI (ASOSIY TRANZAKSIYA) ---
+class SheetsConnectionCache:
+    """
+    Jarayon bo'yicha yagona gspread client va worksheet obyektini saqlaydi.
+    Token faqat muddati tugaganda yangilanadi, worksheet esa faqat xatodan keyin qayta ochiladi.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock() # Executor oqimlari bir vaqtda murojaat qilishi mumkin
+        self._client = None
+        self._worksheet = None
+
+        # Statistika: qancha avtorizatsiya va ochish so'rovlari tejaldi
+        self.auth_calls = 0
+        self.auth_avoided = 0
+        self.token_refreshes = 0
+        self.open_calls = 0
+        self.open_avoided = 0
+
+    def get_worksheet(self):
+        """Keshlangan worksheetni qaytaradi, kerak bo'lsa ulanadi yoki qayta ochadi."""
+        with self._lock:
+            if self._client is None:
+                self.auth_calls += 1
+                self._client = get_sheets_client()
+                if self._client is None:
+                    return None
+            else:
+                self.auth_avoided += 1
+                self._refresh_token_if_expired()
+
+            if self._worksheet is not None:
+                self.open_avoided += 1
+                return self._worksheet
+
+            self.open_calls += 1
+            try:
+                self._worksheet = self._open_worksheet()
+            except Exception:
+                # Ochib bo'lmadi - ehtimol client yaroqsiz, keyingi safar qayta avtorizatsiya
+                self._client = None
+                raise
+            return self._worksheet
+
+    def invalidate(self):
+        """Yozishda xato bo'lganda worksheet keshini tashlaydi (keyingi safar qayta ochiladi)."""
+        with self._lock:
+            self._worksheet = None
+
+    def _refresh_token_if_expired(self):
+        # gspread 3.x + oauth2client: token muddatini o'zimiz tekshirishimiz kerak.
+        # Yangi gspread versiyalarida sessiya tokenni o'zi yangilaydi.
+        creds = getattr(self._client, "auth", None)
+        if getattr(creds, "access_token_expired", False) and hasattr(self._client, "login"):
+            self._client.login()
+            self.token_refreshes += 1
+            logger.info("Google Sheets tokeni yangilandi.")
+
+    def _open_worksheet(self):
+        spreadsheet = self._client.open_by_key(SHEET_ID)
+
+        # Worksheetni nom bo'yicha olish, topilmasa birinchisiga yozish
+        try:
+            return spreadsheet.worksheet(SHEET_NAME)
+        except gspread.WorksheetNotFound:
+            logger.warning(f"'{SHEET_NAME}' jadvali topilmadi. Ma'lumotlar birinchi jadvalga yozilmoqda.")
+            return spreadsheet.sheet1
+
+    def stats(self) -> dict:
+        """Ulanish keshi statistikasini qaytaradi."""
+        return {
+            "auth_calls": self.auth_calls,
+            "auth_avoided": self.auth_avoided,
+            "token_refreshes": self.token_refreshes,
+            "open_calls": self.open_calls,
+            "open_avoided": self.open_avoided,
+        }
+
+
+sheets_cache = SheetsConnectionCache()
+
+# --- 3. INTEGRATSIYALAR UCHUN ALOHIDA EXECUTOR ---
+# gspread va outbox chaqiruvlari umumiy (default) thread poolni band qilmasligi uchun
+# alohida, hajmi cheklangan ishchi oqimlar va navbat ishlatiladi.
+# Navbat to'lganda siyosat (INTEGRATIONS_OVERFLOW) faqat Sheets API chaqiruvlariga (droppable=True)
+# qo'llanadi. Jurnal (outbox) yozuvlari va boshqa ishlar hech qachon tashlanmaydi - joy bo'shaguncha kutadi.
+#   block       - joy bo'shaguncha kutish (standart)
+#   drop_oldest - navbatdagi eng eski Sheets chaqiruvini bekor qilish (IntegrationQueueFull xatosi)
+#   spill       - yangi Sheets chaqiruvini navbatga qo'ymaslik (IntegrationQueueFull xatosi).
+#                 Qatorlar jurnalda qoladi va keyingi urinishda yuboriladi.
+INTEGRATIONS_WORKERS = int(os.getenv("INTEGRATIONS_WORKERS", "2"))
+INTEGRATIONS_QUEUE_SIZE = int(os.getenv("INTEGRATIONS_QUEUE_SIZE", "100"))
+INTEGRATIONS_OVERFLOW = os.getenv("INTEGRATIONS_OVERFLOW", "block")
+
+OVERFLOW_POLICIES = ("block", "drop_oldest", "spill")
+
+
+class IntegrationQueueFull(Exception):
+    """Integratsiya navbati to'lib, ish bekor qilinganda ko'tariladi."""
+
+
+class IntegrationExecutor:
+    """Hajmi cheklangan thread pool va to'lib ketish siyosatiga ega navbat."""
+
+    def __init__(
+        self,
+        workers: int = INTEGRATIONS_WORKERS,
+        queue_size: int = INTEGRATIONS_QUEUE_SIZE,
+        overflow: str = INTEGRATIONS_OVERFLOW,
+    ):
+        if overflow not in OVERFLOW_POLICIES:
+            logger.warning(f"Noma'lum INTEGRATIONS_OVERFLOW qiymati: {overflow}. 'block' ishlatiladi.")
+            overflow = "block"
+
+        self.workers = max(1, workers)
+        self.queue_size = max(1, queue_size)
+        self.overflow = overflow
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="integrations")
+        self._running = 0
+        self._waiting = collections.deque() # Ishchi oqim kutayotgan ishlar (future)
+        self._droppable = set() # _waiting dagi Sheets chaqiruvlari (faqat ular tashlanishi mumkin)
+        self._space_waiters = collections.deque() # Navbatda joy kutayotganlar (block siyosati)
+
+        # Statistika
+        self.completed = 0
+        self.dropped = 0
+        self.spilled = 0
+        self.max_depth = 0
+        self._wait_total = 0.0
+        self.max_wait = 0.0
+
+    async def run(self, fn, *args, droppable: bool = False):
+        """
+        fn(*args) ni integratsiya oqimlarida bajaradi.
+        droppable=True - Sheets API chaqiruvi: navbat to'lganda INTEGRATIONS_OVERFLOW siyosatiga ko'ra
+        IntegrationQueueFull bilan bekor qilinishi mumkin. Qolgan ishlar faqat kutadi.
+        """
+        loop = asyncio.get_running_loop()
+        enqueued_at = time.monotonic()
+
+        if self._running >= self.workers or self._waiting:
+            while len(self._waiting) >= self.queue_size:
+                oldest = None
+                if self.overflow == "drop_oldest":
+                    oldest = next((waiter for waiter in self._waiting if waiter in self._droppable), None)
+                if oldest is not None:
+                    self._waiting.remove(oldest)
+                    self._droppable.discard(oldest)
+                    if not oldest.done():
+                        oldest.set_exception(IntegrationQueueFull("Integratsiya navbati to'ldi"))
+                    self.dropped += 1
+                    logger.warning("Integratsiya navbati to'ldi: eng eski Sheets chaqiruvi bekor qilindi.")
+                elif self.overflow == "spill" and droppable:
+                    self.spilled += 1
+                    raise IntegrationQueueFull("Integratsiya navbati to'ldi, qatorlar jurnalda qoldi")
+                else:
+                    space = loop.create_future()
+                    self._space_waiters.append(space)
+                    await space
+
+            waiter = loop.create_future()
+            self._waiting.append(waiter)
+            if droppable:
+                self._droppable.add(waiter)
+            self.max_depth = max(self.max_depth, len(self._waiting))
+            try:
+                # Slot bo'shagan ish tomonidan bevosita shu ishga uzatiladi
+                await waiter
+            except asyncio.CancelledError:
+                self._droppable.discard(waiter)
+                if waiter in self._waiting:
+                    self._waiting.remove(waiter)
+                    self._notify_space()
+                elif not waiter.cancelled():
+                    # Slot uzatilgandan keyin bekor qilindi - uni keyingisiga beramiz
+                    self._release()
+                raise
+        else:
+            self._running += 1
+
+        waited = time.monotonic() - enqueued_at
+        self._wait_total += waited
+        self.max_wait = max(self.max_wait, waited)
+        try:
+            return await loop.run_in_executor(self._pool, fn, *args)
+        finally:
+            self.completed += 1
+            self._release()
+
+    def _release(self):
+        # Slotni navbatdagi birinchi ishga uzatish, bo'lmasa bo'shatish
+        while self._waiting:
+            waiter = self._waiting.popleft()
+            self._droppable.discard(waiter)
+            self._notify_space()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self._running -= 1
+
+    def _notify_space(self):
+        while self._space_waiters:
+            space = self._space_waiters.popleft()
+            if not space.done():
+                space.set_result(None)
+                return
+
+    def shutdown(self):
+        """Ishchi oqimlarni yopadi (boshlangan ishlar tugashini kutadi)."""
+        self._pool.shutdown(wait=True)
+
+    def stats(self) -> dict:
+        """Navbat chuqurligi va kutish vaqti statistikasi."""
+        started = self.completed + self._running
+        return {
+            "workers": self.workers,
+            "running": self._running,
+            "queue_depth": len(self._waiting),
+            "max_queue_depth": self.max_depth,
+            "avg_wait_ms": round(self._wait_total / started * 1000, 1) if started else 0.0,
+            "max_wait_ms": round(self.max_wait * 1000, 1),
+            "dropped": self.dropped,
+            "spilled": self.spilled,
+        }
+
+
+integration_executor = IntegrationExecutor()
+
+# --- 4. PAKETLI (BATCH) YOZUVCHI ---
+# Har bir tranzaksiya uchun alohida append_row chaqirish o'rniga qatorlar avval lokal
+# jurnalga (outbox) yoziladi va bitta append_rows so'rovi bilan yuboriladi.
+# Qator soni yoki kutish vaqti chegarasiga yetganda, shuningdek bot to'xtaganda yoziladi.
+# Sheets ishlamasa, qatorlar jurnalda qoladi va eksponensial kutish bilan qayta yuboriladi.
+SHEETS_BATCH_MAX_ROWS = int(os.getenv("SHEETS_BATCH_MAX_ROWS", "50"))
+SHEETS_BATCH_MAX_DELAY = float(os.getenv("SHEETS_BATCH_MAX_DELAY", "5"))
+SHEETS_RETRY_MAX_DELAY = float(os.getenv("SHEETS_RETRY_MAX_DELAY", "300"))
+
+# Jadvaldagi tranzaksiya ID ustuni (H) - takroriy yozishni aniqlash uchun
+TRANSACTION_ID_COLUMN = 8
+
+
+class SheetsBatchWriter:
+    """Lokal jurnaldagi qatorlarni Google Sheetsga paket qilib yozadi."""
+
+    def __init__(
+        self,
+        outbox: SheetsOutbox,
+        executor: IntegrationExecutor,
+        max_rows: int = SHEETS_BATCH_MAX_ROWS,
+        max_delay: float = SHEETS_BATCH_MAX_DELAY,
+        max_retry_delay: float = SHEETS_RETRY_MAX_DELAY,
+    ):
+        self.outbox = outbox
+        self.executor = executor
+        self.max_rows = max(1, max_rows)
+        self.max_delay = max(0.0, max_delay)
+        self.max_retry_delay = max(1.0, max_retry_delay)
+        self._pending = 0
+        self._first_row_at = None
+        self._failures = 0
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+        # Statistika: har bir paketdagi qatorlar soni
+        self.batches_flushed = 0
+        self.rows_flushed = 0
+        self.last_batch_size = 0
+        self.duplicates_skipped = 0
+
+    async def add(self, row: list, key: str) -> bool:
+        """
+        Qatorni jurnalga yozadi va yozuvchini xabardor qiladi.
+        Bir xil kalit bilan qayta chaqirilsa, qator ikkinchi marta qo'shilmaydi.
+        """
+        # Jurnal yozuvi navbat to'lsa ham tashlanmaydi (droppable emas) - javobdan oldin diskda bo'lishi shart
+        inserted = await self.executor.run(self.outbox.put, key, row)
+        if not inserted:
+            self.duplicates_skipped += 1
+            logger.info(f"Takroriy tranzaksiya e'tiborsiz qoldirildi: {key}")
+            return False
+
+        self._pending += 1
+        if self._first_row_at is None:
+            self._first_row_at = time.monotonic()
+        # Birinchi qator vaqt hisobini boshlaydi, to'lgan paket darhol yoziladi
+        if self._pending == 1 or self._pending >= self.max_rows:
+            self._wakeup.set()
+        return True
+
+    async def add_many(self, items: list) -> int:
+        """
+        [(qator, kalit)] ro'yxatini jurnalga bitta tranzaksiyada yozadi va darhol yuborishni so'raydi
+        (ro'yxat max_rows dan oshmasa, Sheetsga bitta paket bo'lib ketadi).
+        """
+        keyed = [(key, row) for row, key in items]
+        inserted = await self.executor.run(self.outbox.put_many, keyed)
+        self.duplicates_skipped += len(items) - inserted
+        if inserted:
+            self._pending += inserted
+            # Ko'p qatorli tranzaksiya kutmasdan yuboriladi
+            self._first_row_at = time.monotonic() - self.max_delay
+            self._wakeup.set()
+        return inserted
+
+    def start(self):
+        """Fon rejimidagi yozish siklini ishga tushiradi (oldingi ishdan qolgan qatorlar ham yuboriladi)."""
+        purged = self.outbox.purge_sent()
+        if purged:
+            logger.info(f"Outbox: {purged} ta eski yuborilgan qator o'chirildi.")
+
+        self._pending = self.outbox.pending_count()
+        if self._pending:
+            logger.info(f"Outbox: oldingi ishdan {self._pending} ta yuborilmagan qator topildi.")
+            # Qolgan qatorlarni kutmasdan yuborish
+            self._first_row_at = time.monotonic() - self.max_delay
+
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Siklni to'xtatadi va jurnalda qolgan qatorlarni yozib yuborishga harakat qiladi."""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        # Sheets ishlamasa, qatorlar jurnalda qoladi va keyingi ishga tushishda yuboriladi
+        try:
+            while self._pending and await self.flush():
+                pass
+        except Exception as e:
+            logger.error(f"To'xtashda Sheets paketini yozib bo'lmadi (qatorlar jurnalda qoldi): {e}")
+
+    async def _run(self):
+        while True:
+            if not self._pending:
+                await self._wakeup.wait()
+                self._wakeup.clear()
+                continue
+
+            remaining = self.max_delay - (time.monotonic() - self._first_row_at)
+            if self._pending < self.max_rows and remaining > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                continue
+
+            try:
+                flushed = await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Jurnal yoki executor xatosi sikl (va butun yozuvchi) to'xtab qolishiga olib kelmasligi kerak
+                logger.error(f"Sheets paketini yozishda kutilmagan xato: {e}")
+                flushed = 0
+
+            if not flushed and self._pending:
+                # Eksponensial kutish: 2, 4, 8, ... soniya (yuqori chegara bilan)
+                self._failures += 1
+                delay = min(self.max_retry_delay, 2 ** self._failures)
+                logger.warning(f"Sheetsga yozib bo'lmadi, {delay:.0f} soniyadan keyin qayta uriniladi. Navbatda: {self._pending}")
+                await asyncio.sleep(delay)
+
+    async def flush(self) -> int:
+        """Jurnaldagi eng eski qatorlardan bir paketini bitta append_rows chaqiruvi bilan yozadi."""
+        batch = await self.executor.run(self.outbox.pending, self.max_rows)
+        if not batch:
+            self._pending = 0
+            self._first_row_at = None
+            return 0
+
+        ids = [row_id for row_id, _, _, _ in batch]
+        rows = [row for _, _, row, _ in batch]
+        # Oldin urinilgan qatorlar jadvalga yozilgan bo'lishi mumkin - tekshirib yuboramiz
+        retried = any(attempts for _, _, _, attempts in batch)
+        await self.executor.run(self.outbox.mark_attempt, ids)
+
+        # gspread sinxron ishlaydi, shuning uchun alohida integratsiya executori orqali chaqiramiz.
+        # Navbat to'lsa faqat shu chaqiruv bekor qilinadi - qatorlar jurnalda qoladi va keyinroq yuboriladi
+        try:
+            written = await self.executor.run(_sync_append_rows, rows, retried, droppable=True)
+        except IntegrationQueueFull:
+            logger.warning(f"Integratsiya navbati to'ldi: {len(rows)} ta qator keyingi urinishda yuboriladi.")
+            return 0
+        if not written:
+            return 0
+
+        await self.executor.run(self.outbox.mark_sent, ids)
+        self._failures = 0
+        self._pending = max(0, self._pending - len(ids))
+        self._first_row_at = time.monotonic() if self._pending else None
+
+        self.batches_flushed += 1
+        self.rows_flushed += len(rows)
+        self.last_batch_size = len(rows)
+        return len(rows)
+
+    def backlog(self) -> int:
+        """Sheetsga hali yuborilmagan qatorlar soni."""
+        return self.outbox.pending_count()
+
+    def stats(self) -> dict:
+        """Yozuvchi statistikasini qaytaradi."""
+        return {
+            "backlog": self.backlog(),
+            "batches_flushed": self.batches_flushed,
+            "rows_flushed": self.rows_flushed,
+            "last_batch_size": self.last_batch_size,
+            "duplicates_skipped": self.duplicates_skipped,
+        }
+
+
+# Butun jarayon uchun yagona yozuvchi (main.py da start/stop qilinadi)
+sheets_writer = SheetsBatchWriter(SheetsOutbox(), integration_executor)
+
+# --- 5. MA'LUMOT YOZISH FUNKSIYASI (ASOSIY TRANZAKSIYA) ---
+
+def _build_row(seller_name, product_name, quantity, price, total_cost, transaction_id, note="Bot orqali berildi", created_at=None) -> list:
+    # Vaqt tranzaksiya paytida olinadi, yozilish paytida emas.
+    # created_at berilsa (tarix jadvalidagi vaqt), jadval va bot tarixi bir xil vaqtni ko'rsatadi.
+    moment = datetime.datetime.fromtimestamp(created_at) if created_at else datetime.datetime.now()
+    timestamp = moment.strftime("%Y-%m-%d %H:%M:%S")
+
+    # Yoziladigan qator ma'lumotlari (Sizning jadvalingiz ustunlari tartibi)
+    return [
+        timestamp,
+        seller_name,
+        product_name,
+        quantity,
+        price,
+        total_cost,
+        note, # Izoh ustuni
+        transaction_id
+    ]
+
 
 async def log_transaction_to_sheet(
     seller_name: str, 
     product_name: str, 
     quantity: int, 
     price: int, 
-    total_cost: int
+    total_cost: int,
+    transaction_id: str = None,
+    created_at: float = None
 ):
     """
-    Berilgan tranzaksiya ma'lumotlarini Google Sheetsga yozadi.
-    Bu funksiya asinxron ravishda chaqirilishi kerak (log_transaction_to_sheet orqali).
+    Berilgan tranzaksiyani lokal jurnalga yozadi. Sheetsga yuborish sheets_writer
+    tomonidan paket qilib bajariladi. Javob qaytarishdan oldin await qilinishi kerak.
     """
-    
-    # gspread bilan ishlash CPU-bound ish bo'lgani uchun, 
-    # asinxron botni bloklamaslik uchun uni executor orqali chaqiramiz.
-    loop = asyncio.get_event_loop()
-    
-    # Sinhron funksiyani asinxron tarzda boshqarish uchun executor ishlatiladi.
-    await loop.run_in_executor(None, 
-                               _sync_log_transaction_to_sheet, 
-                               seller_name, 
-                               product_name, 
-                               quantity, 
-                               price, 
-                               total_cost)
-    
-
-# --- 4. YORDAMCHI SINHRON FUNKSIYA ---
-
-def _sync_log_transaction_to_sheet(
-    seller_name: str, 
-    product_name: str, 
-    quantity: int, 
-    price: int, 
-    total_cost: int
-):
+    # Tranzaksiya ID idempotency kaliti sifatida ishlatiladi
+    transaction_id = transaction_id or uuid.uuid4().hex
+    row_data = _build_row(seller_name, product_name, quantity, price, total_cost, transaction_id, created_at=created_at)
+    return await sheets_writer.add(row_data, transaction_id)
+
+
+async def log_transactions_to_sheet(seller_name: str, transactions: list, created_at: float = None, note: str = None) -> int:
     """
-    Google Sheetsga yozishni amalga oshiradigan sinxron funksiya.
+    Bir nechta tranzaksiyani bitta jurnal yozuvi va bitta Sheets paketi sifatida yozadi.
+    transactions: [{'product_name', 'quantity', 'price', 'total_cost', 'transaction_id'}]
+    note - Izoh ustuni (to'lov va qaytarishlar uchun), berilmasa tovar berish izohi yoziladi.
     """
-    client = get_sheets_client()
-    if not client or not SHEET_ID:
-        return logger.warning("Google Sheets integratsiyasi o'chirilgan yoki noto'g'ri sozlamalar.")
+    extra = {"note": note} if note else {}
+    rows = [
+        (
+            _build_row(
+                seller_name, t['product_name'], t['quantity'], t['price'], t['total_cost'], t['transaction_id'],
+                created_at=created_at, **extra,
+            ),
+            t['transaction_id'],
+        )
+        for t in transactions
+    ]
+    return await sheets_writer.add_many(rows)
+
+
+# --- 6. YORDAMCHI SINHRON FUNKSIYA ---
+
+def _sync_append_rows(rows: list, skip_existing: bool = False) -> bool:
+    """
+    Google Sheetsga bir nechta qatorni bitta so'rov bilan yozadigan sinxron funksiya.
+    skip_existing=True bo'lsa, jadvalda allaqachon bor tranzaksiya IDlari qayta yozilmaydi.
+    """
+    if not SHEET_ID:
+        logger.warning("Google Sheets integratsiyasi o'chirilgan yoki noto'g'ri sozlamalar.")
+        return False
 
     try:
-        spreadsheet = client.open_by_key(SHEET_ID)
-        
-        # Worksheetni nom bo'yicha olish, topilmasa birinchisiga yozish
-        try:
-            worksheet = spreadsheet.worksheet(SHEET_NAME)
-        except gspread.WorksheetNotFound:
-            worksheet = spreadsheet.sheet1
-            logger.warning(f"'{SHEET_NAME}' jadvali topilmadi. Ma'lumotlar birinchi jadvalga yozilmoqda.")
+        worksheet = sheets_cache.get_worksheet()
+        if worksheet is None:
+            logger.warning("Google Sheets integratsiyasi o'chirilgan yoki noto'g'ri sozlamalar.")
+            return False
 
-        # Joriy vaqtni tayyorlash
-        timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-
-        # Yoziladigan qator ma'lumotlari (Sizning jadvalingiz ustunlari tartibi)
-        row_data = [
-            timestamp,
-            seller_name,
-            product_name,
-            quantity,
-            price,
-            total_cost,
-            "Bot orqali berildi" # Izoh ustuni
-        ]
+        if skip_existing:
+            existing = set(worksheet.col_values(TRANSACTION_ID_COLUMN))
+            rows = [row for row in rows if row[TRANSACTION_ID_COLUMN - 1] not in existing]
+            if not rows:
+                return True
 
-        # Ma'lumotni jadvalning oxiriga qo'shish
-        worksheet.append_row(row_data)
-        logger.info(f"Google Sheetsga yozildi: {seller_name} - {product_name} - {quantity} dona")
+        # Barcha qatorlarni jadvalning oxiriga bitta so'rov bilan qo'shish
+        worksheet.append_rows(rows)
+        logger.info(f"Google Sheetsga paket yozildi: {len(rows)} qator")
+        return True
 
     except Exception as e:
-        logger.error(f"Google Sheetsga sinxron yozishda xato: {e}")
+        # Keyingi urinishda worksheet qayta ochiladi
+        sheets_cache.invalidate()
+        logger.error(f"Google Sheetsga sinxron yozishda xato ({len(rows)} qator): {e}")
+        return False
         
+# --- 7. JADVAL VA LOKAL TARIXNI SOLISHTIRISH (RECONCILIATION) ---
+# Jadval bitta get_all_values so'rovi bilan (katta jadvallar uchun - diapazonlar bo'yicha) o'qiladi,
+# qatorlar tranzaksiya ID bo'yicha indekslanadi va lokal jurnaldagi tarix bilan solishtiriladi.
+SHEETS_RECONCILE_BATCH_ROWS = int(os.getenv("SHEETS_RECONCILE_BATCH_ROWS", "5000"))
+# Solishtiriladigan oyna: oxirgi N kunlik tarix (butun tarix har safar o'qilmaydi)
+SHEETS_RECONCILE_DAYS = int(os.getenv("SHEETS_RECONCILE_DAYS", "30"))
+# Bot tarixidan bir so'rovda o'qiladigan qatorlar soni
+SHEETS_RECONCILE_PAGE_ROWS = int(os.getenv("SHEETS_RECONCILE_PAGE_ROWS", "1000"))
+_LAST_COLUMN = "H"
+
+
+def _row_hash(row: list) -> str:
+    # Jadval qiymatlarni matn sifatida qaytaradi, shuning uchun solishtirishdan oldin matnga o'giramiz
+    normalized = "\x1f".join(str(value).strip() for value in row[:TRANSACTION_ID_COLUMN])
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+
+
+def _sync_fetch_sheet_rows() -> list:
+    """Jadvaldagi barcha qatorlarni o'qiydi (kichik jadval - bitta so'rov, katta - diapazonlar)."""
+    worksheet = sheets_cache.get_worksheet()
+    if worksheet is None:
+        raise RuntimeError("Google Sheets integratsiyasi o'chirilgan yoki noto'g'ri sozlamalar.")
+
+    # Formatlanmagan qiymatlar: "12 000" emas, 12000 - lokal qatorlar bilan solishtirish uchun
+    if worksheet.row_count <= SHEETS_RECONCILE_BATCH_ROWS:
+        return worksheet.get_all_values(value_render_option="UNFORMATTED_VALUE")
+
+    rows = []
+    for start in range(1, worksheet.row_count + 1, SHEETS_RECONCILE_BATCH_ROWS):
+        end = start + SHEETS_RECONCILE_BATCH_ROWS - 1
+        chunk = worksheet.get(f"A{start}:{_LAST_COLUMN}{end}", value_render_option="UNFORMATTED_VALUE")
+        if not chunk:
+            break
+        rows.extend(chunk)
+    return rows
+
+
+def _sync_compare(sheet_rows: list, local_rows: list, pending: set, first: str, last: str) -> dict:
+    """
+    Jadval va bot tarixi qatorlarini tranzaksiya ID bo'yicha solishtiradi (xeshlash alohida oqimda).
+    first/last - oyna chegaralari ("%Y-%m-%d %H:%M:%S"), oynadan tashqaridagi jadval qatorlari hisobga olinmaydi.
+    """
+    local = {}
+    for row in local_rows:
+        if len(row) >= TRANSACTION_ID_COLUMN:
+            local[row[TRANSACTION_ID_COLUMN - 1]] = row
+
+    sheet_index = {}
+    without_id = 0
+    for row in sheet_rows:
+        if not row or not row[0] or not first <= str(row[0]) < last:
+            continue # Sarlavha, bo'sh yoki oynadan tashqaridagi qator
+        if len(row) < TRANSACTION_ID_COLUMN or not row[TRANSACTION_ID_COLUMN - 1]:
+            without_id += 1
+            continue
+        sheet_index[str(row[TRANSACTION_ID_COLUMN - 1])] = _row_hash(row)
+
+    missing = [key for key in local if key not in sheet_index and key not in pending]
+    return {
+        "local": local,
+        "missing": missing,
+        "extra": [key for key in sheet_index if key not in local],
+        "changed": [key for key, digest in sheet_index.items() if key in local and digest != _row_hash(local[key])],
+        "without_id": without_id,
+    }
+
+
+async def reconcile_sheet(history, backfill: bool = False, days: int = SHEETS_RECONCILE_DAYS) -> dict:
+    """
+    Jadvalning oxirgi days kunlik qismini bot tarixi (history.iter_between) bilan solishtiradi.
+    Natija: yo'q (jadvalda yo'q), ortiqcha (bot tarixida yo'q), o'zgartirilgan va ID siz qatorlar.
+    backfill=True bo'lsa, yo'q qatorlar bitta append_rows paketi bilan qo'shiladi.
+    """
+    sheet_rows = await integration_executor.run(_sync_fetch_sheet_rows, droppable=True)
+
+    # 1. Bot tarixi: faqat oynadagi va Sheetsga allaqachon yuborilishi kerak bo'lgan qatorlar,
+    # DB dan SHEETS_RECONCILE_PAGE_ROWS talik sahifalar bilan o'qiladi
+    end_ts = time.time() - sheets_writer.max_delay
+    start_ts = end_ts - max(1, days) * 86400
+    local_rows = [row async for row in history.iter_between(start_ts, end_ts, batch_size=SHEETS_RECONCILE_PAGE_ROWS)]
+
+    # Hali navbatda turgan qatorlar "yo'q" deb hisoblanmaydi
+    pending = await integration_executor.run(sheets_writer.outbox.pending_keys)
+
+    # 2. Indekslash va xeshlash event loop dan tashqarida
+    first, last = (datetime.datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S") for ts in (start_ts, end_ts))
+    result = await asyncio.to_thread(_sync_compare, sheet_rows, local_rows, pending, first, last)
+    missing = result["missing"]
+
+    backfilled = 0
+    if backfill and missing:
+        rows = [result["local"][key] for key in missing]
+        if await integration_executor.run(_sync_append_rows, rows, True, droppable=True):
+            backfilled = len(rows)
+
+    report = {
+        "days": days,
+        "sheet_rows": len(sheet_rows),
+        "local_rows": len(result["local"]),
+        "missing": missing,
+        "extra": result["extra"],
+        "changed": result["changed"],
+        "without_id": result["without_id"],
+        "backfilled": backfilled,
+    }
+    logger.info(
+        f"Sheets solishtiruvi ({days} kun): yo'q {len(missing)}, ortiqcha {len(result['extra'])}, "
+        f"o'zgartirilgan {len(result['changed'])}, ID siz {result['without_id']}, tiklangan {backfilled}"
+    )
+    return report
+
 # --------------------------------------------------------------------------------
 # Eslatma: Bu fayl ishga tushishi uchun Google Sheets'da ustunlar:
-# | A: Sana/Vaqt | B: Sotuvchi | C: Mahsulot | D: Miqdor | E: Narxi | F: Jami Summa | G: Izoh |
+# | A: Sana/Vaqt | B: Sotuvchi | C: Mahsulot | D: Miqdor | E: Narxi | F: Jami Summa | G: Izoh | H: Tranzaksiya ID |
 # kabi tartiblangan bo'lishi kerak.
@@ -0,0 +1,361 @@
+# ledger.py
+
+import os
+import asyncio
+import logging
+import contextlib
+
+from sqlalchemy import select, update, insert, func
+
+from db_models import Seller, Product, SellerProduct
+from dbpool import get_engine
+from queries import seller_balances
+from history import handout_history, ENTRY_PAYMENT, ENTRY_RETURN
+
+logger = logging.getLogger(__name__)
+
+# --- 1. SOZLAMALAR ---
+# Xotiradagi balanslarni DB dagi haqiqiy qatorlar bilan solishtirish oralig'i (soniya)
+LEDGER_RECONCILE_INTERVAL = float(os.getenv("LEDGER_RECONCILE_INTERVAL", "3600"))
+
+
+# --- 2. QARZDORLIK DAFTARI ---
+
+class DebtLedger:
+    """
+    Har bir sotuvchining jami qarzdorligini xotirada saqlaydi.
+    Jami summalar har so'rovda SellerProduct qatorlaridan qayta hisoblanmaydi -
+    tovar berilganda balans darhol yangilanadi, o'qish esa O(1).
+    Vaqti-vaqti bilan balanslar DB qatorlari bilan solishtiriladi (reconcile).
+
+    Qarzdorlik = sotuvchidagi tovarlar summasi - qabul qilingan to'lovlar.
+    Qaytarilgan tovarlar SellerProduct miqdorini kamaytiradi, to'lovlar esa
+    seller_entries jadvalida saqlanadi. Balansni o'zgartiruvchi har bir amal bitta DB
+    tranzaksiyasida bajariladi va avval sotuvchi qatorini qulflaydi (SELECT ... FOR UPDATE):
+    bot bir nechta nusxada ishlasa ham parallel amallar bir-birining natijasini yo'qotmaydi,
+    tekshiruv (qoldiq, qarz, takroriy transaction_id) va yozuv orasida balans o'zgarmaydi.
+    Tranzaksiya tasdiqlangach xotiradagi balansga amalning summasi (farqi) qo'shiladi -
+    sotuvchining barcha qatorlari qayta yig'ilmaydi. To'liq hisob faqat load/reconcile da
+    (va daftar hali yuklanmagan bo'lsa, yozuv tranzaksiyasida bir marta) bajariladi.
+    """
+
+    def __init__(self, reconcile_interval: float = LEDGER_RECONCILE_INTERVAL):
+        self.reconcile_interval = reconcile_interval
+        self._names = {} # seller_id -> ism
+        self._neighborhoods = {} # seller_id -> mahalla
+        self._balances = {} # seller_id -> qarzdorlik (so'm)
+        self._total = 0
+        # Tekshiruv so'rovi davomida yozilgan sotuvchilar - ularning balansi eski natija bilan almashtirilmaydi
+        self._touched = set()
+        # Yozuv tranzaksiyasi ochiq turgan sotuvchilar: seller_id -> tranzaksiyalar soni
+        self._in_flight = {}
+        self.loaded = False
+        # Har bir o'zgarishda oshadi - hisobot keshlari eskirganini shu bo'yicha aniqlaydi
+        self.version = 0
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+        # Statistika
+        self.reconciliations = 0
+        self.mismatches_fixed = 0
+
+    async def load(self):
+        """Barcha sotuvchilar balansini DB dan bitta GROUP BY so'rovi bilan hisoblab chiqadi."""
+        await self._refresh()
+        logger.info(f"Qarzdorlik daftari yuklandi: {len(self._balances)} ta sotuvchi, jami {self._total} so'm.")
+
+    def register_seller(self, seller):
+        """Yangi qo'shilgan sotuvchini nol balans bilan ro'yxatga oladi."""
+        self._names[seller.id] = seller.name
+        self._neighborhoods[seller.id] = seller.neighborhood
+        self._balances.setdefault(seller.id, 0)
+        self.version += 1
+
+    # --- DB tranzaksiyasi ichidagi yordamchilar ---
+
+    async def _lock_seller(self, conn, seller_id: int):
+        # Sotuvchi qatori tranzaksiya oxirigacha qulflanadi - shu sotuvchi bo'yicha boshqa yozuvlar kutadi.
+        # SQLite FOR UPDATE ni e'tiborsiz qoldiradi: u yerda yozish qulfi bo'sh UPDATE bilan darhol olinadi,
+        # aks holda parallel tranzaksiyalar takroriy ID tekshiruvidan birga o'tib ketadi
+        if conn.dialect.name == "sqlite":
+            found = (await conn.execute(update(Seller).where(Seller.id == seller_id).values(id=Seller.id))).rowcount
+        else:
+            found = (await conn.execute(select(Seller.id).where(Seller.id == seller_id).with_for_update())).first()
+        if not found:
+            raise ValueError("Sotuvchi topilmadi.")
+
+    @contextlib.contextmanager
+    def _writing(self, seller_id: int):
+        # Tranzaksiya va farqni qo'shish orasida tekshiruv bu sotuvchi balansini DB natijasi bilan
+        # almashtirmasligi kerak - aks holda tasdiqlangan amal ikki marta hisoblanadi
+        self._in_flight[seller_id] = self._in_flight.get(seller_id, 0) + 1
+        try:
+            yield
+        finally:
+            self._touched.add(seller_id)
+            self._in_flight[seller_id] -= 1
+            if not self._in_flight[seller_id]:
+                del self._in_flight[seller_id]
+
+    async def _base_balance(self, conn, seller_id: int):
+        # Daftar yuklangan bo'lsa None (farq xotiradagi balansga qo'shiladi), aks holda DB dagi balans
+        return None if self.loaded else await self._db_balance(conn, seller_id)
+
+    async def _db_balance(self, conn, seller_id: int) -> int:
+        # Tovarlar (joriy narxda) minus to'lovlar - tranzaksiya ichida, yozuvlardan keyin
+        goods = (await conn.execute(
+            select(func.coalesce(func.sum(SellerProduct.quantity * Product.price), 0))
+            .join(Product, Product.id == SellerProduct.product_id)
+            .where(SellerProduct.seller_id == seller_id)
+        )).scalar()
+        return int(goods) - await handout_history.paid_total(seller_id, conn=conn)
+
+    async def _add_quantity(self, conn, seller_id: int, product_id: int, quantity: int) -> bool:
+        """
+        SellerProduct miqdorini bitta atomik UPDATE bilan o'zgartiradi (qator bo'lmasa yaratadi).
+        Kamaytirishda qoldiq yetmasa hech narsa o'zgarmaydi va False qaytadi.
+        """
+        stmt = (
+            update(SellerProduct)
+            .where(SellerProduct.seller_id == seller_id, SellerProduct.product_id == product_id)
+            .values(quantity=SellerProduct.quantity + quantity)
+        )
+        if quantity < 0:
+            stmt = stmt.where(SellerProduct.quantity >= -quantity)
+        if (await conn.execute(stmt)).rowcount:
+            return True
+        if quantity < 0:
+            return False
+        await conn.execute(insert(SellerProduct).values(seller_id=seller_id, product_id=product_id, quantity=quantity))
+        return True
+
+    # --- Balansni o'zgartiruvchi amallar ---
+
+    async def add_handout(self, seller_id: int, seller_name: str, transaction_id: str, product_id: int,
+                          product_name: str, quantity: int, unit_price: int, actor_id: int = None):
+        """
+        Sotuvchiga bitta tovar berishni tarix bilan birga yozadi (add_handouts bilan bir xil tranzaksiya).
+        (yozilgan vaqt, qo'shilgan summa) qaytaradi; transaction_id allaqachon bor bo'lsa vaqt None.
+        """
+        return await self.add_handouts(
+            seller_id, seller_name, [(transaction_id, product_id, product_name, quantity, unit_price)], actor_id
+        )
+
+    async def add_handouts(self, seller_id: int, seller_name: str, items: list, actor_id: int = None):
+        """
+        Bir nechta tovarni [(transaction_id, product_id, product_name, quantity, unit_price)] bitta
+        tranzaksiyada yozadi: SellerProduct miqdorlari va tovar berish tarixi birga saqlanadi yoki
+        birga bekor bo'ladi. (yozilgan vaqt, jami summa) qaytaradi; update qayta yetkazilgan
+        bo'lsa (transaction_id allaqachon bor) hech narsa yozilmaydi va vaqt None.
+        """
+        total = sum(quantity * unit_price for _, _, _, quantity, unit_price in items)
+        with self._writing(seller_id):
+            async with get_engine().begin() as conn:
+                await self._lock_seller(conn, seller_id)
+                if await handout_history.has_handout(*(item[0] for item in items), conn=conn):
+                    return None, total
+                for _, product_id, _, quantity, _ in items:
+                    await self._add_quantity(conn, seller_id, product_id, quantity)
+                created_at = await handout_history.record_many(seller_id, seller_name, items, actor_id, conn=conn)
+                base = await self._base_balance(conn, seller_id)
+            self._apply(seller_id, total, base)
+        return created_at, total
+
+    async def add_payment(self, seller_id: int, seller_name: str, amount: int, transaction_id: str, actor_id: int = None):
+        """
+        Sotuvchidan to'lov qabul qiladi: qarz tekshiruvi va yozuv bitta tranzaksiyada bajariladi.
+        (yozilgan vaqt, yangi balans) qaytaradi; update qayta yetkazilgan bo'lsa vaqt None.
+        To'lov qarzdan oshsa ValueError ko'taradi.
+        """
+        with self._writing(seller_id):
+            async with get_engine().begin() as conn:
+                await self._lock_seller(conn, seller_id)
+                # Sotuvchi qatori qulflangan - shu jarayondagi boshqa yozuvlar balansni o'zgartira olmaydi
+                base = await self._base_balance(conn, seller_id)
+                balance = self._balances.get(seller_id, 0) if base is None else base
+                if await handout_history.has_entry(transaction_id, conn=conn):
+                    return None, balance
+                if amount > balance:
+                    raise ValueError(f"To'lov qarzdorlikdan ({balance:,} so'm) ko'p.".replace(",", " "))
+                created_at = await handout_history.record_entries(
+                    ENTRY_PAYMENT, seller_id, seller_name, [(transaction_id, None, None, None, None, amount)],
+                    actor_id, conn=conn,
+                )
+            self._apply(seller_id, -amount, None if base is None else base - amount)
+        return created_at, self._balances[seller_id]
+
+    async def add_returns(self, seller_id: int, seller_name: str, items: list, actor_id: int = None):
+        """
+        Sotuvchi qaytargan tovarlarni [(transaction_id, product_id, product_name, quantity)] yozadi.
+        Miqdorlar sotuvchidagi qoldiq bilan tekshiriladi, narx - sotuvchidagi joriy narx.
+        (yozilgan vaqt, [(transaction_id, product_id, product_name, quantity, unit_price, summa)]) qaytaradi
+        (update qayta yetkazilgan bo'lsa (None, [])); qoldiqdan ko'p qaytarilsa ValueError ko'taradi.
+        Hammasi bitta tranzaksiyada - xato bo'lsa hech bir qator o'zgarmaydi.
+        """
+        if not items:
+            return None, []
+
+        # Bir mahsulot bir necha qatorda kelsa, miqdorlar qo'shib tekshiriladi
+        requested, names = {}, {}
+        for _, product_id, product_name, quantity in items:
+            requested[product_id] = requested.get(product_id, 0) + quantity
+            names[product_id] = product_name
+
+        with self._writing(seller_id):
+            async with get_engine().begin() as conn:
+                await self._lock_seller(conn, seller_id)
+                if await handout_history.has_entry(*(item[0] for item in items), conn=conn):
+                    return None, []
+
+                held = {
+                    product_id: (int(quantity), price)
+                    for product_id, quantity, price in await conn.execute(
+                        select(SellerProduct.product_id, func.sum(SellerProduct.quantity), Product.price)
+                        .join(Product, Product.id == SellerProduct.product_id)
+                        .where(SellerProduct.seller_id == seller_id, SellerProduct.product_id.in_(requested))
+                        .group_by(SellerProduct.product_id, Product.price)
+                    )
+                }
+                errors = [
+                    f"{names[product_id]}: {quantity} dona qaytarilmoqda, sotuvchida {held.get(product_id, (0,))[0]} dona bor"
+                    for product_id, quantity in requested.items() if quantity > held.get(product_id, (0,))[0]
+                ]
+                # Qoldiq tekshiruvdan keyin ham UPDATE ning o'zida (quantity >= miqdor) shart qilingan
+                for product_id, quantity in requested.items():
+                    if not errors and not await self._add_quantity(conn, seller_id, product_id, -quantity):
+                        errors.append(f"{names[product_id]}: sotuvchida yetarli qoldiq yo'q")
+                if errors:
+                    raise ValueError("Qoldiqdan ko'p qaytarib bo'lmaydi:\n" + "\n".join(errors))
+
+                entries = [
+                    (txn_id, product_id, product_name, quantity, held[product_id][1], quantity * held[product_id][1])
+                    for txn_id, product_id, product_name, quantity in items
+                ]
+                created_at = await handout_history.record_entries(ENTRY_RETURN, seller_id, seller_name, entries, actor_id, conn=conn)
+                base = await self._base_balance(conn, seller_id)
+            self._apply(seller_id, -sum(entry[5] for entry in entries), base)
+        return created_at, entries
+
+    def _apply(self, seller_id: int, delta: int, balance: int = None):
+        # Tasdiqlangan amal summasini xotiradagi balansga qo'shadi. balance berilsa (daftar hali
+        # yuklanmagan) - tranzaksiya ichida DB dan hisoblangan balans yoziladi
+        old = self._balances.get(seller_id, 0)
+        new = old + delta if balance is None else balance
+        self._total += new - old
+        self._balances[seller_id] = new
+        self.version += 1
+
+    def balance(self, seller_id: int):
+        """Sotuvchi qarzdorligi (daftar yuklanmagan yoki sotuvchi noma'lum bo'lsa None)."""
+        if not self.loaded:
+            return None
+        return self._balances.get(seller_id)
+
+    def total(self) -> int:
+        """Barcha sotuvchilarning jami qarzdorligi."""
+        return self._total
+
+    def all_balances(self) -> list:
+        """Qarzi bor sotuvchilar: [{'seller_id', 'seller_name', 'total_debt'}], (ism, id) bo'yicha saralangan."""
+        return sorted(
+            (
+                {"seller_id": seller_id, "seller_name": self._names.get(seller_id, str(seller_id)), "total_debt": debt}
+                for seller_id, debt in self._balances.items() if debt
+            ),
+            key=lambda item: (item["seller_name"], item["seller_id"]),
+        )
+
+    def debt_by_neighborhood(self) -> list:
+        """Mahallalar bo'yicha jami qarzdorlik: [(mahalla, sotuvchilar soni, summa)], summa bo'yicha kamayish tartibida."""
+        groups = {}
+        for seller_id, debt in self._balances.items():
+            if debt:
+                name = self._neighborhoods.get(seller_id) or "—"
+                count, total = groups.get(name, (0, 0))
+                groups[name] = (count + 1, total + debt)
+        return sorted(((name, count, total) for name, (count, total) in groups.items()), key=lambda g: -g[2])
+
+    def sellers_over(self, threshold: int) -> list:
+        """Qarzdorligi threshold dan katta sotuvchilar: [(ism, summa)], summa bo'yicha kamayish tartibida."""
+        return sorted(
+            ((self._names.get(seller_id, str(seller_id)), debt) for seller_id, debt in self._balances.items() if debt > threshold),
+            key=lambda item: -item[1],
+        )
+
+    def mark_stale(self):
+        """Mahsulot narxi o'zgarganda balanslar eskirishi mumkin - keyingi tekshiruvni tezlashtiradi."""
+        if self._task and not self._task.done():
+            self._wakeup.set()
+
+    async def reconcile(self) -> list:
+        """
+        Xotiradagi balanslarni DB dagi SellerProduct qatorlari va to'lovlar bilan solishtiradi.
+        Farqlarni tuzatadi va [(seller_id, kutilgan, haqiqiy)] ro'yxatini qaytaradi.
+        Boshqa nusxalar (replica) yozgan o'zgarishlar ham shu yerda xotiraga tushadi.
+        """
+        mismatches = await self._refresh()
+        self.reconciliations += 1
+        self.mismatches_fixed += len(mismatches)
+        for seller_id, expected, actual in mismatches:
+            logger.warning(f"Qarzdorlik daftarida farq: sotuvchi {seller_id}: daftarda {expected}, DB da {actual}. Tuzatildi.")
+        return mismatches
+
+    async def _refresh(self) -> list:
+        # So'rov davomida shu jarayonda yozilgan (yoki yozilayotgan) sotuvchilar o'tkazib yuboriladi -
+        # ularning balansiga amal summasi qo'shilgan/qo'shiladi, so'rov natijasi esa eskirgan bo'lishi mumkin
+        self._touched.clear()
+        rows = await seller_balances()
+        mismatches = []
+        for seller_id, name, neighborhood, goods_total, paid in rows:
+            self._names[seller_id] = name
+            self._neighborhoods[seller_id] = neighborhood
+            if seller_id in self._touched or seller_id in self._in_flight:
+                continue
+            actual = goods_total - paid
+            expected = self._balances.get(seller_id, 0)
+            if actual != expected:
+                if self.loaded:
+                    mismatches.append((seller_id, expected, actual))
+                self._balances[seller_id] = actual
+        self._total = sum(self._balances.values())
+        self.loaded = True
+        self.version += 1
+        return mismatches
+
+    def start(self):
+        """Davriy tekshiruv siklini ishga tushiradi."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.reconcile_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.reconcile()
+            except Exception as e:
+                logger.error(f"Qarzdorlik daftarini tekshirishda xato: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "sellers": len(self._balances),
+            "total": self._total,
+            "reconciliations": self.reconciliations,
+            "mismatches_fixed": self.mismatches_fixed,
+        }
+
+
+# Butun jarayon uchun yagona daftar
+debt_ledger = DebtLedger()
@@ -1,80 +1,131 @@
 import logging
 import asyncio    # Asyncio Google Sheets logi uchun
 import os         # OS - Atrof-muhit o'zgaruvchilarini o'qish uchun
+import datetime
+import shlex
+import time
 from dotenv import load_dotenv # Dotenv - .env faylini yuklash uchun
 
+# .env faylini yuklash - loyiha modullari import qilinishidan oldin: ular sozlamalarni
+# (PASSWORD_PEPPER, DATABASE_URL, ...) import paytida os.getenv orqali o'qiydi
+load_dotenv()
+
 from aiogram import Bot, Dispatcher, types, F
-from aiogram.filters import Command
+from aiogram.filters import Command, CommandObject
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, ReplyKeyboardMarkup, KeyboardButton
-from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, ReplyKeyboardMarkup, KeyboardButton, BufferedInputFile, FSInputFile
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
 
 
 # --- 1. Konfiguratsiya ---
 BOT_TOKEN = os.getenv("BOT_TOKEN")
 DATABASE_URL = os.getenv("DATABASE_URL")
 ADMIN_ID = int(os.getenv("ADMIN_ID")) if os.getenv("ADMIN_ID") else None
+# Ishga tushirish rejimi: "polling" (standart) yoki "webhook" (webhook.py sozlamalariga qarang)
+RUN_MODE = os.getenv("RUN_MODE", "polling")
+
+from fsm_storage import create_storage
+from outgoing import send_governor, RateLimiter, BROADCAST_RATE, BROADCAST_CONCURRENCY
 
 bot = Bot(token=BOT_TOKEN)
-dp = Dispatcher()
+# Barcha chiquvchi xabarlar chat va umumiy tezlik cheklovidan o'tadi (outgoing.py ga qarang)
+bot.session.middleware(send_governor)
+# FSM ombori sozlamaga ko'ra tanlanadi (memory / sqlite / redis) - fsm_storage.py ga qarang
+dp = Dispatcher(storage=create_storage())
 
 # Loyihaning ichki modullarini import qilish
 from db_models import Base, Product, Seller, SellerProduct
 from db import (
-    init_db, get_or_create_product, add_new_seller, get_all_products, get_all_sellers, 
-    get_seller_by_id, get_product_by_name, add_product_to_seller, get_seller_products_info, 
-    get_all_seller_passwords_list,
-    # 👇 LOGIN UCHUN KERAKLI FUNKSIYALAR 👇
-    check_seller_password_and_link_id, 
-    get_seller_by_telegram_id
+    init_db, get_all_sellers,
+    get_seller_by_id, get_seller_products_info
     # Agar Google Sheets integratsiyasi bo'lsa:
     # , log_transaction_to_sheet 
 )
-from integrations import log_transaction_to_sheet
-# .env faylini yuklash
-load_dotenv()
+from integrations import log_transaction_to_sheet, log_transactions_to_sheet, reconcile_sheet, sheets_writer, sheets_cache, integration_executor, SHEETS_RECONCILE_DAYS
+from supervisor import supervisor, SHUTDOWN_TIMEOUT
+from webhook import run_webhook
+from catalog import product_cache
+from middlewares import SellerSessionMiddleware, ThrottleMiddleware, seller_sessions, query_budget
+from dbpool import pool_metrics, get_engine, dispose_engine
+from ledger import debt_ledger
+from catalog import normalize_name
+from pagination import keyset_page, nav_buttons, parse_page_callback, Page, PAGE_SIZE
+from handout import parse_handout_lines, BULK_HANDOUT_MAX_LINES
+from importer import iter_rows, import_products, import_sellers, errors_csv, IMPORT_MAX_FILE_SIZE
+from exporter import parse_export_args, iter_debt_rows, iter_history_rows, write_export, DEBT_COLUMNS, HISTORY_COLUMNS
+from stats import admin_dashboard, STATS_DEBT_THRESHOLD
+from credentials import (
+    lookup_key, hash_password_async, new_reset_code,
+    credential_store, login_throttle, RESET_CODE_TTL
+)
+from history import handout_history, HISTORY_PAGE_SIZE, PAYMENT_NOTE, RETURN_NOTE
+from render import (
+    number, som, escape_md, split_text, render_products, render_seller_debt,
+    render_seller_products, render_debt_total, render_product_saved
+)
+from queries import seller_debt_totals, sellers_page, create_indexes
 
-from db import get_all_sellers_total_debt # Bu funksiyani db.py'dan import qilish kerak
+def _debt_key(item):
+    return (item['seller_name'], item.get('seller_id', 0))
+
+async def build_sellers_total_debt_page(cursor_id: int = None, backward: bool = False):
+    """Sotuvchilar qarzdorligi ro'yxatining bitta sahifasi: (matn, tugmalar)."""
+    # Qarzdorlik daftari yuklangan bo'lsa, jami summalar xotiradan olinadi (DB ga so'rov yo'q)
+    if debt_ledger.loaded:
+        total_info_list = debt_ledger.all_balances()
+        total_debt_sum = debt_ledger.total()
+    else:
+        # DB'dan barcha sotuvchilar va ularning umumiy qarzdorligini bitta GROUP BY so'rovi bilan olish
+        total_info_list = sorted(
+            (
+                {'seller_id': seller_id, 'seller_name': name, 'total_debt': total}
+                for seller_id, name, _, total in await seller_debt_totals() if total
+            ),
+            key=_debt_key,
+        )
+        total_debt_sum = sum(item['total_debt'] for item in total_info_list)
+
+    if not total_info_list:
+        return "Bazada hozircha sotuvchilarning mahsulotlari bo'yicha ma'lumot yo'q.", None
+
+    cursor = next((_debt_key(item) for item in total_info_list if item.get('seller_id') == cursor_id), None)
+    page = keyset_page(total_info_list, _debt_key, cursor, backward)
+    if not page.items:
+        return "Bazada hozircha sotuvchilarning mahsulotlari bo'yicha ma'lumot yo'q.", None
+
+    lines = ["💰 **Sotuvchilar Bo'yicha JAMI Mahsulotlar Ro'yxati:**", ""]
+    for i, item in enumerate(page.items, page.start + 1):
+        lines.append(f"{i}. **{escape_md(item['seller_name'])}**:")
+        lines.append(f"   Qarzdorlik: **{som(item['total_debt'])}**")
+    lines += ["", "---", f"**WORLD WIDE JAMI QARZDORLIK SUMMASI:** **{som(total_debt_sum)}**"]
+
+    nav = nav_buttons("page_debts", page, page.items[0].get('seller_id', 0), page.items[-1].get('seller_id', 0))
+    return "\n".join(lines), InlineKeyboardMarkup(inline_keyboard=[nav]) if nav else None
 
 @dp.callback_query(F.data == "admin_seller_total_info")
 async def show_all_sellers_total_debt(callback: types.CallbackQuery):
-    """Barcha sotuvchilarning umumiy mahsulotlari/qarzdorligini chiqaradi."""
+    """Barcha sotuvchilarning umumiy mahsulotlari/qarzdorligini chiqaradi (sahifalab)."""
     if not is_admin(callback.from_user.id): return await callback.answer("Ruxsat yo'q.")
     await callback.answer()
     
     try:
-        # DB'dan barcha sotuvchilar va ularning umumiy qarzdorligini olish
-        total_info_list = await get_all_sellers_total_debt()
+        text, keyboard = await build_sellers_total_debt_page()
     except Exception as e:
         logger.error(f"Umumiy qarzdorlikni olishda xato: {e}")
         return await callback.message.answer("Ma'lumotlarni yuklashda xato yuz berdi.")
 
-    if not total_info_list:
-        text = "Bazada hozircha sotuvchilarning mahsulotlari bo'yicha ma'lumot yo'q."
-        total_debt_sum = 0
-    else:
-        text = "💰 **Sotuvchilar Bo'yicha JAMI Mahsulotlar Ro'yxati:**\n\n"
-        total_debt_sum = 0
-        
-        for i, item in enumerate(total_info_list, 1):
-            seller_name = item['seller_name']
-            total_debt = item['total_debt']
-            total_debt_sum += total_debt
+    await callback.message.answer(text, reply_markup=keyboard, parse_mode="Markdown")
 
-            # Mahsulotlarni ro'yxatlash (agar barcha mahsulotlar ko'rsatilishi kerak bo'lsa)
-            # Hozircha faqat umumiy summani ko'rsataman.
-            
-            text += (
-                f"{i}. **{seller_name}**:\n"
-                f"   Qarzdorlik: **{total_debt:,} so'm**\n"
-            ).replace(",", " ")
-
-    text += "\n"
-    text += f"---"
-    text += f"\n**WORLD WIDE JAMI QARZDORLIK SUMMASI:** **{total_debt_sum:,} so'm**".replace(",", " ")
-    
-    await callback.message.answer(text, parse_mode="Markdown")
+@dp.callback_query(F.data.startswith("page_debts_"))
+async def page_all_sellers_total_debt(callback: types.CallbackQuery):
+    """Qarzdorlik ro'yxatida keyingi/oldingi sahifaga o'tish."""
+    if not is_admin(callback.from_user.id): return await callback.answer("Ruxsat yo'q.")
+    await callback.answer()
+
+    backward, cursor_id = parse_page_callback(callback.data)
+    text, keyboard = await build_sellers_total_debt_page(cursor_id, backward)
+    await edit_page(callback, text, keyboard)
 
 
 # Global sozlamalar
@@ -98,16 +149,53 @@ class AdminState(StatesGroup):
     waiting_for_product_quantity_for_seller = State()
     waiting_for_new_product_price_for_seller = State()
 
+    # Sotuvchiga bir xabarda ko'p tovar berish
+    waiting_for_bulk_handout = State()
+
+    # Sotuvchidan to'lov qabul qilish va tovar qaytarish
+    waiting_for_payment_amount = State()
+    waiting_for_return_list = State()
+
+    # CSV/XLSX fayldan import
+    waiting_for_import_file = State()
+
+    # Barcha sotuvchilarga xabar (tasdiqlash kutilmoqda)
+    waiting_for_broadcast_confirm = State()
+
 # --- 3. Sotuvchi Vaziyatlari (FSM) ---
 class SellerState(StatesGroup):
     waiting_for_login_password = State()
+    waiting_for_new_password = State() # Bir martalik kod bilan kirgandan keyin
     
+# Sotuvchi sessiyasini keshdan handlerlarga uzatuvchi middleware
+# Tez-tez bosish va takroriy update larni filtrlar va DB gacha yetmasdan to'xtatish
+# (admin uchun token bucket qo'llanilmaydi, lekin ikki marta bosish baribir tashlab yuboriladi)
+throttle = ThrottleMiddleware(exempt_user_ids={ADMIN_ID})
+dp.message.outer_middleware(throttle)
+dp.callback_query.outer_middleware(throttle)
+
+# Har bir handler DB so'rovlarini sanash (sessiya middleware so'rovlari ham hisoblanadi)
+dp.message.middleware(query_budget)
+dp.callback_query.middleware(query_budget)
+dp.message.middleware(SellerSessionMiddleware(seller_sessions, skip_user_ids={ADMIN_ID}))
+
 # --- 4. Yordamchi Funksiyalar ---
 
+# Noma'lum mahsulot nomi kiritilganda nechta o'xshash variant taklif qilinadi
+PRODUCT_SUGGESTION_LIMIT = 5
+
 def is_admin(user_id: int) -> bool:
     """Faqat ADMIN_ID uchun ruxsat beradi."""
     return user_id == ADMIN_ID
 
+async def edit_page(callback: types.CallbackQuery, text: str, keyboard):
+    """Sahifalangan ro'yxat xabarini joyida yangilaydi (yangi xabar yubormaydi)."""
+    try:
+        await callback.message.edit_text(text, reply_markup=keyboard, parse_mode="Markdown")
+    except TelegramBadRequest:
+        # Xabar o'zgarmagan (masalan, tugma ikki marta bosilgan) - e'tiborsiz qoldiramiz
+        pass
+
 # --- 5. Tugmalar (Keyboards) ---
 
 # Admin Menyusi (Reply Keyboard)
@@ -119,7 +207,8 @@ admin_main_menu = ReplyKeyboardMarkup(resize_keyboard=True, one_time_keyboard=Fa
 # /mahsulot tugmalari (Inline Keyboard)
 mahsulot_menu = InlineKeyboardMarkup(inline_keyboard=[
     [InlineKeyboardButton(text="📋 Barcha Mahsulotlar", callback_data="admin_products_all")],
-    [InlineKeyboardButton(text="➕ Yangi Mahsulot Kiritish", callback_data="admin_products_add")]
+    [InlineKeyboardButton(text="➕ Yangi Mahsulot Kiritish", callback_data="admin_products_add")],
+    [InlineKeyboardButton(text="📥 Fayldan Import (CSV/XLSX)", callback_data="import_products")]
 ])
 
 # /sotuvchi tugmalari (Inline Keyboard)
@@ -127,7 +216,7 @@ sotuvchi_menu = InlineKeyboardMarkup(inline_keyboard=[
     [InlineKeyboardButton(text="💰 Sotuvchilardagi Mahsulotlar (Jami)", callback_data="admin_seller_total_info")],
     [InlineKeyboardButton(text="👥 Sotuvchilar Ro'yxati", callback_data="admin_seller_list")],
     [InlineKeyboardButton(text="➕ Yangi Sotuvchi Qo'shish", callback_data="admin_seller_add")],
-    [InlineKeyboardButton(text="🔐 Sotuvchilar Parollari", callback_data="admin_seller_passwords")],
+    [InlineKeyboardButton(text="📥 Fayldan Import (CSV/XLSX)", callback_data="import_sellers")],
 ])
 
 # main.py ichida, 5-bo'lim (Tugmalar) qismiga qo'shing.
@@ -172,18 +261,45 @@ async def handle_sotuvchi(message: types.Message):
 
     # main.py ichida, 6-bo'limdan keyin, yoki 10-bo'limga qo'shing
 
-from db import check_seller_password_and_link_id # Ushbu funksiya db.py da bo'lishi kerak
+async def authenticate_seller(password: str, user_id: int):
+    """
+    Parolni tekshiradi: (seller, bir martalik kodmi). Sotuvchi kalitli HMAC qiymati (lookup_key)
+    bo'yicha topiladi, so'ng tuzli scrypt xeshi tekshiriladi (credentials.CredentialStore.authenticate).
+    Bir martalik kod shu yerda bekor bo'ladi, telegram_id ga bog'lash esa yangi parol saqlangandan keyin.
+    """
+    seller_id, one_time = await credential_store.authenticate(password, user_id)
+    if seller_id is None:
+        return None, False
+    return await get_seller_by_id(seller_id), one_time
 
 @dp.message(SellerState.waiting_for_login_password, F.text)
 async def process_seller_login_password(message: types.Message, state: FSMContext):
     """Sotuvchi tomonidan kiritilgan parolni tekshirish."""
     password = message.text.strip()
     user_id = message.from_user.id
-    
+
+    # Noto'g'ri urinishlar ko'p bo'lsa, parol umuman tekshirilmaydi
+    wait = login_throttle.retry_after(user_id)
+    if wait:
+        return await message.answer(f"⛔ Juda ko'p noto'g'ri urinish. {int(wait) + 1} soniyadan keyin qayta urinib ko'ring.")
+
     try:
-        seller = await check_seller_password_and_link_id(password, user_id)
-        
+        seller, one_time = await authenticate_seller(password, user_id)
+
+        if seller and one_time:
+            login_throttle.reset(user_id)
+            await state.update_data(seller_id=seller.id)
+            await state.set_state(SellerState.waiting_for_new_password)
+            return await message.answer(
+                f"✅ Kod qabul qilindi, **{seller.name}**.\n"
+                f"Endi o'zingiz uchun yangi parol o'ylab toping va yuboring (kamida 4 belgi):",
+                parse_mode="Markdown"
+            )
+
         if seller:
+            login_throttle.reset(user_id)
+            # Sessiyani keshga yozamiz - keyingi "Mahsulotlarim"/"Qarzdorligim" so'rovlari DB ga bormaydi
+            seller_sessions.put(user_id, seller)
             await message.answer(
                 f"✅ Tizimga muvaffaqiyatli kirdingiz, **{seller.name}**!\n"
                 f"Endi siz o'z ma'lumotlaringizni ko'rishingiz mumkin.",
@@ -194,6 +310,7 @@ async def process_seller_login_password(message: types.Message, state: FSMContex
             # Sotuvchi ID ni saqlash (Keyingi so'rovlar uchun kerak emas, chunki u DB ga yozildi)
             
         else:
+            login_throttle.fail(user_id)
             await message.answer(
                 "❌ Parol noto'g'ri yoki allaqachon boshqa foydalanuvchi ushbu parol bilan ro'yxatdan o'tgan.\n"
                 "Iltimos, qaytadan urinib ko'ring yoki /start bosing."
@@ -203,25 +320,97 @@ async def process_seller_login_password(message: types.Message, state: FSMContex
         logger.error(f"Sotuvchi kirishda xato: {e}")
         await message.answer("Tizimda xato yuz berdi. Iltimos, keyinroq urinib ko'ring.")
 
+async def save_seller_password(seller_id: int, password: str, one_time: bool = False):
+    """
+    Parolni xeshlab saqlaydi: qidiruv kaliti va tuzli xesh asosiy DB dagi seller_credentials jadvaliga.
+    Bu parol boshqa sotuvchida bo'lsa, ValueError ko'taradi.
+    """
+    key = lookup_key(password)
+    if await credential_store.is_taken(key, seller_id):
+        raise ValueError("Bu paroldan foydalanib bo'lmaydi, boshqasini tanlang.")
+    password_hash = await hash_password_async(password)
+    await credential_store.put(seller_id, key, password_hash, one_time=one_time)
+
+@dp.message(SellerState.waiting_for_new_password, F.text)
+async def process_seller_new_password(message: types.Message, state: FSMContext):
+    """Bir martalik kod bilan kirgan sotuvchi yangi parolni o'rnatadi (kod shu bilan bekor bo'ladi)."""
+    password = message.text.strip()
+    if len(password) < 4:
+        return await message.answer("Parol juda qisqa. Kamida 4 belgi bo'lishi kerak.")
+
+    # "Parol band" javobi boshqa sotuvchining parolini taxmin qilishga ishlatilmasligi uchun
+    # bu urinishlar ham kirish urinishlari kabi cheklanadi
+    wait = login_throttle.retry_after(message.from_user.id)
+    if wait:
+        return await message.answer(f"⛔ Juda ko'p urinish. {int(wait) + 1} soniyadan keyin qayta urinib ko'ring.")
+
+    data = await state.get_data()
+    try:
+        await save_seller_password(data['seller_id'], password)
+        # Sotuvchi faqat yangi parol saqlangandan keyin shu telegram akkauntga bog'lanadi
+        linked = await credential_store.link_telegram(data['seller_id'], message.from_user.id)
+    except ValueError as e:
+        login_throttle.fail(message.from_user.id)
+        return await message.answer(f"❌ {e}")
+    except Exception as e:
+        logger.error(f"Yangi parolni saqlashda xato: {e}")
+        return await message.answer("Tizimda xato yuz berdi. Iltimos, keyinroq urinib ko'ring.")
+    if not linked:
+        await state.clear()
+        return await message.answer(
+            "❌ Bu sotuvchi boshqa telegram akkauntga bog'langan. Yangi parol bilan /start orqali kiring "
+            "yoki administratorga murojaat qiling."
+        )
+
+    await state.clear()
+    try:
+        await message.delete() # Parol chat tarixida qolmasin
+    except TelegramBadRequest:
+        pass
+    await message.answer(
+        "✅ Yangi parol saqlandi. Endi siz o'z ma'lumotlaringizni ko'rishingiz mumkin.",
+        reply_markup=seller_main_menu
+    )
+
 # --- 7. ADMIN CALLBACK BOSHQARUVI ---
 
+def _product_key(product):
+    return (normalize_name(product.name), product.id)
+
+def build_products_page(cursor_id: int = None, backward: bool = False):
+    """Mahsulotlar ro'yxatining bitta sahifasi: (matn, tugmalar)."""
+    # Katalog xotiradagi keshdan olinadi (DB ga so'rov yuborilmaydi)
+    products = product_cache.all()
+    if not products:
+        return "Bazada hozircha hech qanday mahsulot yo'q.", None
+
+    cursor_product = product_cache.get_by_id(cursor_id) if cursor_id is not None else None
+    cursor = _product_key(cursor_product) if cursor_product else None
+    page = keyset_page(products, _product_key, cursor, backward)
+    if not page.items:
+        return "Bazada hozircha hech qanday mahsulot yo'q.", None
+
+    nav = nav_buttons("page_products", page, page.items[0].id, page.items[-1].id)
+    return render_products(page.items, page.start + 1), InlineKeyboardMarkup(inline_keyboard=[nav]) if nav else None
+
 @dp.callback_query(F.data == "admin_products_all")
 async def show_all_products(callback: types.CallbackQuery):
-    """Barcha mahsulotlar ro'yxatini chiqaradi."""
+    """Barcha mahsulotlar ro'yxatini chiqaradi (sahifalab)."""
     if not is_admin(callback.from_user.id): return await callback.answer("Ruxsat yo'q.")
     await callback.answer()
     
-    products = await get_all_products()
-    if not products:
-        text = "Bazada hozircha hech qanday mahsulot yo'q."
-    else:
-        text = "📋 **Barcha Mahsulotlar Ro'yxati:**\n\n"
-        for i, prod in enumerate(products, 1):
-            # Narxni so'm formatiga o'tkazish tavsiya etiladi
-            formatted_price = f"{prod.price:,}".replace(",", " ")
-            text += f"{i}. **{prod.name}** - *{formatted_price} so'm*\n"
+    text, keyboard = build_products_page()
+    await callback.message.answer(text, reply_markup=keyboard, parse_mode="Markdown")
 
-    await callback.message.answer(text, parse_mode="Markdown")
+@dp.callback_query(F.data.startswith("page_products_"))
+async def page_all_products(callback: types.CallbackQuery):
+    """Mahsulotlar ro'yxatida keyingi/oldingi sahifaga o'tish."""
+    if not is_admin(callback.from_user.id): return await callback.answer("Ruxsat yo'q.")
+    await callback.answer()
+
+    backward, cursor_id = parse_page_callback(callback.data)
+    text, keyboard = build_products_page(cursor_id, backward)
+    await edit_page(callback, text, keyboard)
 
 # --- 8. YANGI MAHSULOT QO'SHISH (FSM) ---
 
@@ -252,16 +441,16 @@ async def process_product_price(message: types.Message, state: FSMContext):
     name = data['new_product_name']
 
     try:
-        product, is_new = await get_or_create_product(name=name, price=price)
+        product, is_new = await product_cache.get_or_create(name=name, price=price)
         
         if not is_new and product.price != price:
-             # Mahsulot mavjud bo'lsa, narxini yangilaymiz
-             product.price = price
+             # Mahsulot mavjud bo'lsa, narxini yangilaymiz (avval DB ga, keyin keshga)
+             product = await product_cache.reprice(product.id, price)
+             # Narx o'zgardi - sotuvchilar balansini DB bilan qayta solishtirish kerak
+             debt_ledger.mark_stale()
              is_new = False # Aslida yangilandi
         
-        await message.answer(
-            f"✅ **Muvaffaqiyatli!**\nMahsulot: **{product.name}**\nNarxi: **{product.price:,} so'm**\nStatus: {'Yangi mahsulot qo\'shildi' if is_new else 'Narxi yangilandi'}"
-            .replace(",", " "), parse_mode="Markdown")
+        await message.answer(render_product_saved(product.name, product.price, is_new), parse_mode="Markdown")
         
         await state.clear()
         
@@ -313,22 +502,32 @@ async def process_seller_password(message: types.Message, state: FSMContext):
         return await message.answer("Parol juda qisqa. Kamida 4 belgi bo'lishi kerak.")
         
     data = await state.get_data()
+
+    # Parol ochiq holda ham, kalit sifatida ham Seller jadvaliga yozilmaydi:
+    # qidiruv kaliti va tuzli xesh seller_credentials jadvalida saqlanadi
+    # Band parol haqidagi javob kirish urinishlari kabi cheklanadi (parollarni taxmin qilib tekshirib bo'lmasin)
+    wait = login_throttle.retry_after(message.from_user.id)
+    if wait:
+        return await message.answer(f"⛔ Juda ko'p urinish. {int(wait) + 1} soniyadan keyin qayta urinib ko'ring.")
+    key = lookup_key(seller_password)
+    if await credential_store.is_taken(key):
+        login_throttle.fail(message.from_user.id)
+        return await message.answer("Bu paroldan foydalanib bo'lmaydi, boshqasini kiriting.")
+    password_hash = await hash_password_async(seller_password)
     
     try:
-        new_seller = await add_new_seller(
-            name=data['seller_name'],
-            neighborhood=data['seller_neighborhood'],
-            phone_number=data['seller_phone'],
-            password=seller_password
+        # Sotuvchi va parol xeshi bitta tranzaksiyada yoziladi
+        new_seller = await credential_store.add_seller(
+            data['seller_name'], data['seller_neighborhood'], data['seller_phone'], key, password_hash
         )
+        debt_ledger.register_seller(new_seller)
         
         await message.answer(
             f"✅ **Yangi sotuvchi muvaffaqiyatli qo'shildi!**\n"
             f"Ism: **{new_seller.name}**\n"
             f"Mahalla: {new_seller.neighborhood}\n"
             f"Telefon: {new_seller.phone_number}\n"
-            f"Maxsus Parol: `{new_seller.password}`"
-            f"\n\n**(Ushbu parolni sotuvchiga bering.)**",
+            f"\n**(Kiritilgan parolni sotuvchiga bering. Parol shifrlangan holda saqlandi - uni keyin ko'rib bo'lmaydi.)**",
             parse_mode="Markdown"
         )
         await state.clear()
@@ -338,27 +537,274 @@ async def process_seller_password(message: types.Message, state: FSMContext):
         await message.answer(f"Xato yuz berdi. Ehtimol, telefon raqami allaqachon bazada mavjud.")
         await state.clear()
 
+# --- 9.1. CSV/XLSX FAYLDAN IMPORT ---
+
+# Import progress xabari tez-tez tahrirlanmasligi uchun (Telegram cheklovi)
+IMPORT_PROGRESS_INTERVAL = 2.0
+
+@dp.callback_query(F.data.in_({"import_products", "import_sellers"}))
+async def start_import(callback: types.CallbackQuery, state: FSMContext):
+    """Mahsulotlar yoki sotuvchilar faylini kutish holatiga o'tadi."""
+    if not is_admin(callback.from_user.id): return await callback.answer("Ruxsat yo'q.")
+    await callback.answer()
+
+    kind = callback.data.split('_')[-1]
+    columns = "nomi, narxi" if kind == "products" else "ismi, mahallasi, telefon, parol"
+    await state.update_data(import_kind=kind)
+    await callback.message.answer(
+        f"📥 CSV yoki XLSX faylni yuboring.\nUstunlar tartibi: **{columns}**\n"
+        f"(Birinchi qator sarlavha bo'lishi mumkin)",
+        parse_mode="Markdown"
+    )
+    await state.set_state(AdminState.waiting_for_import_file)
+
+@dp.message(AdminState.waiting_for_import_file, F.document)
+async def process_import_file(message: types.Message, state: FSMContext):
+    """Yuborilgan faylni qabul qiladi va importni fon vazifasi sifatida boshlaydi."""
+    if not is_admin(message.from_user.id): return
+
+    document = message.document
+    file_name = document.file_name or ""
+    if not file_name.lower().endswith((".csv", ".xlsx")):
+        return await message.answer("Faqat .csv yoki .xlsx fayl qabul qilinadi.")
+    if document.file_size and document.file_size > IMPORT_MAX_FILE_SIZE:
+        return await message.answer("Fayl juda katta (maksimal 20 MB). Uni bir nechta faylga bo'ling.")
+
+    data = await state.get_data()
+    await state.clear()
+
+    status = await message.answer("⏳ Fayl qabul qilindi, import boshlanmoqda...")
+    supervisor.spawn(run_import(message, status, data['import_kind']), name=f"import_{data['import_kind']}")
+
+async def run_import(message: types.Message, status: types.Message, kind: str):
+    """Faylni yuklab olib, bo'laklab import qiladi va bitta xabarda progressni ko'rsatadi."""
+    loop = asyncio.get_running_loop()
+    last_edit = loop.time()
+
+    async def progress(processed: int):
+        nonlocal last_edit
+        if loop.time() - last_edit < IMPORT_PROGRESS_INTERVAL:
+            return
+        last_edit = loop.time()
+        try:
+            await status.edit_text(f"⏳ Import davom etmoqda: {processed} qator qayta ishlandi...")
+        except TelegramBadRequest:
+            pass
+
+    try:
+        buffer = await bot.download(message.document)
+        rows = iter_rows(message.document.file_name, buffer)
+        importer = import_products if kind == "products" else import_sellers
+        result = await importer(rows, progress)
+    except Exception as e:
+        logger.error(f"Importda xato: {e}")
+        return await status.edit_text(f"❌ Faylni o'qib bo'lmadi: {e}")
+
+    summary = (
+        f"✅ Import yakunlandi.\n"
+        f"Qayta ishlangan qatorlar: {result.processed}\n"
+        f"Yangi qo'shilgan: {result.created}\n"
+        f"Yangilangan: {result.updated}\n"
+        f"Xatolar: {len(result.errors)}"
+    )
+    await status.edit_text(summary)
+
+    if result.errors:
+        await message.answer_document(
+            BufferedInputFile(errors_csv(result), filename=f"import_{kind}_xatolar.csv"),
+            caption="Quyidagi qatorlar saqlanmadi. Tuzatib, faqat shu qatorlarni qayta yuklashingiz mumkin."
+        )
+
+# --- 9.2. CSV/XLSX EKSPORT ---
+
+EXPORT_USAGE = (
+    "Foydalanish:\n"
+    "/export qarz [csv|xlsx] [sotuvchi=Ism] [mahalla=Nomi]\n"
+    "/export tarix [csv|xlsx] [dan=2026-10-01] [gacha=2026-10-31] [sotuvchi=Ism] [mahalla=Nomi]\n\n"
+    "Bo'shliqli qiymatlarni qo'shtirnoqqa oling: mahalla=\"Yangi hayot\""
+)
+
+@dp.message(Command("export"))
+async def handle_export(message: types.Message, command: CommandObject):
+    """Sotuvchilar qarzdorligi yoki tovar berish tarixini fayl sifatida yuboradi."""
+    if not is_admin(message.from_user.id): return
+
+    try:
+        filters = parse_export_args(command.args)
+    except ValueError as e:
+        return await message.answer(f"❌ {e}\n\n{EXPORT_USAGE}")
+
+    status = await message.answer("⏳ Eksport tayyorlanmoqda...")
+    supervisor.spawn(run_export(message, status, filters), name=f"export_{filters.kind}")
+
+async def run_export(message: types.Message, status: types.Message, filters):
+    """Qatorlarni vaqtinchalik faylga oqim bilan yozadi va hujjat sifatida yuboradi."""
+    if filters.kind == "tarix":
+        rows, columns = iter_history_rows(filters, handout_history), HISTORY_COLUMNS
+    else:
+        rows, columns = iter_debt_rows(filters), DEBT_COLUMNS
+
+    try:
+        path = await write_export(rows, columns, filters.fmt)
+    except Exception as e:
+        logger.error(f"Eksportda xato: {e}")
+        return await status.edit_text("❌ Eksport faylini tayyorlashda xato yuz berdi.")
+
+    try:
+        file_name = f"{filters.kind}_{datetime.date.today().isoformat()}.{filters.fmt}"
+        await message.answer_document(FSInputFile(path, filename=file_name), caption="📤 Eksport tayyor.")
+        await status.delete()
+    finally:
+        os.remove(path)
+
+# --- 9.3. TOVAR BERISH TARIXI ---
+
+HISTORY_MAX_LAST = 50 # Bitta xabarga sig'adigan yozuvlar soni
+
+HISTORY_USAGE = (
+    "Foydalanish:\n"
+    "/tarix [N] - oxirgi N ta tovar berish (standart 20)\n"
+    "/tarix dan=2026-10-01 gacha=2026-10-31 [sotuvchi=Ism] [mahsulot=Nomi]\n\n"
+    "Bo'shliqli qiymatlarni qo'shtirnoqqa oling: sotuvchi=\"Ali Valiyev\""
+)
+
+def _date_code(value: datetime.date) -> int:
+    # Callback ichida sana YYYYMMDD son sifatida saqlanadi (0 - chegara yo'q)
+    return int(value.strftime("%Y%m%d")) if value else 0
+
+def _date_from_code(code: int):
+    return datetime.datetime.strptime(str(code), "%Y%m%d").date() if code else None
+
+def _day_start_ts(value: datetime.date):
+    return datetime.datetime.combine(value, datetime.time()).timestamp() if value else None
+
+async def build_history_page(date_from=None, date_to=None, seller_id: int = None, product_id: int = None,
+                       before_id: int = None, limit: int = HISTORY_PAGE_SIZE):
+    """Tarix sahifasi (yangidan eskiga) va "Eskiroq" tugmasi. Sanalar oralig'i bo'lsa, jami ham ko'rsatiladi."""
+    start_ts = _day_start_ts(date_from)
+    end_ts = _day_start_ts(date_to + datetime.timedelta(days=1)) if date_to else None
+    items = await handout_history.page(start_ts, end_ts, seller_id, product_id, before_id, limit + 1)
+    has_more = len(items) > limit
+    items = items[:limit]
+
+    if date_from or date_to:
+        period = f"{date_from or '...'} — {date_to or '...'}"
+        lines = [f"📜 Tovar berish tarixi ({period}):"]
+        if before_id is None:
+            total = await handout_history.summary(start_ts, end_ts, seller_id, product_id)
+            lines.append(f"Jami: {total['count']} ta yozuv, {total['quantity']} dona, {som(total['amount'])}")
+    else:
+        lines = ["📜 Oxirgi tovar berishlar:"]
+    lines.append("")
+
+    if not items:
+        lines.append("Yozuvlar topilmadi.")
+    for item in items:
+        moment = datetime.datetime.fromtimestamp(item['created_at']).strftime("%Y-%m-%d %H:%M")
+        amount = item['quantity'] * item['unit_price']
+        lines.append(
+            f"{moment} | {item['seller_name']} | {item['product_name']}: "
+            f"{item['quantity']} × {number(item['unit_price'])} = {som(amount)}"
+        )
+
+    keyboard = None
+    if has_more:
+        data = f"hist_{_date_code(date_from)}_{_date_code(date_to)}_{seller_id or 0}_{product_id or 0}_{items[-1]['id']}"
+        keyboard = InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(text="Eskiroq ▶️", callback_data=data)]])
+    return "\n".join(lines), keyboard
+
+@dp.message(Command("tarix"))
+async def handle_history(message: types.Message, command: CommandObject):
+    """Oxirgi N ta yoki sanalar oralig'idagi tovar berishlarni ko'rsatadi."""
+    if not is_admin(message.from_user.id): return
+
+    limit, date_from, date_to, seller_id, product_id = HISTORY_PAGE_SIZE, None, None, None, None
+    try:
+        for token in shlex.split(command.args or ""):
+            key, _, value = token.partition("=")
+            key = key.lower()
+            if not value and key.isdigit():
+                limit = min(max(int(key), 1), HISTORY_MAX_LAST)
+            elif key == "dan":
+                date_from = datetime.date.fromisoformat(value)
+            elif key == "gacha":
+                date_to = datetime.date.fromisoformat(value)
+            elif key == "sotuvchi":
+                matches = [s for s in await get_all_sellers() if s.name.casefold() == value.casefold()]
+                if not matches:
+                    raise ValueError(f"Sotuvchi topilmadi: {value}")
+                seller_id = matches[0].id
+            elif key == "mahsulot":
+                product = product_cache.get_by_name(value)
+                if not product:
+                    raise ValueError(f"Mahsulot topilmadi: {value}")
+                product_id = product.id
+            else:
+                raise ValueError(f"Noma'lum parametr: {token}")
+    except ValueError as e:
+        return await message.answer(f"❌ {e}\n\n{HISTORY_USAGE}")
+
+    text, keyboard = await build_history_page(date_from, date_to, seller_id, product_id, limit=limit)
+    await message.answer(text, reply_markup=keyboard)
+
+@dp.callback_query(F.data.startswith("hist_"))
+async def page_history(callback: types.CallbackQuery):
+    """Tarixning keyingi (eskiroq) sahifasi."""
+    if not is_admin(callback.from_user.id): return await callback.answer("Ruxsat yo'q.")
+    await callback.answer()
+
+    date_from, date_to, seller_id, product_id, before_id = map(int, callback.data.split("_")[1:])
+    text, keyboard = await build_history_page(
+        _date_from_code(date_from), _date_from_code(date_to), seller_id or None, product_id or None, before_id
+    )
+    try:
+        # Ismlarda Markdown belgilari bo'lishi mumkin, shuning uchun oddiy matn
+        await callback.message.edit_text(text, reply_markup=keyboard)
+    except TelegramBadRequest:
+        pass
+
 # --- 10. QOLGAN SOTUVCHI FUNKSIYALARI (Boshlanish) ---
 
+async def build_sellers_list_page(cursor_id: int = None, backward: bool = False):
+    """Sotuvchilar tugmalari ro'yxatining bitta sahifasi: (matn, tugmalar). Sahifa DB da kesiladi."""
+    sellers, has_prev, has_next = await sellers_page(cursor_id, backward, PAGE_SIZE)
+    if not sellers:
+        return "Bazada hozircha sotuvchilar yo'q.", None
+
+    # Sotuvchilar alifbo (ism, id) tartibida
+    page = Page(items=sellers, start=0, has_prev=has_prev, has_next=has_next) # Tartib raqami DB da hisoblanmaydi
+    rows = [
+        [InlineKeyboardButton(text=name, callback_data=f"seller_detail_{seller_id}")]
+        for seller_id, name in page.items
+    ]
+    nav = nav_buttons("page_sellers", page, page.items[0][0], page.items[-1][0])
+    if nav:
+        rows.append(nav)
+
+    text = "👥 **Barcha Sotuvchilar Ro'yxati:**\n(Kerakli sotuvchini tanlang)"
+    return text, InlineKeyboardMarkup(inline_keyboard=rows)
+
 @dp.callback_query(F.data == "admin_seller_list")
 async def show_all_sellers_list(callback: types.CallbackQuery):
-    """Barcha sotuvchilar ro'yxatini alifbo tartibidagi tugmalar sifatida chiqaradi."""
+    """Barcha sotuvchilar ro'yxatini alifbo tartibidagi tugmalar sifatida chiqaradi (sahifalab)."""
     if not is_admin(callback.from_user.id): return await callback.answer("Ruxsat yo'q.")
     await callback.answer()
     
-    sellers = await get_all_sellers()
-    if not sellers:
-        return await callback.message.answer("Bazada hozircha sotuvchilar yo'q.")
-    
-    # Sotuvchilarni alifbo bo'yicha saralash
-    sorted_sellers = sorted(sellers, key=lambda s: s.name)
-    
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text=s.name, callback_data=f"seller_detail_{s.id}")] 
-        for s in sorted_sellers
-    ])
-    
-    await callback.message.answer("👥 **Barcha Sotuvchilar Ro'yxati:**\n(Kerakli sotuvchini tanlang)", reply_markup=keyboard)
+    text, keyboard = await build_sellers_list_page()
+    await callback.message.answer(text, reply_markup=keyboard)
+
+@dp.callback_query(F.data.startswith("page_sellers_"))
+async def page_all_sellers_list(callback: types.CallbackQuery):
+    """Sotuvchilar ro'yxatida keyingi/oldingi sahifaga o'tish."""
+    if not is_admin(callback.from_user.id): return await callback.answer("Ruxsat yo'q.")
+    await callback.answer()
+
+    backward, cursor_id = parse_page_callback(callback.data)
+    text, keyboard = await build_sellers_list_page(cursor_id, backward)
+    try:
+        await callback.message.edit_text(text, reply_markup=keyboard)
+    except TelegramBadRequest:
+        pass
 
 
 @dp.callback_query(F.data.startswith("seller_detail_"))
@@ -377,28 +823,45 @@ async def show_seller_details(callback: types.CallbackQuery):
     menu = InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="💵 Mahsulotlar va Narxlar (Qarzdorlik)", callback_data=f"seller_debt_{seller_id}")],
         [InlineKeyboardButton(text="📦 Sotuvchiga Yangi Tovar Berish", callback_data=f"seller_give_product_{seller_id}")],
-        # [InlineKeyboardButton(text="🔐 Sotuvchining Paroli", callback_data=f"seller_password_single_{seller_id}")],
+        [InlineKeyboardButton(text="📋 Ro'yxat bilan Ko'p Tovar Berish", callback_data=f"seller_bulk_give_{seller_id}")],
+        [InlineKeyboardButton(text="💸 To'lov Qabul Qilish", callback_data=f"seller_pay_{seller_id}")],
+        [InlineKeyboardButton(text="↩️ Tovar Qaytarish", callback_data=f"seller_return_{seller_id}")],
+        [InlineKeyboardButton(text="🔑 Parolni Tiklash (Bir Martalik Kod)", callback_data=f"seller_reset_{seller_id}")],
     ])
     
     await callback.message.answer(f"**{seller.name}** ({seller.neighborhood}) bilan bog'liq amallar:", reply_markup=menu, parse_mode="Markdown")
 
-@dp.callback_query(F.data == "admin_seller_passwords")
-async def show_all_seller_passwords(callback: types.CallbackQuery):
-    """Barcha sotuvchilar parollarini chiqaradi."""
+@dp.callback_query(F.data.startswith("seller_reset_"))
+async def reset_seller_password(callback: types.CallbackQuery):
+    """
+    Sotuvchi uchun bir martalik kod yaratadi va uni faqat shu xabarda ko'rsatadi.
+    Eski parol darhol bekor bo'ladi; sotuvchi kod bilan kirib, yangi parol o'rnatadi.
+    """
     if not is_admin(callback.from_user.id): return await callback.answer("Ruxsat yo'q.")
     await callback.answer()
 
-    passwords_list = await get_all_seller_passwords_list()
-    
-    if not passwords_list:
-        text = "Bazada sotuvchilar yo'q."
-    else:
-        text = "🔐 **Barcha Sotuvchilar Parollari:**\n\n"
-        for seller_name, password in passwords_list:
-            text += f"**{seller_name}**: `{password}`\n"
-        text += "\n⚠️ Parollarni uchinchi shaxslarga bermang!"
+    seller_id = int(callback.data.split('_')[-1])
+    seller = await get_seller_by_id(seller_id)
+    if not seller:
+        return await callback.message.answer("Sotuvchi topilmadi.")
+
+    code = new_reset_code()
+    while await credential_store.is_taken(lookup_key(code), seller_id):
+        code = new_reset_code()
 
-    await callback.message.answer(text, parse_mode="Markdown")
+    try:
+        await save_seller_password(seller_id, code, one_time=True)
+    except Exception as e:
+        logger.error(f"Parolni tiklashda xato: {e}")
+        return await callback.message.answer("Parolni tiklashda xato yuz berdi. Iltimos, qaytadan urinib ko'ring.")
+
+    seller_sessions.invalidate(seller_id=seller_id)
+    await callback.message.answer(
+        f"🔑 **{seller.name}** uchun bir martalik kod: `{code}`\n\n"
+        f"Kod {RESET_CODE_TTL // 3600} soat amal qiladi va faqat bir marta ko'rsatiladi. "
+        f"Sotuvchi /start bosib, shu kodni kiritadi va yangi parol o'rnatadi.",
+        parse_mode="Markdown"
+    )
 
 @dp.callback_query(F.data.startswith("seller_give_product_"))
 async def start_give_product_to_seller(callback: types.CallbackQuery, state: FSMContext):
@@ -431,26 +894,64 @@ async def process_seller_product_name(message: types.Message, state: FSMContext)
     product_name = message.text.strip()
     await state.update_data(product_name=product_name)
     
-    # DB dan mahsulotni qidirish
-    product = await get_product_by_name(product_name)
+    # Mahsulotni keshdan qidirish (topilmasa DB dan tekshiriladi)
+    product = await product_cache.find_by_name(product_name)
     
     if product:
         # 1. Mahsulot bazada mavjud. Narxni so'rash shart emas, sonini so'raymiz.
         await state.update_data(product_id=product.id, product_price=product.price)
         await message.answer(
-            f"Mahsulot **{product.name}** (Narxi: {product.price:,} so'm) bazada topildi.\n"
+            f"Mahsulot **{product.name}** (Narxi: {som(product.price)}) bazada topildi.\n"
             f"Endi ushbu mahsulotdan **necha dona** berilganini kiriting (faqat raqam):"
-            .replace(",", " ")
         )
         await state.set_state(AdminState.waiting_for_product_quantity_for_seller)
     else:
-        # 2. Mahsulot bazada mavjud emas. Yangi mahsulot sifatida narxini so'raymiz.
+        # 2. Aniq mos mahsulot yo'q. Imlo xatosi bo'lishi mumkin - o'xshashlarini taklif qilamiz
+        suggestions = product_cache.search(product_name, limit=PRODUCT_SUGGESTION_LIMIT)
+        if suggestions:
+            keyboard = InlineKeyboardMarkup(inline_keyboard=[
+                [InlineKeyboardButton(text=f"{p.name} ({som(p.price)})", callback_data=f"pick_product_{p.id}")]
+                for p in suggestions
+            ] + [[InlineKeyboardButton(text=f"➕ Yangi mahsulot: {product_name}", callback_data="pick_product_new")]])
+            await message.answer(
+                f"Mahsulot **{product_name}** bazada topilmadi.\n"
+                f"Quyidagilardan birini tanlang yoki yangi mahsulot sifatida qo'shing:",
+                reply_markup=keyboard
+            )
+            return
+
+        # 3. Mahsulot bazada mavjud emas. Yangi mahsulot sifatida narxini so'raymiz.
         await message.answer(
             f"Mahsulot **{product_name}** bazada topilmadi.\n"
             f"Iltimos, ushbu yangi mahsulotning **narxini** kiriting (masalan: 12500):"
         )
         await state.set_state(AdminState.waiting_for_new_product_price_for_seller)
 
+@dp.callback_query(AdminState.waiting_for_product_name_for_seller, F.data.startswith("pick_product_"))
+async def process_seller_product_suggestion(callback: types.CallbackQuery, state: FSMContext):
+    """Taklif qilingan mahsulotlardan birini tanlash yoki yangisini yaratishga o'tish."""
+    if not is_admin(callback.from_user.id): return await callback.answer("Ruxsat yo'q.")
+    await callback.answer()
+
+    choice = callback.data.split('_')[-1]
+    if choice == "new":
+        data = await state.get_data()
+        await callback.message.answer(
+            f"Yangi mahsulot **{data['product_name']}** uchun **narxini** kiriting (masalan: 12500):"
+        )
+        return await state.set_state(AdminState.waiting_for_new_product_price_for_seller)
+
+    product = product_cache.get_by_id(int(choice))
+    if not product:
+        return await callback.message.answer("Mahsulot topilmadi. Iltimos, nomini qaytadan kiriting.")
+
+    await state.update_data(product_id=product.id, product_price=product.price, product_name=product.name)
+    await callback.message.answer(
+        f"Mahsulot **{product.name}** (Narxi: {som(product.price)}) tanlandi.\n"
+        f"Endi ushbu mahsulotdan **necha dona** berilganini kiriting (faqat raqam):"
+    )
+    await state.set_state(AdminState.waiting_for_product_quantity_for_seller)
+
 @dp.message(AdminState.waiting_for_product_quantity_for_seller, F.text)
 async def process_seller_product_quantity(message: types.Message, state: FSMContext):
     """Mahsulot sonini qabul qilish va sotuvchiga tovar berishni yakunlash."""
@@ -471,33 +972,42 @@ async def process_seller_product_quantity(message: types.Message, state: FSMCont
 
     # 2. DB ga yozish va Javob qaytarish
     try:
-        await add_product_to_seller(
-            seller_id=seller_id,
-            product_id=product_id,
-            quantity=quantity
+        # DB ga yozish, tovar berish tarixi va sotuvchi balansi bitta tranzaksiyada
+        # (narx shu paytdagi qiymat bilan saqlanadi). Tranzaksiya ID xabarga bog'langan va
+        # DB yozuvidan oldin tekshiriladi - qayta yetkazilgan update tovarni ikkinchi marta bermaydi.
+        transaction_id = f"{message.chat.id}:{message.message_id}"
+        product_name = data.get('product_name', 'Mahsulot (ID: ' + str(product_id) + ')')
+        created_at, total_cost = await debt_ledger.add_handout(
+            seller_id, seller_name, transaction_id, product_id, product_name,
+            quantity, product_price, actor_id=message.from_user.id
         )
-        
-        total_cost = quantity * product_price
-
-        # >>> GOOGLE SHEETSGA YOZISHNI ASINXRON CHAQIRISH
-        # Funksiya ishlamay qolsa ham asosiy bot ishlashda davom etadi
-        asyncio.create_task(log_transaction_to_sheet(
-            seller_name=seller_name,
-            product_name=data.get('product_name', 'Mahsulot (ID: ' + str(product_id) + ')'),
-            quantity=quantity,
-            price=product_price,
-            total_cost=total_cost
-        ))
+
+        # >>> GOOGLE SHEETSGA YOZISH UCHUN LOKAL JURNALGA QO'YISH
+        # Qator javob qaytarishdan oldin diskka yoziladi, Sheetsga esa fonda paket qilib yuboriladi.
+        if created_at is not None:
+            try:
+                await log_transaction_to_sheet(
+                    seller_name=seller_name,
+                    product_name=product_name,
+                    quantity=quantity,
+                    price=product_price,
+                    total_cost=total_cost,
+                    transaction_id=transaction_id,
+                    created_at=created_at
+                )
+            except Exception as e:
+                # Jurnalga yozilmasa ham tovar DB ga yozilgan, asosiy javob qaytariladi
+                logger.error(f"Sheets jurnaliga yozishda xato: {e}")
         # <<<
         
         # Muvaffaqiyatli yakunlanganda yuboriladigan yakuniy javob
         await message.answer(
             f"✅ **Muvaffaqiyatli!** Tovar berildi.\n\n"
-            f"Sotuvchi: **{seller_name}**\n"
-            f"Mahsulot: {data.get('product_name', 'Mavjud')}\n"
+            f"Sotuvchi: **{escape_md(seller_name)}**\n"
+            f"Mahsulot: {escape_md(data.get('product_name', 'Mavjud'))}\n"
             f"Miqdor: **{quantity} dona**\n"
-            f"Jami Qarzdorlikka Qo'shildi: **{total_cost:,} so'm**"
-            .replace(",", " "), parse_mode="Markdown"
+            f"Jami Qarzdorlikka Qo'shildi: **{som(total_cost)}**",
+            parse_mode="Markdown"
         )
         await state.clear()
         
@@ -527,15 +1037,14 @@ async def process_new_seller_product_price(message: types.Message, state: FSMCon
 
     try:
         # 1. Yangi mahsulotni bazaga qo'shish
-        product, is_new = await get_or_create_product(name=product_name, price=new_price)
+        product, is_new = await product_cache.get_or_create(name=product_name, price=new_price)
         
         # 2. Keyingi holat uchun ma'lumotlarni yangilash
         await state.update_data(product_id=product.id, product_price=product.price)
         
         await message.answer(
-            f"✅ Yangi mahsulot **{product_name}** ({product.price:,} so'm) bazaga qo'shildi.\n"
+            f"✅ Yangi mahsulot **{product_name}** ({som(product.price)}) bazaga qo'shildi.\n"
             f"Endi ushbu mahsulotdan **necha dona** berilganini kiriting (faqat raqam):"
-            .replace(",", " ")
         )
         
         # 3. Keyingi qadam: Miqdorni so'rash
@@ -546,6 +1055,230 @@ async def process_new_seller_product_price(message: types.Message, state: FSMCon
         await message.answer("Mahsulotni yaratishda kutilmagan xato yuz berdi. Iltimos, qaytadan urinib ko'ring.")
         await state.clear()
 
+@dp.callback_query(F.data.startswith("seller_bulk_give_"))
+async def start_bulk_give_to_seller(callback: types.CallbackQuery, state: FSMContext):
+    """Sotuvchiga bir xabarda ko'p tovar berish jarayonini boshlaydi."""
+    if not is_admin(callback.from_user.id): return await callback.answer("Ruxsat yo'q.")
+    await callback.answer()
+
+    seller_id = int(callback.data.split('_')[-1])
+    seller = await get_seller_by_id(seller_id)
+
+    if not seller:
+        return await callback.message.answer("Sotuvchi topilmadi.")
+
+    await state.update_data(current_seller_id=seller_id, seller_name=seller.name)
+    await callback.message.answer(
+        f"**{escape_md(seller.name)}**ga ko'p tovar berish:\n"
+        f"Har bir qatorga bitta mahsulot yozing: `nomi miqdor [narx]`\n"
+        f"Narx faqat bazada yo'q (yangi) mahsulotlar uchun kerak. Masalan:\n\n"
+        f"`Olma 10`\n`Shakar 5 14000`\n\n"
+        f"(Bir xabarda ko'pi bilan {BULK_HANDOUT_MAX_LINES} qator)",
+        parse_mode="Markdown"
+    )
+    await state.set_state(AdminState.waiting_for_bulk_handout)
+
+@dp.message(AdminState.waiting_for_bulk_handout, F.text)
+async def process_bulk_handout(message: types.Message, state: FSMContext):
+    """Ko'p qatorli ro'yxatni tekshirish, DB ga yozish va bitta umumiy javob qaytarish."""
+    if not is_admin(message.from_user.id): return
+
+    # 1. Ro'yxatni tahlil qilish va katalog bo'yicha tekshirish (xato bo'lsa hech narsa yozilmaydi)
+    lines, errors = parse_handout_lines(message.text, product_cache)
+    if errors:
+        return await message.answer(
+            "❌ Ro'yxatda xatolar bor, hech narsa yozilmadi:\n\n" + "\n".join(errors) +
+            "\n\nTuzatib, ro'yxatni qaytadan yuboring yoki /start bosing.",
+            parse_mode="Markdown"
+        )
+
+    data = await state.get_data()
+    seller_id = data['current_seller_id']
+    seller_name = data['seller_name']
+
+    try:
+        # 2. Bazada yo'q mahsulotlarni yaratish
+        for line in lines:
+            if line.product is None:
+                line.product, _ = await product_cache.get_or_create(name=line.name, price=line.price)
+                line.name, line.price = line.product.name, line.product.price
+
+        # 3. Barcha qatorlarni va tovar berish tarixini bitta DB tranzaksiyasida yozish.
+        # Tranzaksiya ID lari xabarga bog'langan - qayta yetkazilgan update ikkinchi marta yozilmaydi.
+        transaction_ids = [f"{message.chat.id}:{message.message_id}:{line.line_no}" for line in lines]
+        created_at, total_cost = await debt_ledger.add_handouts(seller_id, seller_name, [
+            (txn_id, line.product.id, line.name, line.quantity, line.price)
+            for txn_id, line in zip(transaction_ids, lines)
+        ], actor_id=message.from_user.id)
+
+        # 4. Sheets jurnaliga bitta paket sifatida yozish (faqat yangi yozilgan bo'lsa)
+        if created_at is not None:
+            try:
+                await log_transactions_to_sheet(seller_name, [
+                    {
+                        'product_name': line.name,
+                        'quantity': line.quantity,
+                        'price': line.price,
+                        'total_cost': line.total_cost,
+                        'transaction_id': txn_id,
+                    }
+                    for txn_id, line in zip(transaction_ids, lines)
+                ], created_at=created_at)
+            except Exception as e:
+                logger.error(f"Sheets jurnaliga yozishda xato: {e}")
+
+        # 5. Bitta umumiy javob
+        summary = [f"✅ **Muvaffaqiyatli!** {len(lines)} xil tovar berildi.", "", f"Sotuvchi: **{escape_md(seller_name)}**", ""]
+        summary += [
+            f"{i}. {escape_md(line.name)} — {line.quantity} dona × {number(line.price)} = {som(line.total_cost)}"
+            for i, line in enumerate(lines, 1)
+        ]
+        summary += ["", f"Jami Qarzdorlikka Qo'shildi: **{som(total_cost)}**"]
+        await message.answer("\n".join(summary), parse_mode="Markdown")
+        await state.clear()
+
+    except Exception as e:
+        logger.error(f"Ko'p tovar berishda xato: {e}")
+        await message.answer("Ma'lumotni saqlashda kutilmagan xato yuz berdi. Iltimos, qaytadan urinib ko'ring.")
+        await state.clear()
+
+# --- 10.1. TO'LOV VA TOVAR QAYTARISH ---
+
+@dp.callback_query(F.data.startswith("seller_pay_"))
+async def start_seller_payment(callback: types.CallbackQuery, state: FSMContext):
+    """Sotuvchidan naqd to'lov qabul qilish jarayonini boshlaydi."""
+    if not is_admin(callback.from_user.id): return await callback.answer("Ruxsat yo'q.")
+    await callback.answer()
+
+    seller_id = int(callback.data.split('_')[-1])
+    seller = await get_seller_by_id(seller_id)
+    if not seller:
+        return await callback.message.answer("Sotuvchi topilmadi.")
+
+    balance = debt_ledger.balance(seller_id)
+    await state.update_data(current_seller_id=seller_id, seller_name=seller.name)
+    await callback.message.answer(
+        f"**{escape_md(seller.name)}**dan qabul qilingan to'lov summasini kiriting (so'm, faqat raqam):" +
+        (f"\nJoriy qarzdorlik: {som(balance)}" if balance is not None else ""),
+        parse_mode="Markdown"
+    )
+    await state.set_state(AdminState.waiting_for_payment_amount)
+
+@dp.message(AdminState.waiting_for_payment_amount, F.text)
+async def process_seller_payment(message: types.Message, state: FSMContext):
+    """To'lovni yozadi va sotuvchi balansini kamaytiradi."""
+    if not is_admin(message.from_user.id): return
+
+    try:
+        amount = int(message.text.strip().replace(" ", ""))
+        if amount <= 0: raise ValueError
+    except ValueError:
+        return await message.answer("Summa noto'g'ri. Iltimos, musbat butun son kiriting.")
+
+    data = await state.get_data()
+    seller_id, seller_name = data['current_seller_id'], data['seller_name']
+    transaction_id = f"{message.chat.id}:{message.message_id}"
+
+    try:
+        created_at, balance = await debt_ledger.add_payment(
+            seller_id, seller_name, amount, transaction_id, actor_id=message.from_user.id
+        )
+    except ValueError as e:
+        return await message.answer(f"❌ {e} Summani qaytadan kiriting yoki /start bosing.")
+    except Exception as e:
+        logger.error(f"To'lovni yozishda xato: {e}")
+        await state.clear()
+        return await message.answer("Ma'lumotni saqlashda kutilmagan xato yuz berdi. Iltimos, qaytadan urinib ko'ring.")
+
+    if created_at is not None:
+        try:
+            await log_transactions_to_sheet(seller_name, [{
+                'product_name': "", 'quantity': "", 'price': "", 'total_cost': -amount, 'transaction_id': transaction_id,
+            }], created_at=created_at, note=PAYMENT_NOTE)
+        except Exception as e:
+            logger.error(f"Sheets jurnaliga yozishda xato: {e}")
+
+    await message.answer(
+        f"✅ To'lov qabul qilindi.\n\n"
+        f"Sotuvchi: **{escape_md(seller_name)}**\n"
+        f"To'lov: **{som(amount)}**\n"
+        f"Qolgan qarzdorlik: **{som(balance)}**",
+        parse_mode="Markdown"
+    )
+    await state.clear()
+
+@dp.callback_query(F.data.startswith("seller_return_"))
+async def start_seller_return(callback: types.CallbackQuery, state: FSMContext):
+    """Sotuvchi qaytargan tovarlarni qabul qilish jarayonini boshlaydi."""
+    if not is_admin(callback.from_user.id): return await callback.answer("Ruxsat yo'q.")
+    await callback.answer()
+
+    seller_id = int(callback.data.split('_')[-1])
+    seller = await get_seller_by_id(seller_id)
+    if not seller:
+        return await callback.message.answer("Sotuvchi topilmadi.")
+
+    await state.update_data(current_seller_id=seller_id, seller_name=seller.name)
+    await callback.message.answer(
+        f"**{escape_md(seller.name)}** qaytargan tovarlar:\n"
+        f"Har bir qatorga bitta mahsulot yozing: `nomi miqdor`. Masalan:\n\n"
+        f"`Olma 3`\n`Shakar 1`",
+        parse_mode="Markdown"
+    )
+    await state.set_state(AdminState.waiting_for_return_list)
+
+@dp.message(AdminState.waiting_for_return_list, F.text)
+async def process_seller_return(message: types.Message, state: FSMContext):
+    """Qaytarilgan tovarlarni sotuvchidan ayiradi va balansni kamaytiradi (hammasi yoki hech biri)."""
+    if not is_admin(message.from_user.id): return
+
+    lines, errors = parse_handout_lines(message.text, product_cache)
+    errors += [f"{line.line_no}-qator: **{escape_md(line.name)}** bazada topilmadi." for line in lines if line.product is None]
+    if errors:
+        return await message.answer(
+            "❌ Ro'yxatda xatolar bor, hech narsa yozilmadi:\n\n" + "\n".join(errors) +
+            "\n\nTuzatib, ro'yxatni qaytadan yuboring yoki /start bosing.",
+            parse_mode="Markdown"
+        )
+
+    data = await state.get_data()
+    seller_id, seller_name = data['current_seller_id'], data['seller_name']
+    items = [
+        (f"{message.chat.id}:{message.message_id}:{line.line_no}", line.product.id, line.product.name, line.quantity)
+        for line in lines
+    ]
+
+    try:
+        created_at, entries = await debt_ledger.add_returns(seller_id, seller_name, items, actor_id=message.from_user.id)
+    except ValueError as e:
+        return await message.answer(f"❌ {e}\n\nTuzatib, ro'yxatni qaytadan yuboring yoki /start bosing.")
+    except Exception as e:
+        logger.error(f"Tovar qaytarishda xato: {e}")
+        await state.clear()
+        return await message.answer("Ma'lumotni saqlashda kutilmagan xato yuz berdi. Iltimos, qaytadan urinib ko'ring.")
+
+    if created_at is not None:
+        try:
+            await log_transactions_to_sheet(seller_name, [
+                {
+                    'product_name': product_name, 'quantity': -quantity, 'price': unit_price,
+                    'total_cost': -amount, 'transaction_id': txn_id,
+                }
+                for txn_id, _, product_name, quantity, unit_price, amount in entries
+            ], created_at=created_at, note=RETURN_NOTE)
+        except Exception as e:
+            logger.error(f"Sheets jurnaliga yozishda xato: {e}")
+
+    total = sum(entry[5] for entry in entries)
+    summary = ["✅ Tovar qaytarildi.", "", f"Sotuvchi: **{escape_md(seller_name)}**", ""]
+    summary += [
+        f"{i}. {escape_md(product_name)} — {quantity} dona × {som(unit_price)}"
+        for i, (_, _, product_name, quantity, unit_price, _) in enumerate(entries, 1)
+    ]
+    summary += ["", f"Qarzdorlikdan Ayirildi: **{som(total)}**"]
+    await message.answer("\n".join(summary), parse_mode="Markdown")
+    await state.clear()
+
 @dp.callback_query(F.data.startswith("seller_debt_"))
 async def show_seller_debt(callback: types.CallbackQuery):
     """Sotuvchining barcha mahsulotlari ro'yxati va jami qarzdorligini chiqaradi."""
@@ -558,95 +1291,238 @@ async def show_seller_debt(callback: types.CallbackQuery):
     if not seller:
         return await callback.message.answer("Sotuvchi topilmadi.")
 
-    # DB dan sotuvchining mahsulotlari va umumiy summasini olish
-    products_list, total_debt = await get_seller_products_info(seller_id)
-    
-    text = f"💰 **{seller.name}** ({seller.neighborhood}) dagi Mahsulotlar Ro'yxati:\n\n"
-    
-    if not products_list:
-        text += "Hozircha sotuvchida mahsulot yo'q (Qarzdorlik 0 so'm)."
-    else:
-        for i, item in enumerate(products_list, 1):
-            product_name = item['product_name']
-            quantity = item['quantity']
-            unit_price = item['unit_price']
-            subtotal = item['subtotal']
-            
-            text += (
-                f"{i}. **{product_name}**\n"
-                f"   Miqdor: {quantity} dona\n"
-                f"   Narxi: {unit_price:,} so'm (dona)\n"
-                f"   Summa: **{subtotal:,} so'm**\n"
-            ).replace(",", " ")
-
-        text += "\n"
-        text += f"**💵 JAMI QARZDORLIK SUMMASI:** **{total_debt:,} so'm**".replace(",", " ")
+    # DB dan sotuvchining mahsulotlari va umumiy summasini olish (qabul qilingan to'lovlar ayiriladi)
+    products_list, goods_total = await get_seller_products_info(seller_id)
+    paid = await handout_history.paid_total(seller_id)
 
-    await callback.message.answer(text, parse_mode="Markdown")
+    # Katta ro'yxat bir nechta xabarga bo'linadi (Telegram 4096 belgi cheklovi)
+    text = render_seller_debt(seller.name, seller.neighborhood, products_list, goods_total, paid)
+    for chunk in split_text(text):
+        await callback.message.answer(chunk, parse_mode="Markdown")
 
     # main.py ichida, 10-bo'limga qo'shing
 
-from db import get_seller_by_telegram_id # Ushbu funksiya db.py da bo'lishi kerak
-
-async def check_seller_access(message: types.Message):
-    """Sotuvchi huquqini tekshirish va Seller obyektini qaytarish."""
+async def check_seller_access(message: types.Message, seller):
+    """
+    Sotuvchi huquqini tekshirish. Seller obyekti SellerSessionMiddleware tomonidan
+    keshdan uzatiladi (handler flags={"seller": True} bilan belgilangan bo'lishi kerak).
+    """
     if is_admin(message.from_user.id):
         # Agar admin o'z buyruqlarini bosgan bo'lsa, uni qo'yib yuborish
         return True, None
         
-    seller = await get_seller_by_telegram_id(message.from_user.id)
     if not seller:
         await message.answer("Siz tizimga kirmagan ko'rinasiz. Iltimos, /start buyrug'ini bosing va parolingizni kiriting.")
         return False, None
     return True, seller
 
 
-@dp.message(F.text == "📦 Mahsulotlarim")
-async def show_seller_products(message: types.Message):
-    access, seller = await check_seller_access(message)
+@dp.message(F.text == "📦 Mahsulotlarim", flags={"seller": True})
+async def show_seller_products(message: types.Message, seller=None):
+    access, seller = await check_seller_access(message, seller)
     if not access or is_admin(message.from_user.id): return
 
     # Sotuvchi mahsulotlari funksiyasini chaqirish (Admin qismida bor)
     products_list, total_debt = await get_seller_products_info(seller.id)
     
-    text = f"📦 **{seller.name}** dagi Mahsulotlaringiz:\n\n"
-    
-    if not products_list:
-        text += "Hozircha sizda mahsulot yo'q."
-    else:
-        for i, item in enumerate(products_list, 1):
-            product_name = item['product_name']
-            quantity = item['quantity']
-            unit_price = item['unit_price']
-            
-            text += (
-                f"{i}. **{product_name}** - {unit_price:,} so'm\n"
-                f"   Miqdor: **{quantity} dona**\n"
-            ).replace(",", " ")
+    for chunk in split_text(render_seller_products(seller.name, products_list)):
+        await message.answer(chunk, parse_mode="Markdown")
 
-    await message.answer(text, parse_mode="Markdown")
 
-
-@dp.message(F.text == "💰 Qarzdorligim")
-async def show_seller_debt_total(message: types.Message):
-    access, seller = await check_seller_access(message)
+@dp.message(F.text == "💰 Qarzdorligim", flags={"seller": True})
+async def show_seller_debt_total(message: types.Message, seller=None):
+    access, seller = await check_seller_access(message, seller)
     if not access or is_admin(message.from_user.id): return
 
-    products_list, total_debt = await get_seller_products_info(seller.id)
+    # Jami summa daftardan O(1) o'qiladi, daftar hali yuklanmagan bo'lsa DB dan hisoblanadi
+    total_debt = debt_ledger.balance(seller.id)
+    if total_debt is None:
+        _, goods_total = await get_seller_products_info(seller.id)
+        total_debt = goods_total - await handout_history.paid_total(seller.id)
     
-    text = f"💰 **{seller.name}** uchun umumiy qarzdorlik:\n\n"
-    
-    if total_debt == 0:
-        text += "Ayni damda sizda qarzdorlik yo'q. Baraka toping!"
-    else:
-        text += f"**💵 JAMI QARZDORLIK SUMMASI:** **{total_debt:,} so'm**".replace(",", " ")
+    await message.answer(render_debt_total(seller.name, total_debt), parse_mode="Markdown")
+
+@dp.message(Command("stats"))
+async def show_admin_dashboard(message: types.Message, command: CommandObject):
+    """
+    Umumiy hisobot: jami qarzdorlik, mahallalar bo'yicha qarz, eng ko'p berilgan mahsulotlar
+    va qarzi chegaradan oshgan sotuvchilar. "/stats 500000" - chegarani o'zgartirish.
+    """
+    if not is_admin(message.from_user.id): return
+
+    try:
+        threshold = int((command.args or str(STATS_DEBT_THRESHOLD)).strip().replace(" ", ""))
+    except ValueError:
+        return await message.answer("Foydalanish: /stats [qarz chegarasi, so'm]")
+
+    if not debt_ledger.loaded:
+        return await message.answer("⏳ Qarzdorlik daftari hali yuklanmoqda. Birozdan keyin qayta urinib ko'ring.")
+
+    data = await admin_dashboard.snapshot(threshold)
+
+    lines = ["📈 Umumiy hisobot", "", f"💵 Jami qarzdorlik: {som(data['total_debt'])}", ""]
+
+    lines.append("🏘 Mahallalar bo'yicha:")
+    lines += [f"  {name} ({count} sotuvchi): {som(total)}" for name, count, total in data['by_neighborhood']] or ["  —"]
+
+    period = data['period']
+    lines += ["", f"📦 Oxirgi {admin_dashboard.period_days} kunda berilgan: {period['count']} ta yozuv, "
+                  f"{period['quantity']} dona, {som(period['amount'])}"]
+    lines.append("Eng ko'p berilgan mahsulotlar:")
+    lines += [f"  {i}. {name} — {qty} dona ({som(amount)})" for i, (name, qty, amount) in enumerate(data['top_products'], 1)] or ["  —"]
+
+    lines += ["", f"⚠️ Qarzi {som(threshold)} dan oshgan sotuvchilar: {len(data['over_threshold'])}"]
+    lines += [f"  {name}: {som(debt)}" for name, debt in data['over_threshold'][:30]]
+    if len(data['over_threshold']) > 30:
+        lines.append(f"  ... va yana {len(data['over_threshold']) - 30} ta")
+
+    generated = datetime.datetime.fromtimestamp(data['generated_at']).strftime("%H:%M:%S")
+    lines += ["", f"Hisoblangan vaqt: {generated}"]
+    await message.answer("\n".join(lines))
+
+@dp.message(Command("broadcast"))
+async def handle_broadcast(message: types.Message, command: CommandObject, state: FSMContext):
+    """Tizimga kirgan barcha sotuvchilarga xabar yuborish (avval tasdiqlanadi)."""
+    if not is_admin(message.from_user.id): return
+
+    text = (command.args or "").strip()
+    if not text:
+        return await message.answer("Foydalanish: /broadcast Xabar matni")
+
+    sellers = [s for s in await get_all_sellers() if getattr(s, "telegram_id", None)]
+    if not sellers:
+        return await message.answer("Botga kirgan sotuvchilar yo'q.")
+
+    await state.update_data(broadcast_text=text)
+    await state.set_state(AdminState.waiting_for_broadcast_confirm)
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[[
+        InlineKeyboardButton(text="✅ Yuborish", callback_data="broadcast_yes"),
+        InlineKeyboardButton(text="❌ Bekor qilish", callback_data="broadcast_no"),
+    ]])
+    await message.answer(f"Xabar {len(sellers)} ta sotuvchiga yuboriladi:\n\n{text}", reply_markup=keyboard)
+
+@dp.callback_query(AdminState.waiting_for_broadcast_confirm, F.data.in_({"broadcast_yes", "broadcast_no"}))
+async def confirm_broadcast(callback: types.CallbackQuery, state: FSMContext):
+    if not is_admin(callback.from_user.id): return await callback.answer("Ruxsat yo'q.")
+    await callback.answer()
 
-    await message.answer(text, parse_mode="Markdown")
+    data = await state.get_data()
+    await state.clear()
+    if callback.data == "broadcast_no":
+        return await callback.message.edit_text("Bekor qilindi.")
+
+    status = await callback.message.answer("⏳ Xabar yuborilmoqda...")
+    supervisor.spawn(run_broadcast(status, data['broadcast_text']), name="broadcast")
+
+async def run_broadcast(status: types.Message, text: str):
+    """
+    Xabarni sotuvchilarga BROADCAST_RATE tezlikda yuboradi. Bir nechta xabar parallel
+    kutadi (tarmoq kechikishi tezlikni pasaytirmasligi uchun), tartibni esa cheklovchi ushlab turadi.
+    """
+    sellers = [s for s in await get_all_sellers() if getattr(s, "telegram_id", None)]
+    limiter = RateLimiter(BROADCAST_RATE)
+    semaphore = asyncio.Semaphore(BROADCAST_CONCURRENCY)
+    result = {"sent": 0, "blocked": 0, "failed": 0}
+
+    async def send(seller):
+        async with semaphore:
+            await limiter.acquire()
+            try:
+                await bot.send_message(seller.telegram_id, text)
+                result["sent"] += 1
+            except TelegramForbiddenError:
+                result["blocked"] += 1 # Sotuvchi botni bloklagan
+            except Exception as e:
+                result["failed"] += 1
+                logger.warning(f"Broadcast: {seller.name} ga yuborilmadi: {e}")
+
+    started = time.monotonic()
+    await asyncio.gather(*(send(seller) for seller in sellers))
+    logger.info(f"Broadcast yakunlandi: {result}, {time.monotonic() - started:.1f} s")
+    await status.edit_text(
+        f"📣 Xabar yuborildi: {result['sent']} ta\n"
+        f"Botni bloklagan: {result['blocked']} ta\n"
+        f"Xato: {result['failed']} ta"
+    )
+
+@dp.message(Command("integratsiya"))
+async def show_integration_status(message: types.Message):
+    """Google Sheets integratsiyasi holatini (navbat, paketlar) ko'rsatadi."""
+    if not is_admin(message.from_user.id): return
+
+    writer_stats = sheets_writer.stats()
+    cache_stats = sheets_cache.stats()
+    executor_stats = integration_executor.stats()
+    await message.answer(
+        "📊 Google Sheets integratsiyasi:\n\n"
+        f"Navbatda (yuborilmagan): {writer_stats['backlog']} qator\n"
+        f"Yuborilgan paketlar: {writer_stats['batches_flushed']} ({writer_stats['rows_flushed']} qator)\n"
+        f"Oxirgi paket: {writer_stats['last_batch_size']} qator\n"
+        f"Takroriy qatorlar: {writer_stats['duplicates_skipped']}\n"
+        f"Avtorizatsiya: {cache_stats['auth_calls']} (tejaldi: {cache_stats['auth_avoided']})\n"
+        f"Jadval ochish: {cache_stats['open_calls']} (tejaldi: {cache_stats['open_avoided']})\n"
+        f"Executor navbati: {executor_stats['queue_depth']} (maks: {executor_stats['max_queue_depth']}), "
+        f"ishlayotgan: {executor_stats['running']}/{executor_stats['workers']}\n"
+        f"Kutish vaqti: o'rtacha {executor_stats['avg_wait_ms']} ms, maks {executor_stats['max_wait_ms']} ms\n"
+        f"Sheets chaqiruvlari: bekor qilingan {executor_stats['dropped']}, navbatga olinmagan {executor_stats['spilled']}\n"
+        f"Fon vazifalari: {supervisor.active} ta faol"
+    )
+
+@dp.message(Command("sheets_tekshir"))
+async def handle_sheet_reconcile(message: types.Message, command: CommandObject):
+    """
+    Google Sheets jadvalini botdagi tovar berish tarixining oxirgi N kuni bilan solishtiradi.
+    "/sheets_tekshir 7" - oxirgi 7 kun (standart: SHEETS_RECONCILE_DAYS).
+    "/sheets_tekshir tikla" - jadvalda yo'q qatorlarni bitta paket bilan qayta yozadi.
+    """
+    if not is_admin(message.from_user.id): return
+
+    args = (command.args or "").lower().split()
+    backfill = "tikla" in args
+    days = next((int(arg) for arg in args if arg.isdigit() and int(arg) > 0), SHEETS_RECONCILE_DAYS)
+    status = await message.answer(f"⏳ Jadval bot tarixining oxirgi {days} kuni bilan solishtirilmoqda...")
+    supervisor.spawn(run_sheet_reconcile(status, backfill, days), name="sheets_reconcile")
+
+async def run_sheet_reconcile(status: types.Message, backfill: bool, days: int = SHEETS_RECONCILE_DAYS):
+    try:
+        report = await reconcile_sheet(handout_history, backfill=backfill, days=days)
+    except Exception as e:
+        logger.error(f"Sheets solishtiruvida xato: {e}")
+        return await status.edit_text(f"❌ Jadvalni o'qib bo'lmadi: {e}")
+
+    def sample(keys):
+        # Xabar juda uzun bo'lmasligi uchun faqat birinchi bir nechta ID ko'rsatiladi
+        return (": " + ", ".join(keys[:5]) + (" ..." if len(keys) > 5 else "")) if keys else ""
+
+    lines = [
+        f"📊 Sheets va bot tarixi solishtiruvi (oxirgi {report['days']} kun):",
+        "",
+        f"Jadvaldagi qatorlar: {report['sheet_rows']}",
+        f"Bot tarixidagi qatorlar: {report['local_rows']}",
+        f"Jadvalda yo'q: {len(report['missing'])}{sample(report['missing'])}",
+        f"Jadvalda ortiqcha: {len(report['extra'])}{sample(report['extra'])}",
+        f"Qo'lda o'zgartirilgan: {len(report['changed'])}{sample(report['changed'])}",
+        f"Tranzaksiya ID siz: {report['without_id']}",
+    ]
+    if backfill:
+        lines.append(f"Qayta yozildi: {report['backfilled']}")
+    elif report['missing']:
+        lines.append(f"\nYo'q qatorlarni yozish uchun: /sheets_tekshir {report['days']} tikla")
+    await status.edit_text("\n".join(lines))
 
 # --- 11. BOTNI ISHGA TUSHIRISH FUNKSIYASI ---
 
+def health_info() -> dict:
+    """Webhook rejimidagi /healthz javobi uchun qisqa holat ma'lumotlari."""
+    return {
+        "mode": RUN_MODE,
+        "sheets_backlog": sheets_writer.backlog(),
+        "background_tasks": supervisor.active,
+        "db_pool": pool_metrics.stats(),
+    }
+
 async def main():
-    """Botning asosiy ishga tushirish mantig'i (Long Polling)"""
+    """Botning asosiy ishga tushirish mantig'i (Long Polling yoki Webhook)"""
     logger.info("Bot ishga tushirilmoqda...")
     
     if not BOT_TOKEN or ADMIN_ID is None:
@@ -655,14 +1531,61 @@ async def main():
 
     # DB ni ishga tushirish
     try:
+        get_engine() # Bot modullarining umumiy engine i (DB_* hovuz sozlamalari bilan)
         await init_db()
+        await create_indexes()
+        await handout_history.create_tables()
+        await handout_history.import_local()
+        await credential_store.create_tables()
+        await credential_store.import_local()
+        await product_cache.load()
         logger.info("Ma'lumotlar bazasi tayyor.")
     except Exception as e:
         logger.error(f"DB initsializatsiyasida jiddiy xato: {e}. Bot ishga tushirilmadi.")
         return
 
-    # Long Pollingni ishga tushirish
-    await dp.start_polling(bot)
+    # Google Sheets paketli yozuvchisini ishga tushirish
+    sheets_writer.start()
+
+    # Qarzdorlik daftarini fonda yuklash va davriy tekshiruvni boshlash
+    supervisor.spawn(debt_ledger.load(), name="ledger_load")
+    debt_ledger.start()
+
+    # Long Polling yoki Webhook serverini ishga tushirish
+    # (SIGTERM/SIGINT kelganda ikkala rejim ham to'xtaydi va boshqaruv finally ga o'tadi)
+    try:
+        if RUN_MODE == "webhook":
+            await run_webhook(dp, bot, health_info)
+        else:
+            await dp.start_polling(bot)
+    finally:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + SHUTDOWN_TIMEOUT
+
+        await debt_ledger.stop()
+
+        # 1. Fon vazifalarini muddat ichida yakunlash
+        task_stats = await supervisor.drain(SHUTDOWN_TIMEOUT)
+        logger.info(f"Fon vazifalari: {task_stats['finished']} ta tugadi, {task_stats['dropped']} ta bekor qilindi, {task_stats['failed']} ta xato.")
+
+        # 2. Jurnalda qolgan qatorlarni Sheetsga yozib yuborish (ulgurmaganlari diskda qoladi)
+        try:
+            await asyncio.wait_for(sheets_writer.stop(), timeout=max(1.0, deadline - loop.time()))
+        except asyncio.TimeoutError:
+            logger.warning(f"Sheetsga yozish muddatda tugamadi. Keyingi ishga tushishda yuboriladi: {sheets_writer.backlog()} qator")
+        logger.info(f"Sheets yozuvchisi to'xtadi: {sheets_writer.stats()}")
+        logger.info(f"Sheets ulanish keshi: {sheets_cache.stats()}")
+        logger.info(f"Integratsiya executori: {integration_executor.stats()}")
+        logger.info(f"Mahsulotlar keshi: {product_cache.stats()}")
+        logger.info(f"Sotuvchi sessiyalari keshi: {seller_sessions.stats()}")
+        logger.info(f"So'rovlar cheklovi: {throttle.stats()}")
+        logger.info(f"Chiquvchi xabarlar: {send_governor.stats()}")
+        logger.info(f"Qarzdorlik daftari: {debt_ledger.stats()}")
+        logger.info(f"Hisobot keshi: {admin_dashboard.stats()}")
+        logger.info(f"DB hovuzi: {pool_metrics.stats()}, so'rovlar hisoblagichi: {query_budget.stats()}")
+        integration_executor.shutdown()
+        await dispose_engine()
+        await dp.storage.close()
 
 if __name__ == '__main__':
     # Event Loopni ishga tushirish
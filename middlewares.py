@@ -0,0 +1,277 @@
+# middlewares.py
+
+import os
+import time
+import logging
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.dispatcher.flags import get_flag
+from aiogram.types import TelegramObject, CallbackQuery, Message
+
+from db import get_seller_by_telegram_id
+from dbpool import start_query_count, stop_query_count, DB_QUERY_BUDGET
+
+logger = logging.getLogger(__name__)
+
+# --- 1. SOZLAMALAR ---
+SELLER_CACHE_TTL = float(os.getenv("SELLER_CACHE_TTL", "3600")) # soniya
+SELLER_CACHE_SIZE = int(os.getenv("SELLER_CACHE_SIZE", "1000"))
+
+# Foydalanuvchi boshiga: RATE_LIMIT_BURST ta ketma-ket so'rov, keyin soniyasiga RATE_LIMIT_PER_SECOND ta
+RATE_LIMIT_BURST = int(os.getenv("RATE_LIMIT_BURST", "5"))
+RATE_LIMIT_PER_SECOND = float(os.getenv("RATE_LIMIT_PER_SECOND", "1"))
+# Bitta xabar (qayta yetkazilgan update) yoki bitta xabardagi tugma shu oraliqda qayta kelsa,
+# ikkinchisi tashlab yuboriladi (soniya). Yangi xabarlar - matni bir xil bo'lsa ham - o'tadi
+DEDUP_WINDOW = float(os.getenv("DEDUP_WINDOW", "2"))
+# Cheklovga tushgan foydalanuvchiga "juda tez" ogohlantirishi shu oraliqda bir martadan ko'p yuborilmaydi
+THROTTLE_NOTICE_INTERVAL = float(os.getenv("THROTTLE_NOTICE_INTERVAL", "10"))
+THROTTLE_NOTICE = "⏳ Juda tez. Birozdan keyin urinib ko'ring."
+
+
+# --- 2. SOTUVCHI SESSIYALARI KESHI ---
+
+class SellerSessionCache:
+    """
+    telegram_id -> Seller moslamasini TTL va LRU cheklovi bilan xotirada saqlaydi.
+    Tizimga kirgandan keyin bu moslama o'zgarmaydi, shuning uchun har xabarda DB ga borish shart emas.
+    """
+
+    def __init__(self, ttl: float = SELLER_CACHE_TTL, max_size: int = SELLER_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max(1, max_size)
+        self._items = OrderedDict() # telegram_id -> (muddati, seller)
+
+        # Statistika
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, telegram_id: int):
+        item = self._items.get(telegram_id)
+        if item is None or item[0] < time.monotonic():
+            if item is not None:
+                del self._items[telegram_id]
+            self.misses += 1
+            return None
+        self._items.move_to_end(telegram_id)
+        self.hits += 1
+        return item[1]
+
+    def put(self, telegram_id: int, seller):
+        self._items[telegram_id] = (time.monotonic() + self.ttl, seller)
+        self._items.move_to_end(telegram_id)
+        while len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+
+    def invalidate(self, telegram_id: int = None, seller_id: int = None):
+        """Sotuvchi ma'lumotlari o'zgarganda uning sessiyasini keshdan o'chiradi."""
+        if telegram_id is not None:
+            self._items.pop(telegram_id, None)
+        if seller_id is not None:
+            for key in [k for k, (_, s) in self._items.items() if s.id == seller_id]:
+                del self._items[key]
+
+    def clear(self):
+        self._items.clear()
+
+    def stats(self) -> dict:
+        return {"size": len(self._items), "hits": self.hits, "misses": self.misses}
+
+
+seller_sessions = SellerSessionCache()
+
+
+# --- 3. MIDDLEWARE ---
+
+class SellerSessionMiddleware(BaseMiddleware):
+    """
+    flags={"seller": True} bilan belgilangan handlerlarga `seller` argumentini uzatadi.
+    Sotuvchi keshdan olinadi, faqat keshda bo'lmasa DB ga so'rov yuboriladi.
+    Tizimga kirmagan foydalanuvchi uchun seller=None bo'ladi.
+    """
+
+    def __init__(self, cache: SellerSessionCache = seller_sessions, skip_user_ids: set = None):
+        self.cache = cache
+        self.skip_user_ids = skip_user_ids or set() # Adminlar uchun sotuvchi qidirilmaydi
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        if not get_flag(data, "seller"):
+            return await handler(event, data)
+
+        user = data.get("event_from_user")
+        seller = None
+        if user is not None and user.id not in self.skip_user_ids:
+            seller = self.cache.get(user.id)
+            if seller is None:
+                seller = await get_seller_by_telegram_id(user.id)
+                if seller:
+                    self.cache.put(user.id, seller)
+
+        data["seller"] = seller
+        return await handler(event, data)
+
+
+class QueryBudgetMiddleware(BaseMiddleware):
+    """
+    Bitta handler bajargan DB so'rovlarini sanaydi (dbpool hisoblagichi orqali).
+    Chegaradan oshsa ogohlantirish yoziladi - ro'yxatni aylanib har element uchun
+    alohida so'rov yuboradigan (N+1) handlerlarni shunday topamiz.
+    Boshqa middlewarelardan oldin ro'yxatga olinishi kerak (ularning so'rovlari ham hisoblansin).
+    """
+
+    def __init__(self, budget: int = DB_QUERY_BUDGET):
+        self.budget = budget
+
+        # Statistika
+        self.handled = 0
+        self.over_budget = 0
+        self.max_queries = 0
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        token, counter = start_query_count()
+        try:
+            return await handler(event, data)
+        finally:
+            stop_query_count(token)
+            self.handled += 1
+            self.max_queries = max(self.max_queries, counter[0])
+            if counter[0] > self.budget:
+                self.over_budget += 1
+                handler_object = data.get("handler")
+                name = handler_object.callback.__name__ if handler_object else type(event).__name__
+                user = data.get("event_from_user")
+                logger.warning(
+                    f"DB so'rovlar chegarasidan oshdi: {name} {counter[0]} ta so'rov "
+                    f"(chegara {self.budget}), foydalanuvchi {user.id if user else '-'}"
+                )
+
+    def stats(self) -> dict:
+        return {"handled": self.handled, "over_budget": self.over_budget, "max_queries": self.max_queries}
+
+
+# Butun jarayon uchun yagona hisoblagich (main.py message va callback_query ga ulaydi)
+query_budget = QueryBudgetMiddleware()
+
+
+class ThrottleMiddleware(BaseMiddleware):
+    """
+    Har bir foydalanuvchi uchun token bucket va qisqa oynali takror keshi.
+    outer_middleware sifatida ulanadi - cheklangan update filtrlar, boshqa middlewarelar
+    va handlerga yetib bormaydi, DB ga ham so'rov yuborilmaydi.
+
+    Takror kaliti update ning o'ziga bog'langan: xabar uchun (chat, message_id) - Telegram
+    qayta yetkazgan update, tugma uchun (tugmali xabar, callback_data) - bir tugmani ikki marta
+    bosish. Matni bir xil bo'lgan yangi xabarlar (masalan, FSM qadamida ketma-ket "1") o'tadi.
+    Cheklovga tushgan foydalanuvchiga ogohlantirish yuboriladi (THROTTLE_NOTICE_INTERVAL da bir marta).
+    """
+
+    def __init__(self, burst: int = RATE_LIMIT_BURST, per_second: float = RATE_LIMIT_PER_SECOND,
+                 dedup_window: float = DEDUP_WINDOW, exempt_user_ids: set = None, max_users: int = 10000,
+                 notice_interval: float = THROTTLE_NOTICE_INTERVAL):
+        self.burst = max(1, burst)
+        self.per_second = per_second
+        self.dedup_window = dedup_window
+        self.exempt_user_ids = exempt_user_ids or set() # Token bucket qo'llanilmaydi (takror tekshiruvi qoladi)
+        self.max_users = max_users
+        self.notice_interval = notice_interval
+        self._buckets = {} # user_id -> (tokenlar, oxirgi yangilanish)
+        self._noticed = {} # user_id -> oxirgi ogohlantirish vaqti
+        self._recent = OrderedDict() # (user_id, kalit) -> vaqt
+
+        # Statistika
+        self.passed = 0
+        self.throttled = 0
+        self.duplicates = 0
+
+    def _take_token(self, user_id: int, now: float) -> bool:
+        tokens, updated = self._buckets.get(user_id, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.per_second)
+        allowed = tokens >= 1
+        self._buckets[user_id] = (tokens - 1 if allowed else tokens, now)
+        if len(self._buckets) > self.max_users:
+            # To'liq tiklangan chelaklarni tashlab yuboramiz
+            idle = self.burst / self.per_second if self.per_second > 0 else 0
+            self._buckets = {uid: b for uid, b in self._buckets.items() if now - b[1] < idle}
+            self._noticed = {uid: t for uid, t in self._noticed.items() if now - t < self.notice_interval}
+        return allowed
+
+    def _should_notice(self, user_id: int, now: float) -> bool:
+        # Har bir tashlangan xabarga javob yozilsa, cheklovning o'zi spamga aylanadi
+        if now - self._noticed.get(user_id, float("-inf")) < self.notice_interval:
+            return False
+        self._noticed[user_id] = now
+        return True
+
+    def _is_duplicate(self, key, now: float) -> bool:
+        # Eskirgan yozuvlar boshidan tozalanadi (OrderedDict vaqt tartibida)
+        while self._recent:
+            seen = next(iter(self._recent.values()))
+            if now - seen < self.dedup_window:
+                break
+            self._recent.popitem(last=False)
+        return key in self._recent
+
+    def _remember(self, key, now: float):
+        self._recent[key] = now
+
+    @staticmethod
+    def _dedup_key(event: TelegramObject):
+        if isinstance(event, CallbackQuery):
+            if event.message is None:
+                return None
+            return ("callback", event.message.chat.id, event.message.message_id, event.data)
+        if isinstance(event, Message):
+            return ("message", event.chat.id, event.message_id)
+        return None
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        user = data.get("event_from_user")
+        if user is None:
+            return await handler(event, data)
+
+        now = time.monotonic()
+        key = self._dedup_key(event)
+        if key is not None and self._is_duplicate((user.id, key), now):
+            self.duplicates += 1
+            if isinstance(event, CallbackQuery):
+                await event.answer() # Tugmadagi "soat" belgisini o'chirish, xabarsiz
+            return None
+
+        if user.id not in self.exempt_user_ids and not self._take_token(user.id, now):
+            self.throttled += 1
+            if isinstance(event, CallbackQuery):
+                await event.answer(THROTTLE_NOTICE)
+            elif isinstance(event, Message) and self._should_notice(user.id, now):
+                await event.answer(THROTTLE_NOTICE)
+            return None
+
+        # Faqat handlerga uzatilgan update eslab qolinadi - cheklov tufayli tashlangan xabarni
+        # foydalanuvchi qayta yuborsa, u takror deb hisoblanmasligi kerak
+        if key is not None:
+            self._remember((user.id, key), now)
+        self.passed += 1
+        return await handler(event, data)
+
+    def stats(self) -> dict:
+        return {
+            "passed": self.passed,
+            "throttled": self.throttled,
+            "duplicates": self.duplicates,
+            "users": len(self._buckets),
+        }
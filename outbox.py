@@ -0,0 +1,132 @@
+# outbox.py
+
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# --- 1. SOZLAMALAR ---
+# Google Sheetsga yuborilishi kerak bo'lgan qatorlar avval shu lokal faylga yoziladi.
+# Render.com da doimiy disk (Persistent Disk) ulangan bo'lsa, yo'lni o'sha diskka ko'rsating.
+OUTBOX_DB_PATH = os.getenv("OUTBOX_DB_PATH", "outbox.sqlite3")
+
+# Yuborilgan qatorlar necha kun saqlanadi (takrorlarni aniqlash va tarix uchun)
+OUTBOX_RETENTION_DAYS = int(os.getenv("OUTBOX_RETENTION_DAYS", "30"))
+
+
+# --- 2. LOKAL JURNAL (OUTBOX) ---
+
+class SheetsOutbox:
+    """
+    Sheets qatorlari uchun faqat qo'shiladigan (append-only) SQLite jurnali.
+    Har bir qator idempotency kaliti bilan saqlanadi, shuning uchun bir xil
+    tranzaksiya ikki marta yozilmaydi.
+    """
+
+    def __init__(self, path: str = OUTBOX_DB_PATH):
+        self.path = path
+        # Executor oqimlaridan ham chaqiriladi, shuning uchun qulf bilan himoyalaymiz
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS sheets_outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                idempotency_key TEXT NOT NULL UNIQUE,
+                row_json TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                sent_at REAL
+            );
+            CREATE INDEX IF NOT EXISTS ix_sheets_outbox_pending
+                ON sheets_outbox (id) WHERE sent_at IS NULL;
+            CREATE INDEX IF NOT EXISTS ix_sheets_outbox_created
+                ON sheets_outbox (created_at);
+            """
+        )
+
+    def put(self, key: str, row: list) -> bool:
+        """Qatorni jurnalga yozadi. Kalit avval yozilgan bo'lsa, False qaytaradi."""
+        with self._lock:
+            cur = self._conn.execute(
+                "INSERT OR IGNORE INTO sheets_outbox (idempotency_key, row_json, created_at) VALUES (?, ?, ?)",
+                (key, json.dumps(row, ensure_ascii=False), time.time()),
+            )
+            return cur.rowcount == 1
+
+    def put_many(self, items: list) -> int:
+        """[(kalit, qator)] ni bitta tranzaksiyada yozadi. Yangi qo'shilganlar sonini qaytaradi."""
+        now = time.time()
+        params = [(key, json.dumps(row, ensure_ascii=False), now) for key, row in items]
+        with self._lock:
+            before = self._conn.total_changes
+            self._executemany(
+                "INSERT OR IGNORE INTO sheets_outbox (idempotency_key, row_json, created_at) VALUES (?, ?, ?)", params
+            )
+            return self._conn.total_changes - before
+
+    def pending(self, limit: int) -> list:
+        """Hali yuborilmagan eng eski qatorlarni (id, kalit, qator, urinishlar) ko'rinishida qaytaradi."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, idempotency_key, row_json, attempts FROM sheets_outbox "
+                "WHERE sent_at IS NULL ORDER BY id LIMIT ?",
+                (limit,),
+            ).fetchall()
+        return [(row_id, key, json.loads(row_json), attempts) for row_id, key, row_json, attempts in rows]
+
+    def mark_attempt(self, ids: list):
+        """Yuborishdan oldin urinishlar sonini oshiradi (qulashdan keyin takrorni aniqlash uchun)."""
+        self._update_many("UPDATE sheets_outbox SET attempts = attempts + 1 WHERE id = ?", ids)
+
+    def mark_sent(self, ids: list):
+        """Qatorlarni yuborilgan deb belgilaydi."""
+        now = time.time()
+        with self._lock:
+            self._executemany("UPDATE sheets_outbox SET sent_at = ? WHERE id = ?", [(now, row_id) for row_id in ids])
+
+    def pending_keys(self) -> set:
+        """Hali yuborilmagan qatorlarning idempotency kalitlari."""
+        with self._lock:
+            rows = self._conn.execute("SELECT idempotency_key FROM sheets_outbox WHERE sent_at IS NULL").fetchall()
+        return {key for (key,) in rows}
+
+    def pending_count(self) -> int:
+        """Navbatda turgan (yuborilmagan) qatorlar soni."""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM sheets_outbox WHERE sent_at IS NULL").fetchone()[0]
+
+    def purge_sent(self, retention_days: int = OUTBOX_RETENTION_DAYS) -> int:
+        """Eski, allaqachon yuborilgan qatorlarni o'chiradi."""
+        cutoff = time.time() - retention_days * 86400
+        with self._lock:
+            cur = self._conn.execute(
+                "DELETE FROM sheets_outbox WHERE sent_at IS NOT NULL AND sent_at < ?", (cutoff,)
+            )
+            return cur.rowcount
+
+    def _update_many(self, sql: str, ids: list):
+        with self._lock:
+            self._executemany(sql, [(row_id,) for row_id in ids])
+
+    def _executemany(self, sql: str, params: list):
+        # Qulf ostida chaqiriladi. Xato bo'lsa tranzaksiya bekor qilinadi - aks holda ulanish
+        # ochiq tranzaksiyada qolib, keyingi har bir BEGIN "transaction within a transaction" bilan yiqiladi
+        self._conn.execute("BEGIN")
+        try:
+            self._conn.executemany(sql, params)
+            self._conn.execute("COMMIT")
+        except BaseException:
+            if self._conn.in_transaction:
+                self._conn.execute("ROLLBACK")
+            raise
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
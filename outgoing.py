@@ -0,0 +1,141 @@
+# outgoing.py
+
+import os
+import time
+import asyncio
+import logging
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramRetryAfter
+
+logger = logging.getLogger(__name__)
+
+# --- 1. SOZLAMALAR ---
+# Telegram cheklovlari: bitta chatga ~1 xabar/soniya, umumiy ~30 xabar/soniya.
+# Standart qiymatlar zaxira bilan olingan.
+SEND_GLOBAL_RATE = float(os.getenv("SEND_GLOBAL_RATE", "25")) # xabar/soniya
+SEND_GLOBAL_BURST = int(os.getenv("SEND_GLOBAL_BURST", "5"))
+SEND_PER_CHAT_RATE = float(os.getenv("SEND_PER_CHAT_RATE", "1"))
+SEND_PER_CHAT_BURST = int(os.getenv("SEND_PER_CHAT_BURST", "3"))
+SEND_MAX_RETRIES = int(os.getenv("SEND_MAX_RETRIES", "3"))
+
+# Ommaviy xabar (broadcast) tezligi umumiy chegaradan past - oddiy javoblarga joy qoladi
+BROADCAST_RATE = float(os.getenv("BROADCAST_RATE", "20"))
+BROADCAST_CONCURRENCY = int(os.getenv("BROADCAST_CONCURRENCY", "10"))
+
+
+# --- 2. TEZLIK CHEKLOVCHISI ---
+
+class RateLimiter:
+    """
+    GCRA (token bucket ning navbatli ko'rinishi): burst tagacha xabar darhol o'tadi,
+    keyingilari soniyasiga rate ta tezlikda navbat bilan (FIFO) chiqariladi.
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.burst = max(1, burst)
+        self._tat = 0.0 # keyingi "nazariy" bo'sh vaqt
+        self.last_used = 0.0
+
+    def reserve(self) -> float:
+        """Navbatga joy oladi va qancha kutish kerakligini qaytaradi (soniya)."""
+        now = time.monotonic()
+        tat = max(self._tat, now)
+        wait = tat - (self.burst - 1) * self.interval - now
+        self._tat = tat + self.interval
+        self.last_used = now
+        return max(0.0, wait)
+
+    async def acquire(self) -> float:
+        wait = self.reserve()
+        if wait:
+            await asyncio.sleep(wait)
+        return wait
+
+    def pause(self, seconds: float):
+        """Telegram retry_after qaytarsa, shu muddat ichida yangi xabar chiqarilmaydi (burst ham)."""
+        self._tat = max(self._tat, time.monotonic() + seconds + (self.burst - 1) * self.interval)
+
+
+# --- 3. CHIQUVCHI SO'ROVLAR NAZORATCHISI ---
+
+class SendGovernor(BaseRequestMiddleware):
+    """
+    bot.session middlewaresi: chatga yuboriladigan barcha so'rovlar (send_message,
+    answer_document, edit_message_text, ...) chat va umumiy tezlik cheklovidan o'tadi.
+    TelegramRetryAfter kelsa, chat va umumiy navbat ko'rsatilgan vaqtga to'xtatiladi va so'rov qayta yuboriladi.
+    chat_id siz so'rovlar (getUpdates, answerCallbackQuery, ...) cheklanmaydi.
+    """
+
+    def __init__(self, global_rate: float = SEND_GLOBAL_RATE, global_burst: int = SEND_GLOBAL_BURST,
+                 chat_rate: float = SEND_PER_CHAT_RATE, chat_burst: int = SEND_PER_CHAT_BURST,
+                 max_retries: int = SEND_MAX_RETRIES, max_chats: int = 10000):
+        self.global_limiter = RateLimiter(global_rate, global_burst)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self.max_chats = max_chats
+        self._chats = {} # chat_id -> RateLimiter
+
+        # Statistika
+        self.sent = 0
+        self.delayed = 0
+        self.wait_total = 0.0
+        self.retries = 0
+        self.failed = 0
+
+    def _chat_limiter(self, chat_id) -> RateLimiter:
+        limiter = self._chats.get(chat_id)
+        if limiter is None:
+            if len(self._chats) >= self.max_chats:
+                # Bir daqiqadan beri ishlatilmagan chatlar cheklovchisi kerak emas
+                idle_before = time.monotonic() - 60
+                self._chats = {cid: lim for cid, lim in self._chats.items() if lim.last_used > idle_before}
+            limiter = self._chats[chat_id] = RateLimiter(self.chat_rate, self.chat_burst)
+        return limiter
+
+    async def __call__(self, make_request, bot, method):
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is None:
+            return await make_request(bot, method)
+
+        chat_limiter = self._chat_limiter(chat_id)
+        for attempt in range(self.max_retries + 1):
+            # Avval chat navbati, keyin umumiy navbat (chat kutayotganda umumiy joy band qilinmaydi)
+            waited = await chat_limiter.acquire()
+            waited += await self.global_limiter.acquire()
+            if waited:
+                self.delayed += 1
+                self.wait_total += waited
+            try:
+                response = await make_request(bot, method)
+                self.sent += 1
+                return response
+            except TelegramRetryAfter as e:
+                # retry_after bot darajasidagi cheklov ham bo'lishi mumkin - boshqa chatlarga ham
+                # shu muddat ichida yuborilmaydi, aks holda ular ham 429 oladi
+                chat_limiter.pause(e.retry_after)
+                self.global_limiter.pause(e.retry_after)
+                if attempt >= self.max_retries:
+                    self.failed += 1
+                    raise
+                self.retries += 1
+                logger.warning(
+                    f"Telegram cheklovi ({type(method).__name__}, chat {chat_id}): "
+                    f"{e.retry_after} s kutilmoqda, {attempt + 1}-qayta urinish."
+                )
+
+    def stats(self) -> dict:
+        return {
+            "sent": self.sent,
+            "delayed": self.delayed,
+            "avg_wait_ms": round(self.wait_total / self.delayed * 1000, 1) if self.delayed else 0.0,
+            "retries": self.retries,
+            "failed": self.failed,
+            "chats": len(self._chats),
+        }
+
+
+# Butun jarayon uchun yagona nazoratchi (main.py bot.session ga ulaydi)
+send_governor = SendGovernor()
@@ -0,0 +1,66 @@
+# pagination.py
+
+import os
+import bisect
+from typing import NamedTuple
+
+from aiogram.types import InlineKeyboardButton
+
+# --- 1. SOZLAMALAR ---
+# Bir sahifadagi elementlar soni (Telegram xabari 4096 belgidan oshmasligi uchun)
+PAGE_SIZE = int(os.getenv("PAGE_SIZE", "20"))
+
+
+# --- 2. KURSOR (KEYSET) BO'YICHA SAHIFALASH ---
+
+class Page(NamedTuple):
+    items: list
+    start: int # Butun ro'yxatdagi birinchi elementning tartib raqami (0 dan)
+    has_prev: bool
+    has_next: bool
+
+
+def keyset_page(items: list, key, cursor=None, backward: bool = False, size: int = PAGE_SIZE) -> Page:
+    """
+    key bo'yicha saralangan ro'yxatdan bitta sahifani qaytaradi.
+    cursor - oldingi sahifa chegarasidagi elementning kaliti:
+      backward=False: kalitdan keyingi elementlar (keyingi sahifa)
+      backward=True:  kalitdan oldingi elementlar (oldingi sahifa)
+    OFFSET ishlatilmaydi, shuning uchun ro'yxat o'zgarsa ham sahifalar siljimaydi.
+    Kursor tomonida element qolmagan bo'lsa (masalan, ular o'chirilgan), birinchi sahifa qaytadi;
+    ro'yxat bo'sh bo'lsagina sahifa bo'sh bo'ladi.
+    """
+    keys = [key(item) for item in items]
+    if cursor is None:
+        start = 0
+    elif backward:
+        end = bisect.bisect_left(keys, cursor)
+        start = max(0, end - size)
+    else:
+        start = bisect.bisect_right(keys, cursor)
+
+    stop = min(len(items), start + size)
+    if backward and cursor is not None:
+        stop = min(stop, bisect.bisect_left(keys, cursor))
+    if start >= stop and cursor is not None:
+        return keyset_page(items, key, None, False, size)
+    return Page(items=items[start:stop], start=start, has_prev=start > 0, has_next=stop < len(items))
+
+
+def nav_buttons(prefix: str, page: Page, first_cursor, last_cursor) -> list:
+    """
+    Sahifa tugmalari qatori: callback_data = "{prefix}_prev_{kursor}" / "{prefix}_next_{kursor}".
+    Bo'sh ro'yxat qaytsa, tugma kerak emas.
+    """
+    row = []
+    if page.has_prev:
+        row.append(InlineKeyboardButton(text="◀️ Oldingi", callback_data=f"{prefix}_prev_{first_cursor}"))
+    if page.has_next:
+        row.append(InlineKeyboardButton(text="Keyingi ▶️", callback_data=f"{prefix}_next_{last_cursor}"))
+    return row
+
+
+def parse_page_callback(data: str):
+    """ "{prefix}_next_{kursor}" -> (backward, kursor). Kursor butun son sifatida qaytadi."""
+    _, direction, cursor = data.rsplit("_", 2)
+    return direction == "prev", int(cursor)
@@ -0,0 +1,157 @@
+# queries.py
+
+import logging
+
+from sqlalchemy import select, func, tuple_, literal, Index
+
+from db_models import Seller, Product, SellerProduct
+from dbpool import get_sessionmaker, get_engine
+from history import seller_entries, ENTRY_PAYMENT
+
+logger = logging.getLogger(__name__)
+
+# Sotuvchidagi mahsulot summasi: miqdor * joriy narx
+_subtotal = SellerProduct.quantity * Product.price
+
+
+# --- 1. QARZDORLIK SO'ROVLARI ---
+# Hamma so'rovlar ORM obyektlari emas, oddiy qatorlar (tuple) qaytaradi va
+# relationship lazy-load ishlatmaydi: sotuvchilar soni qancha bo'lmasin, bitta SELECT.
+# Sessiyalar umumiy engine ustida ochiladi (dbpool.get_sessionmaker()).
+
+async def seller_debt_totals() -> list:
+    """
+    Har bir sotuvchining jami qarzdorligi (to'lovlar ayirilmagan, faqat tovarlar) bitta GROUP BY bilan:
+    [(seller_id, ism, mahalla, jami)]. Tovari yo'q sotuvchilar 0 bilan qaytadi.
+    """
+    stmt = (
+        select(Seller.id, Seller.name, Seller.neighborhood, func.coalesce(func.sum(_subtotal), 0))
+        .select_from(Seller)
+        .outerjoin(SellerProduct, SellerProduct.seller_id == Seller.id)
+        .outerjoin(Product, Product.id == SellerProduct.product_id)
+        .group_by(Seller.id, Seller.name, Seller.neighborhood)
+    )
+    async with get_sessionmaker()() as session:
+        return (await session.execute(stmt)).all()
+
+
+async def seller_balances(seller_ids=None) -> list:
+    """
+    Har bir sotuvchining tovarlar summasi va qabul qilingan to'lovlari bitta so'rovda:
+    [(seller_id, ism, mahalla, tovarlar, to'lovlar)], ism va id tartibida. Qarzdorlik = tovarlar - to'lovlar.
+    seller_ids berilsa - faqat shu sotuvchilar.
+    """
+    goods = (
+        select(SellerProduct.seller_id, func.sum(_subtotal).label("total"))
+        .join(Product, Product.id == SellerProduct.product_id)
+        .group_by(SellerProduct.seller_id)
+        .subquery()
+    )
+    paid = (
+        select(seller_entries.c.seller_id, func.sum(seller_entries.c.amount).label("total"))
+        .where(seller_entries.c.kind == ENTRY_PAYMENT)
+        .group_by(seller_entries.c.seller_id)
+        .subquery()
+    )
+    stmt = (
+        select(
+            Seller.id, Seller.name, Seller.neighborhood,
+            func.coalesce(goods.c.total, 0), func.coalesce(paid.c.total, 0),
+        )
+        .outerjoin(goods, goods.c.seller_id == Seller.id)
+        .outerjoin(paid, paid.c.seller_id == Seller.id)
+        .order_by(Seller.name, Seller.id)
+    )
+    if seller_ids is not None:
+        stmt = stmt.where(Seller.id.in_(seller_ids))
+    async with get_sessionmaker()() as session:
+        return [
+            (seller_id, name, neighborhood, int(goods_total), int(paid_total))
+            for seller_id, name, neighborhood, goods_total, paid_total in await session.execute(stmt)
+        ]
+
+
+async def iter_seller_product_rows(seller_id: int = None, seller_ids=None):
+    """
+    Sotuvchilardagi mahsulotlar bitta JOIN so'rovi bilan, oqim (server-side cursor) orqali:
+    (seller_id, ism, mahalla, mahsulot, miqdor, narx, summa). seller_id berilsa - faqat shu sotuvchi,
+    seller_ids berilsa - faqat shu sotuvchilar.
+    """
+    stmt = (
+        select(
+            Seller.id, Seller.name, Seller.neighborhood,
+            Product.name, SellerProduct.quantity, Product.price, _subtotal,
+        )
+        .join(SellerProduct, SellerProduct.seller_id == Seller.id)
+        .join(Product, Product.id == SellerProduct.product_id)
+        .where(SellerProduct.quantity > 0)
+        .order_by(Seller.name, Seller.id, Product.name)
+    )
+    if seller_id is not None:
+        stmt = stmt.where(Seller.id == seller_id)
+    if seller_ids is not None:
+        stmt = stmt.where(Seller.id.in_(seller_ids))
+
+    async with get_sessionmaker()() as session:
+        result = await session.stream(stmt.execution_options(yield_per=500))
+        async for row in result:
+            yield tuple(row)
+
+
+# --- 2. SOTUVCHILARNI FILTRLASH ---
+
+async def find_seller_ids(name: str = None, neighborhood: str = None) -> list:
+    """Ism va/yoki mahalla bo'yicha (katta-kichik harf farqisiz) sotuvchilar ID lari - filtr SQL da bajariladi."""
+    stmt = select(Seller.id)
+    if name:
+        stmt = stmt.where(func.lower(Seller.name) == name.lower())
+    if neighborhood:
+        stmt = stmt.where(func.lower(Seller.neighborhood) == neighborhood.lower())
+    async with get_sessionmaker()() as session:
+        return list((await session.execute(stmt)).scalars())
+
+
+# --- 3. SOTUVCHILAR RO'YXATI SAHIFALARI ---
+# Kursor (keyset) sahifalash DB ning o'zida: WHERE (name, id) > (:name, :id) ORDER BY name, id LIMIT n.
+# Har bir sahifa uchun faqat size + 1 qator o'qiladi, butun ro'yxat xotiraga yuklanmaydi.
+# (name, id) indeksi bo'lmasa, har bir sahifa butun jadvalni saralaydi.
+
+_seller_key = tuple_(Seller.name, Seller.id)
+seller_name_index = Index("ix_sellers_name_id", Seller.name, Seller.id)
+
+
+async def create_indexes():
+    """Sahifalash indeksini yaratadi (mavjud bazalar uchun ham; bor bo'lsa tegmaydi)."""
+    async with get_engine().begin() as conn:
+        await conn.run_sync(lambda sync_conn: seller_name_index.create(sync_conn, checkfirst=True))
+
+
+async def sellers_page(cursor_id: int = None, backward: bool = False, size: int = 20) -> tuple:
+    """
+    Sotuvchilar ro'yxatining (ism, id tartibida) bitta sahifasi: ([(seller_id, ism)], has_prev, has_next).
+    cursor_id - oldingi sahifa chegarasidagi sotuvchi: backward=False - undan keyingilar, True - oldingilar.
+    Kursordagi sotuvchi o'chirilgan yoki uning yonida sotuvchi qolmagan bo'lsa, birinchi sahifa qaytadi.
+    Sahifaning tartib raqami (OFFSET kabi O(n) COUNT) hisoblanmaydi.
+    """
+    stmt = select(Seller.id, Seller.name)
+    if cursor_id is not None:
+        cursor = tuple_(select(Seller.name).where(Seller.id == cursor_id).scalar_subquery(), literal(cursor_id))
+        stmt = stmt.where(_seller_key < cursor if backward else _seller_key > cursor)
+    if backward:
+        stmt = stmt.order_by(Seller.name.desc(), Seller.id.desc())
+    else:
+        stmt = stmt.order_by(Seller.name, Seller.id)
+
+    async with get_sessionmaker()() as session:
+        rows = (await session.execute(stmt.limit(size + 1))).all()
+    if not rows and cursor_id is not None:
+        return await sellers_page(None, False, size)
+
+    more = len(rows) > size
+    rows = [(seller_id, name) for seller_id, name in rows[:size]]
+    if backward:
+        rows.reverse()
+
+    has_prev = more if backward else cursor_id is not None
+    has_next = cursor_id is not None if backward else more
+    return rows, has_prev, has_next
@@ -0,0 +1,78 @@
+# stats.py
+
+import os
+import time
+import logging
+
+from ledger import debt_ledger
+from history import handout_history
+
+logger = logging.getLogger(__name__)
+
+# --- 1. SOZLAMALAR ---
+STATS_CACHE_TTL = float(os.getenv("STATS_CACHE_TTL", "60")) # soniya
+STATS_DEBT_THRESHOLD = int(os.getenv("STATS_DEBT_THRESHOLD", "1000000")) # so'm
+STATS_PERIOD_DAYS = int(os.getenv("STATS_PERIOD_DAYS", "30")) # "eng ko'p berilgan" uchun davr
+STATS_TOP_PRODUCTS = int(os.getenv("STATS_TOP_PRODUCTS", "10"))
+
+
+# --- 2. ADMIN HISOBOTI (DASHBOARD) ---
+
+class AdminDashboard:
+    """
+    /stats hisoboti uchun ko'rsatkichlar. Qarzdorlik ko'rsatkichlari qarzdorlik daftaridan
+    (xotirada, har sotuvchi uchun DB ga so'rov yo'q), tovar berish ko'rsatkichlari esa
+    tarix jadvalidan bittadan GROUP BY so'rovi bilan olinadi.
+
+    Natija qisqa muddat keshlanadi. Daftar yoki tarixga yozuv qo'shilsa (version o'zgarsa),
+    kesh muddatidan oldin ham eskirgan hisoblanadi.
+    """
+
+    def __init__(self, ledger=debt_ledger, history=handout_history, ttl: float = STATS_CACHE_TTL,
+                 period_days: int = STATS_PERIOD_DAYS, top_limit: int = STATS_TOP_PRODUCTS):
+        self.ledger = ledger
+        self.history = history
+        self.ttl = ttl
+        self.period_days = period_days
+        self.top_limit = top_limit
+        self._cache = {} # chegara -> (muddati, versiya, natija)
+
+        # Statistika
+        self.hits = 0
+        self.misses = 0
+
+    def _version(self) -> tuple:
+        return (self.ledger.version, self.history.version)
+
+    async def snapshot(self, threshold: int = STATS_DEBT_THRESHOLD) -> dict:
+        """Hisobot ko'rsatkichlari (keshdan yoki qayta hisoblab)."""
+        version = self._version()
+        item = self._cache.get(threshold)
+        if item and item[0] > time.monotonic() and item[1] == version:
+            self.hits += 1
+            return item[2]
+
+        self.misses += 1
+        since = time.time() - self.period_days * 86400
+        result = {
+            "total_debt": self.ledger.total(),
+            "by_neighborhood": self.ledger.debt_by_neighborhood(),
+            "over_threshold": self.ledger.sellers_over(threshold),
+            "period": await self.history.summary(start_ts=since),
+            "top_products": await self.history.top_products(since, self.top_limit),
+            "generated_at": time.time(),
+        }
+        # Boshqa chegaralar uchun eski natijalar ham shu versiyada yaroqsiz
+        self._cache = {key: value for key, value in self._cache.items() if value[1] == version}
+        self._cache[threshold] = (time.monotonic() + self.ttl, version, result)
+        return result
+
+    def invalidate(self):
+        self._cache.clear()
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "cached": len(self._cache)}
+
+
+# Butun jarayon uchun yagona hisobot keshi
+admin_dashboard = AdminDashboard()
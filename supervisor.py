@@ -0,0 +1,98 @@
+# supervisor.py
+
+import os
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+# --- 1. SOZLAMALAR ---
+# Bir vaqtda ishlaydigan fon vazifalari soni va to'xtashda ularni kutish muddati (soniya)
+TASKS_MAX_CONCURRENCY = int(os.getenv("TASKS_MAX_CONCURRENCY", "20"))
+SHUTDOWN_TIMEOUT = float(os.getenv("SHUTDOWN_TIMEOUT", "10"))
+
+
+# --- 2. FON VAZIFALARI NAZORATCHISI ---
+
+class TaskSupervisor:
+    """
+    Barcha fon vazifalarini (asyncio.Task) ro'yxatga oladi, bir vaqtda ishlashini cheklaydi
+    va bot to'xtaganda ularni belgilangan muddat ichida yakunlashga imkon beradi.
+    """
+
+    def __init__(self, max_concurrency: int = TASKS_MAX_CONCURRENCY):
+        self._semaphore = asyncio.Semaphore(max(1, max_concurrency))
+        self._tasks = set() # Kuchli havola - vazifalar garbage collector tomonidan yo'qolmaydi
+        self._closing = False
+
+        # Statistika
+        self.started = 0
+        self.finished = 0
+        self.failed = 0
+        self.dropped = 0
+
+    def spawn(self, coro, name: str = None):
+        """Korutinani fon vazifasi sifatida ishga tushiradi. To'xtash jarayonida None qaytaradi."""
+        if self._closing:
+            coro.close()
+            self.dropped += 1
+            logger.warning(f"Bot to'xtamoqda, yangi fon vazifasi qabul qilinmadi: {name}")
+            return None
+
+        task = asyncio.create_task(self._guarded(coro), name=name)
+        self._tasks.add(task)
+        task.add_done_callback(self._on_done)
+        self.started += 1
+        return task
+
+    async def _guarded(self, coro):
+        try:
+            async with self._semaphore:
+                return await coro
+        finally:
+            # Navbatda kutib turgan paytda bekor qilinsa, korutina hech qachon ishga tushmaydi
+            coro.close()
+
+    def _on_done(self, task: asyncio.Task):
+        self._tasks.discard(task)
+        if task.cancelled():
+            self.dropped += 1
+        elif task.exception() is not None:
+            self.failed += 1
+            logger.error(f"Fon vazifasida xato ({task.get_name()}): {task.exception()}")
+        else:
+            self.finished += 1
+
+    @property
+    def active(self) -> int:
+        """Hali tugamagan vazifalar soni."""
+        return len(self._tasks)
+
+    async def drain(self, timeout: float = SHUTDOWN_TIMEOUT) -> dict:
+        """
+        Yangi vazifalarni qabul qilishni to'xtatadi va mavjudlarini timeout ichida kutadi.
+        Muddatda tugamaganlari bekor qilinadi.
+        """
+        self._closing = True
+        if self._tasks:
+            logger.info(f"{len(self._tasks)} ta fon vazifasi tugashi kutilmoqda (maks. {timeout} s)...")
+            _, pending = await asyncio.wait(set(self._tasks), timeout=timeout)
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+        return self.stats()
+
+    def stats(self) -> dict:
+        """Fon vazifalari statistikasi."""
+        return {
+            "started": self.started,
+            "active": self.active,
+            "finished": self.finished,
+            "failed": self.failed,
+            "dropped": self.dropped,
+        }
+
+
+# Butun jarayon uchun yagona nazoratchi
+supervisor = TaskSupervisor()
@@ -0,0 +1,55 @@
+# tests/conftest.py
+#
+# Testlar loyiha papkasidan ishga tushiriladi:
+#     python -m pytest -q
+# Lokal SQLite fayllar (outbox, eski tarix) vaqtinchalik papkaga yo'naltiriladi, DB testlari esa
+# TEST_DATABASE_URL (standart: vaqtinchalik SQLite) da ishlaydi - ishchi bazaga hech narsa yozilmaydi.
+
+import os
+import sys
+import asyncio
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_TMP = tempfile.mkdtemp(prefix="bot_tests_")
+os.environ["OUTBOX_DB_PATH"] = os.path.join(_TMP, "outbox.sqlite3")
+os.environ["HISTORY_DB_PATH"] = os.path.join(_TMP, "history.sqlite3")
+os.environ["CREDENTIALS_DB_PATH"] = os.path.join(_TMP, "credentials.sqlite3")
+os.environ["DATABASE_URL"] = os.getenv("TEST_DATABASE_URL", f"sqlite+aiosqlite:///{_TMP}/bot.sqlite3")
+os.environ.setdefault("PASSWORD_PEPPER", "test-pepper")
+
+
+@pytest.fixture
+def run_db():
+    """
+    Asosiy DB ga tegadigan testlar uchun: scenario() toza sxemada (db_models va bot jadvallari
+    qayta yaratiladi) bitta event loop da bajariladi, oxirida engine yopiladi.
+    Ishchi muhitdagi db.py / db_models.py bo'lmasa, test o'tkazib yuboriladi.
+    """
+    pytest.importorskip("db")
+    db_models = pytest.importorskip("db_models")
+
+    import credentials
+    import history
+    from dbpool import get_engine, dispose_engine
+
+    async def prepare():
+        async with get_engine().begin() as conn:
+            for metadata in (credentials.metadata, history.metadata, db_models.Base.metadata):
+                await conn.run_sync(metadata.drop_all)
+            for metadata in (db_models.Base.metadata, history.metadata, credentials.metadata):
+                await conn.run_sync(metadata.create_all)
+
+    def run(scenario):
+        async def main():
+            try:
+                await prepare()
+                return await scenario()
+            finally:
+                await dispose_engine()
+        return asyncio.run(main())
+
+    return run
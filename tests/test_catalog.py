@@ -0,0 +1,84 @@
+# tests/test_catalog.py
+
+import pytest
+
+pytest.importorskip("db") # catalog.py db.py dan import qiladi
+
+from catalog import ProductCache, CachedProduct, ProductSearchIndex, fold_name
+
+
+@pytest.mark.parametrize("name", ["Олма", "OLMA", "  olma ", "ОЛМА"])
+def test_fold_name_ignores_case_script_and_spaces(name):
+    assert fold_name(name) == "olma"
+
+
+def test_fold_name_drops_apostrophes():
+    assert fold_name("O'rik") == fold_name("Oʻrik") == fold_name("Ўрик") == "orik"
+    assert fold_name("G‘isht  qo'ng'ir") == fold_name("Ғишт Қўнғир") == "gisht qongir"
+
+
+@pytest.fixture
+def index():
+    index = ProductSearchIndex()
+    for product_id, name in [(1, "Olma"), (2, "Olmaxon sharbati"), (3, "Shakar 1 kg"), (4, "Shaftoli"), (5, "Non")]:
+        index.add(product_id, name)
+    return index
+
+
+def test_search_by_prefix_misspelling_and_script(index):
+    assert index.search("olm")[:2] == [1, 2]
+    assert index.search("shakr")[0] == 3
+    assert index.search("шакар")[0] == 3
+    assert index.search("sha", limit=2) == [4, 3] # Teng ball - alifbo tartibida
+    assert index.search("") == [] and index.search("qwzx") == []
+
+
+def test_search_index_follows_renames_and_removals(index):
+    index.add(3, "Qand") # Nomi o'zgardi
+    index.remove(4)
+    assert 3 not in index.search("shakar") and 4 not in index.search("shaftoli")
+    assert index.search("qand") == [3]
+
+
+def test_cache_search_returns_products():
+    cache = ProductCache()
+    cache.put(CachedProduct(id=1, name="Olma", price=5000))
+    cache.put(CachedProduct(id=2, name="Nok", price=7000))
+    assert cache.search("олма") == [CachedProduct(id=1, name="Olma", price=5000)]
+
+
+async def _price_in_db(product_id: int):
+    from sqlalchemy import select
+    from db_models import Product
+    from dbpool import get_engine
+
+    async with get_engine().connect() as conn:
+        return (await conn.execute(select(Product.price).where(Product.id == product_id))).scalar()
+
+
+def test_reprice_writes_through_to_db(run_db):
+    async def scenario():
+        from db_models import Product
+        from dbpool import get_engine
+
+        async with get_engine().begin() as conn:
+            await conn.execute(Product.__table__.insert(), [{"id": 1, "name": "Olma", "price": 100}])
+        cache = ProductCache()
+        cache.put(CachedProduct(id=1, name="Olma", price=100))
+
+        product = await cache.reprice(1, 120)
+        return product, cache.get_by_name("olma"), await _price_in_db(1)
+
+    product, cached, stored = run_db(scenario)
+    assert product.price == cached.price == stored == 120
+
+
+def test_reprice_of_missing_product_leaves_cache_untouched(run_db):
+    async def scenario():
+        cache = ProductCache()
+        cache.put(CachedProduct(id=7, name="Nok", price=50))
+        with pytest.raises(LookupError):
+            await cache.reprice(7, 60)
+        return cache.get_by_id(7)
+
+    assert run_db(scenario).price == 50
@@ -0,0 +1,181 @@
+# tests/test_credentials.py
+
+import asyncio
+import sqlite3
+import time
+
+import pytest
+
+pytest.importorskip("db_models") # credentials.py db_models.py dan import qiladi
+
+from credentials import (
+    LoginThrottle, hash_password, verify_password, lookup_key, unusable_password, UNUSABLE_PASSWORD_PREFIX,
+)
+
+
+def test_hash_and_verify():
+    encoded = hash_password("maxfiy")
+    assert encoded.startswith("scrypt$") and "maxfiy" not in encoded
+    assert verify_password("maxfiy", encoded)
+    assert not verify_password("maxfiY", encoded)
+    assert not verify_password("maxfiy", "buzilgan")
+    # Tuz har safar yangi
+    assert hash_password("maxfiy") != encoded
+    assert lookup_key("maxfiy") == lookup_key("maxfiy") != lookup_key("maxfiY")
+
+
+def test_login_throttle_blocks_after_failures():
+    throttle = LoginThrottle(capacity=2, refill_seconds=60)
+    assert throttle.retry_after(1) == 0
+    throttle.fail(1)
+    throttle.fail(1)
+    assert 0 < throttle.retry_after(1) <= 60
+    assert throttle.retry_after(2) == 0
+    throttle.reset(1)
+    assert throttle.retry_after(1) == 0
+    assert throttle.blocked == 1
+
+
+async def _sellers(*rows):
+    from db_models import Seller
+    from dbpool import get_engine
+
+    async with get_engine().begin() as conn:
+        await conn.execute(Seller.__table__.insert(), [
+            {"id": seller_id, "name": f"Sotuvchi {seller_id}", "password": password}
+            for seller_id, password in rows
+        ])
+
+
+async def _seller(seller_id: int):
+    from db_models import Seller
+    from dbpool import get_engine
+    from sqlalchemy import select
+
+    async with get_engine().connect() as conn:
+        return (await conn.execute(
+            select(Seller.password, Seller.telegram_id).where(Seller.id == seller_id)
+        )).one()
+
+
+def test_legacy_password_is_migrated_on_first_login(run_db):
+    async def scenario():
+        from credentials import credential_store
+        await _sellers((1, "ochiq123"))
+
+        first = await credential_store.authenticate("ochiq123", 50)
+        stored = await _seller(1)
+        # Xeshga o'tgandan keyin ham shu parol bilan kiriladi, boshqa akkaunt esa bog'lanmaydi
+        again = await credential_store.authenticate("ochiq123", 50)
+        other = await credential_store.authenticate("ochiq123", 51)
+        found = await credential_store.find(lookup_key("ochiq123"))
+        return first, stored, again, other, found
+
+    first, (password, telegram_id), again, other, found = run_db(scenario)
+    assert first == (1, False) and again == (1, False) and other == (None, False)
+    assert password.startswith(UNUSABLE_PASSWORD_PREFIX) and telegram_id == 50
+    assert found["seller_id"] == 1 and not found["one_time"]
+
+
+def test_parallel_legacy_logins_migrate_once(run_db):
+    async def scenario():
+        from credentials import credential_store
+        await _sellers((1, "ochiq123"))
+        return await asyncio.gather(*(credential_store.authenticate("ochiq123", 50) for _ in range(3)))
+
+    assert run_db(scenario) == [(1, False)] * 3
+
+
+def test_stored_values_are_not_accepted_as_passwords(run_db):
+    async def scenario():
+        from credentials import credential_store
+        # Oldingi versiya Seller.password ga lookup_key yozgan
+        await _sellers((1, lookup_key("parol1")), (2, unusable_password()))
+        stored = (await _seller(2))[0]
+        return [
+            await credential_store.authenticate(lookup_key("parol1"), 50),
+            await credential_store.authenticate(stored, 50),
+            await credential_store.authenticate("parol1", 50),
+        ]
+
+    assert run_db(scenario) == [(None, False)] * 3
+
+
+def test_import_local_copies_hashes_and_retires_column(run_db, tmp_path):
+    path = str(tmp_path / "credentials.sqlite3")
+    local = sqlite3.connect(path)
+    local.execute(
+        "CREATE TABLE seller_credentials (seller_id INTEGER PRIMARY KEY, lookup_key TEXT, password_hash TEXT, "
+        "one_time INTEGER, expires_at REAL, updated_at REAL)"
+    )
+    local.execute(
+        "INSERT INTO seller_credentials VALUES (1, ?, ?, 0, NULL, ?)",
+        (lookup_key("yangi1"), hash_password("yangi1"), time.time()),
+    )
+    local.commit()
+    local.close()
+
+    async def scenario():
+        from credentials import credential_store
+        await _sellers((1, lookup_key("yangi1")))
+        copied = await credential_store.import_local(path)
+        return copied, (await _seller(1))[0], await credential_store.authenticate("yangi1", 50)
+
+    copied, password, login = run_db(scenario)
+    assert copied == 1 and password.startswith(UNUSABLE_PASSWORD_PREFIX)
+    assert login == (1, False)
+    assert not (tmp_path / "credentials.sqlite3").exists()
+    assert (tmp_path / "credentials.sqlite3.imported").exists()
+
+
+def test_one_time_code_is_consumed_once_and_linked_later(run_db):
+    async def scenario():
+        from credentials import credential_store
+        await _sellers((1, unusable_password()))
+        await credential_store.link_telegram(1, 50)
+
+        # Tiklash kodi eski bog'lanishni bekor qiladi
+        await credential_store.put(1, lookup_key("11112222"), hash_password("11112222"), one_time=True)
+        unlinked = (await _seller(1))[1]
+        logins = await asyncio.gather(*(credential_store.authenticate("11112222", 60) for _ in range(3)))
+        reused = await credential_store.authenticate("11112222", 60)
+
+        await credential_store.put(1, lookup_key("yangi1"), hash_password("yangi1"))
+        linked = await credential_store.link_telegram(1, 60)
+        stolen = await credential_store.link_telegram(1, 70)
+        return unlinked, logins, reused, linked, stolen, await credential_store.authenticate("yangi1", 60)
+
+    unlinked, logins, reused, linked, stolen, login = run_db(scenario)
+    assert unlinked is None
+    assert logins.count((1, True)) == 1 and logins.count((None, False)) == 2
+    assert reused == (None, False)
+    assert linked and not stolen and login == (1, False)
+
+
+def test_expired_one_time_code_is_rejected(run_db):
+    async def scenario():
+        from credentials import credential_store
+        await _sellers((1, unusable_password()))
+        await credential_store.put(1, lookup_key("11112222"), hash_password("11112222"), one_time=True, ttl=-1)
+        return await credential_store.authenticate("11112222", 60), await credential_store.is_taken(lookup_key("11112222"), 2)
+
+    login, taken = run_db(scenario)
+    assert login == (None, False)
+    # Muddati o'tgan kod ham kalitni band qilib turadi (UNIQUE indeks)
+    assert taken
+
+
+def test_create_tables_retires_passwords_of_sellers_with_hashes(run_db):
+    async def scenario():
+        from credentials import credential_store
+        await _sellers((1, lookup_key("p1")), (2, "ochiq2"), (3, "ochiq3"))
+        await credential_store.put(1, lookup_key("p1"), hash_password("p1"))
+        await credential_store.put(2, lookup_key("p2"), hash_password("p2"))
+
+        await credential_store.create_tables()
+        return [(await _seller(seller_id))[0] for seller_id in (1, 2, 3)]
+
+    first, second, legacy = run_db(scenario)
+    assert first.startswith(UNUSABLE_PASSWORD_PREFIX) and second.startswith(UNUSABLE_PASSWORD_PREFIX)
+    # Xeshi yo'q sotuvchining paroli birinchi kirishda ko'chiriladi - unga tegilmaydi
+    assert legacy == "ochiq3"
@@ -0,0 +1,84 @@
+# tests/test_fsm_storage.py
+
+import asyncio
+
+import pytest
+
+pytest.importorskip("aiogram")
+
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State, StatesGroup
+from aiogram.fsm.storage.base import StorageKey
+
+from fsm_storage import SQLiteStorage
+
+
+class AddSeller(StatesGroup):
+    name = State()
+
+
+def _storage_key(user_id: int = 7) -> StorageKey:
+    return StorageKey(bot_id=1, chat_id=user_id, user_id=user_id)
+
+
+def test_state_and_data_round_trip(tmp_path):
+    async def scenario():
+        storage = SQLiteStorage(str(tmp_path / "fsm.sqlite3"))
+        key = _storage_key()
+        empty = (await storage.get_state(key), await storage.get_data(key))
+
+        await storage.set_state(key, AddSeller.name)
+        await storage.set_data(key, {"ism": "G'ulom", "narx": 12_000, "qatorlar": [1, 2]})
+        stored = (await storage.get_state(key), await storage.get_data(key))
+        other = await storage.get_state(_storage_key(8))
+        await storage.close()
+        return empty, stored, other
+
+    empty, stored, other = asyncio.run(scenario())
+    assert empty == (None, {})
+    assert stored == ("AddSeller:name", {"ism": "G'ulom", "narx": 12_000, "qatorlar": [1, 2]})
+    assert other is None
+
+
+def test_state_survives_restart_and_clear_removes_it(tmp_path):
+    path = str(tmp_path / "fsm.sqlite3")
+
+    async def scenario():
+        storage = SQLiteStorage(path)
+        await storage.set_state(_storage_key(), AddSeller.name)
+        await storage.set_data(_storage_key(), {"a": 1})
+        await storage.close()
+
+        restarted = SQLiteStorage(path)
+        context = FSMContext(storage=restarted, key=_storage_key())
+        before = (await context.get_state(), await context.get_data())
+        await context.clear()
+        after = (await context.get_state(), await context.get_data())
+        await restarted.close()
+        return before, after
+
+    before, after = asyncio.run(scenario())
+    assert before == ("AddSeller:name", {"a": 1})
+    assert after == (None, {})
+
+
+def test_expired_state_is_not_read(tmp_path):
+    async def scenario():
+        storage = SQLiteStorage(str(tmp_path / "fsm.sqlite3"), ttl=-1)
+        await storage.set_state(_storage_key(), AddSeller.name)
+        state = await storage.get_state(_storage_key())
+        await storage.close()
+        return state
+
+    assert asyncio.run(scenario()) is None
+
+
+def test_parallel_writes_for_different_users(tmp_path):
+    async def scenario():
+        storage = SQLiteStorage(str(tmp_path / "fsm.sqlite3"))
+        await asyncio.gather(*(storage.set_data(_storage_key(user_id), {"id": user_id}) for user_id in range(20)))
+        data = await asyncio.gather(*(storage.get_data(_storage_key(user_id)) for user_id in range(20)))
+        await storage.close()
+        return data
+
+    assert asyncio.run(scenario()) == [{"id": user_id} for user_id in range(20)]
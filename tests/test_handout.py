@@ -0,0 +1,66 @@
+# tests/test_handout.py
+
+import pytest
+
+pytest.importorskip("db") # catalog.py db.py dan import qiladi
+
+from catalog import ProductCache, CachedProduct
+from handout import parse_handout_lines, BULK_HANDOUT_MAX_LINES
+
+
+@pytest.fixture
+def catalog():
+    cache = ProductCache()
+    cache.put(CachedProduct(id=1, name="Olma", price=5000))
+    cache.put(CachedProduct(id=2, name="Cola 1", price=9000))
+    cache.put(CachedProduct(id=3, name="Shakar 1 kg", price=14000))
+    return cache
+
+
+def test_existing_products_use_catalog_price(catalog):
+    lines, errors = parse_handout_lines("Olma 10\n\n  shakar 1 kg   3 ", catalog)
+    assert errors == []
+    assert [(l.line_no, l.name, l.quantity, l.price, l.product.id) for l in lines] == [
+        (1, "Olma", 10, 5000, 1),
+        (3, "Shakar 1 kg", 3, 14000, 3),
+    ]
+    assert lines[0].total_cost == 50000
+
+
+def test_new_product_requires_price(catalog):
+    lines, errors = parse_handout_lines("Nok 4 7_500\nUzum 2", catalog)
+    assert [(l.name, l.quantity, l.price, l.product) for l in lines] == [("Nok", 4, 7500, None)]
+    assert len(errors) == 1 and errors[0].startswith("2-qator:") and "Uzum" in errors[0]
+
+
+def test_name_ending_with_number_prefers_catalog(catalog):
+    # "Cola 1 5": katalogdagi "Cola 1" dan 5 dona
+    lines, errors = parse_handout_lines("Cola 1 5", catalog)
+    assert errors == []
+    assert (lines[0].name, lines[0].quantity, lines[0].price) == ("Cola 1", 5, 9000)
+
+
+def test_price_conflicting_with_catalog_is_rejected(catalog):
+    lines, errors = parse_handout_lines("Olma 3 4000", catalog)
+    assert lines == []
+    assert len(errors) == 1 and "1-qator" in errors[0]
+
+
+@pytest.mark.parametrize("text", ["Olma", "Olma 0", "Olma -2", "Olma ²", "Olma 2.5"])
+def test_invalid_quantity(catalog, text):
+    lines, errors = parse_handout_lines(text, catalog)
+    assert lines == [] and len(errors) == 1
+
+
+def test_empty_and_too_long_lists(catalog):
+    assert parse_handout_lines(" \n \n", catalog) == ([], ["Ro'yxat bo'sh."])
+
+    lines, errors = parse_handout_lines("Olma 1\n" * (BULK_HANDOUT_MAX_LINES + 1), catalog)
+    assert lines == [] and "juda uzun" in errors[0]
+
+
+def test_error_messages_escape_markdown_in_names(catalog):
+    catalog.put(CachedProduct(id=4, name="Cola_zero", price=7000))
+    _, errors = parse_handout_lines("Yangi*mahsulot 2\nCola_zero 1 6000", catalog)
+    assert errors[0] == "1-qator: **Yangi\\*mahsulot** bazada topilmadi. Yangi mahsulot uchun narxni ham yozing."
+    assert errors[1].startswith("2-qator: **Cola\\_zero** katalogda")
@@ -0,0 +1,32 @@
+# tests/test_history.py
+
+import pytest
+
+pytest.importorskip("sqlalchemy") # history.py jadvallari SQLAlchemy Core da
+
+
+def test_iter_between_merges_handouts_and_entries_in_time_order(run_db):
+    async def scenario():
+        from history import handout_history, ENTRY_PAYMENT, HANDOUT_NOTE, PAYMENT_NOTE
+
+        await handout_history.record_many(1, "Ali", [("h1", 1, "Olma", 2, 100)])
+        await handout_history.record_entries(ENTRY_PAYMENT, 1, "Ali", [("p1", None, None, None, None, 150)])
+        await handout_history.record_many(1, "Ali", [("h2", 2, "Nok", 1, 50), ("h3", 1, "Olma", 1, 100)])
+        rows = [row[1:] async for row in handout_history.iter_between(0, float("inf"), batch_size=1)]
+        return rows, HANDOUT_NOTE, PAYMENT_NOTE
+
+    rows, handout_note, payment_note = run_db(scenario)
+    assert rows == [
+        ["Ali", "Olma", 2, 100, 200, handout_note, "h1"],
+        ["Ali", "", "", "", -150, payment_note, "p1"],
+        ["Ali", "Nok", 1, 50, 50, handout_note, "h2"],
+        ["Ali", "Olma", 1, 100, 100, handout_note, "h3"],
+    ]
+
+
+def test_iter_between_of_empty_history(run_db):
+    async def scenario():
+        from history import handout_history
+        return [row async for row in handout_history.iter_between(0, float("inf"))]
+
+    assert run_db(scenario) == []
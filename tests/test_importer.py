@@ -0,0 +1,89 @@
+# tests/test_importer.py
+
+import io
+import asyncio
+
+import pytest
+
+pytest.importorskip("db_models") # importer.py catalog.py va credentials.py orqali DB modellaridan foydalanadi
+
+from importer import iter_rows, iter_chunks, import_products, import_sellers
+
+
+def _csv(text: str) -> io.BytesIO:
+    return io.BytesIO(text.encode("utf-8"))
+
+
+async def _collect(rows, size):
+    return [chunk async for chunk in iter_chunks(rows, size)]
+
+
+def test_csv_rows_are_read_in_chunks():
+    rows = iter_rows("mahsulotlar.csv", _csv("nomi;narxi\nOlma;100\n\nNok;50\nUzum;70\n"))
+    chunks = asyncio.run(_collect(rows, 2))
+    assert chunks == [
+        [(1, ["nomi", "narxi"]), (2, ["Olma", "100"])],
+        [(4, ["Nok", "50"]), (5, ["Uzum", "70"])],
+    ]
+
+
+async def _products():
+    from sqlalchemy import select
+    from db_models import Product
+    from dbpool import get_engine
+
+    async with get_engine().connect() as conn:
+        return dict((await conn.execute(select(Product.name, Product.price))).all())
+
+
+def test_import_products_upserts_and_refreshes_cache(run_db):
+    async def scenario():
+        from db_models import Product
+        from dbpool import get_engine
+        from catalog import product_cache, CachedProduct
+
+        async with get_engine().begin() as conn:
+            await conn.execute(Product.__table__.insert(), [
+                {"id": 1, "name": "Olma", "price": 100}, {"id": 2, "name": "Nok", "price": 50},
+                {"id": 3, "name": "Anor", "price": 90}, # Keshda yo'q (boshqa jarayon qo'shgan)
+            ])
+        product_cache.put(CachedProduct(id=1, name="Olma", price=100))
+        product_cache.put(CachedProduct(id=2, name="Nok", price=50))
+
+        rows = iter_rows("p.csv", _csv("nomi,narxi\nolma,120\nNok,50\nUzum,70\nAnor,95\nXato,abc\n"))
+        result = await import_products(rows)
+        return result, await _products(), product_cache.get_by_name("olma"), product_cache.get_by_name("uzum")
+
+    result, stored, olma, uzum = run_db(scenario)
+    assert (result.processed, result.created, result.updated) == (5, 1, 2)
+    assert [line_no for line_no, _, _ in result.errors] == [6]
+    assert stored == {"Olma": 120, "Nok": 50, "Anor": 95, "Uzum": 70}
+    assert olma.price == 120 and uzum.price == 70
+
+
+def test_failed_seller_import_leaves_no_seller(run_db, monkeypatch):
+    async def scenario():
+        from sqlalchemy import select, func
+        from db_models import Seller
+        from dbpool import get_engine
+        from credentials import credential_store
+
+        rows = iter_rows("s.csv", _csv("ismi,mahallasi,telefon,parol\nAli,Markaz,901,parol1\n"))
+        first = await import_sellers(rows)
+
+        # Kalit tekshiruvidan o'tib ketgan (parallel) import: parol yozilmasa, sotuvchi ham qolmasligi kerak
+        async def not_taken(key, seller_id=None):
+            return False
+        monkeypatch.setattr(credential_store, "is_taken", not_taken)
+        rows = iter_rows("s.csv", _csv("Vali,Bozor,902,parol1\n"))
+        second = await import_sellers(rows)
+
+        async with get_engine().connect() as conn:
+            names = (await conn.execute(select(Seller.name))).scalars().all()
+        return first, second, names
+
+    first, second, names = run_db(scenario)
+    assert first.created == 1 and first.errors == []
+    assert second.created == 0 and len(second.errors) == 1
+    assert second.errors[0][1][3] == "***"
+    assert names == ["Ali"]
@@ -0,0 +1,92 @@
+# tests/test_integration_executor.py
+
+import asyncio
+import threading
+
+import pytest
+
+from integrations import IntegrationExecutor, IntegrationQueueFull
+
+
+async def _busy(executor: IntegrationExecutor):
+    """Yagona ishchi oqimni gate ochilguncha band qiladi."""
+    gate = threading.Event()
+    task = asyncio.create_task(executor.run(gate.wait, 5))
+    await asyncio.sleep(0.05)
+    return gate, task
+
+
+def test_spill_rejects_only_sheets_calls():
+    async def scenario():
+        executor = IntegrationExecutor(workers=1, queue_size=1, overflow="spill")
+        gate, busy = await _busy(executor)
+        queued = asyncio.create_task(executor.run(lambda: "jurnal"))
+        await asyncio.sleep(0)
+
+        with pytest.raises(IntegrationQueueFull):
+            await executor.run(lambda: "sheets", droppable=True)
+
+        # Jurnal yozuvi tashlanmaydi - joy bo'shaguncha kutadi
+        journal = asyncio.create_task(executor.run(lambda: "jurnal 2"))
+        await asyncio.sleep(0.05)
+        assert not journal.done()
+
+        gate.set()
+        results = await asyncio.gather(busy, queued, journal)
+        executor.shutdown()
+        return results, executor.stats()
+
+    results, stats = asyncio.run(scenario())
+    assert results == [True, "jurnal", "jurnal 2"]
+    assert stats["spilled"] == 1 and stats["dropped"] == 0
+    assert stats["running"] == 0 and stats["queue_depth"] == 0
+
+
+def test_drop_oldest_cancels_waiting_sheets_call():
+    async def scenario():
+        executor = IntegrationExecutor(workers=1, queue_size=1, overflow="drop_oldest")
+        gate, busy = await _busy(executor)
+        sheets = asyncio.create_task(executor.run(lambda: "sheets", droppable=True))
+        await asyncio.sleep(0)
+
+        journal = asyncio.create_task(executor.run(lambda: "jurnal"))
+        await asyncio.sleep(0)
+        with pytest.raises(IntegrationQueueFull):
+            await sheets
+
+        gate.set()
+        results = await asyncio.gather(busy, journal)
+        executor.shutdown()
+        return results, executor.stats()
+
+    results, stats = asyncio.run(scenario())
+    assert results == [True, "jurnal"]
+    assert stats["dropped"] == 1 and stats["running"] == 0
+
+
+def test_cancelled_waiter_releases_its_place():
+    async def scenario():
+        executor = IntegrationExecutor(workers=1, queue_size=1)
+        gate, busy = await _busy(executor)
+        waiting = asyncio.create_task(executor.run(lambda: "bekor"))
+        await asyncio.sleep(0)
+        waiting.cancel()
+        await asyncio.sleep(0)
+
+        # Bekor qilingan ishning joyi bo'shadi - keyingi ish navbatga sig'adi
+        nxt = asyncio.create_task(executor.run(lambda: "keyingi"))
+        gate.set()
+        result = await asyncio.wait_for(nxt, timeout=2)
+        await busy
+        executor.shutdown()
+        return waiting.cancelled(), result, executor.stats()
+
+    cancelled, result, stats = asyncio.run(scenario())
+    assert cancelled and result == "keyingi"
+    assert stats["running"] == 0 and stats["queue_depth"] == 0
+
+
+def test_unknown_policy_falls_back_to_block():
+    executor = IntegrationExecutor(workers=1, queue_size=1, overflow="nimadir")
+    assert executor.overflow == "block"
+    executor.shutdown()
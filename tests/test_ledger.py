@@ -0,0 +1,136 @@
+# tests/test_ledger.py
+
+import asyncio
+
+import pytest
+
+
+async def _seed():
+    from db_models import Seller, Product
+    from dbpool import get_engine
+
+    async with get_engine().begin() as conn:
+        await conn.execute(Seller.__table__.insert(), [
+            {"id": 1, "name": "Ali", "neighborhood": "Markaz"},
+            {"id": 2, "name": "Bek", "neighborhood": "Bozor"},
+        ])
+        await conn.execute(Product.__table__.insert(), [
+            {"id": 1, "name": "Olma", "price": 100},
+            {"id": 2, "name": "Nok", "price": 50},
+        ])
+
+    from ledger import DebtLedger
+    ledger = DebtLedger()
+    await ledger.load()
+    await ledger.add_handouts(1, "Ali", [("h:1", 1, "Olma", 3, 100), ("h:2", 2, "Nok", 2, 50)])
+    return ledger
+
+
+def test_repeated_payment_is_recorded_once(run_db):
+    async def scenario():
+        from history import handout_history
+        ledger = await _seed()
+
+        first = await ledger.add_payment(1, "Ali", 150, "p:1")
+        again = await ledger.add_payment(1, "Ali", 150, "p:1")
+        return first, again, ledger.balance(1), await handout_history.paid_total(1), await ledger.reconcile()
+
+    (created_at, balance), again, cached, paid, mismatches = run_db(scenario)
+    assert created_at is not None and balance == 250
+    # Qayta yetkazilgan update: yozuv yo'q, balans o'zgarmagan
+    assert again == (None, 250)
+    assert cached == 250 and paid == 150 and mismatches == []
+
+
+def test_parallel_duplicate_payments_are_recorded_once(run_db):
+    async def scenario():
+        from history import handout_history
+        ledger = await _seed()
+
+        results = await asyncio.gather(*(ledger.add_payment(1, "Ali", 100, "p:1") for _ in range(3)))
+        return results, await handout_history.paid_total(1), ledger.balance(1)
+
+    results, paid, balance = run_db(scenario)
+    assert sum(created_at is not None for created_at, _ in results) == 1
+    assert paid == 100 and balance == 300
+
+
+def test_overpayment_and_unknown_seller_are_rejected(run_db):
+    async def scenario():
+        from history import handout_history
+        ledger = await _seed()
+
+        with pytest.raises(ValueError):
+            await ledger.add_payment(1, "Ali", 1000, "p:1")
+        with pytest.raises(ValueError):
+            await ledger.add_payment(9, "Yo'q", 1, "p:2")
+        # Rad etilgan to'lovning ID si band bo'lib qolmagan
+        created_at, balance = await ledger.add_payment(1, "Ali", 400, "p:1")
+        return created_at, balance, await handout_history.paid_total(1)
+
+    created_at, balance, paid = run_db(scenario)
+    assert created_at is not None and balance == 0 and paid == 400
+
+
+def test_returns_are_idempotent_and_bounded_by_stock(run_db):
+    async def scenario():
+        ledger = await _seed()
+
+        with pytest.raises(ValueError):
+            await ledger.add_returns(1, "Ali", [("r:1", 1, "Olma", 2), ("r:2", 1, "Olma", 2)])
+        first = await ledger.add_returns(1, "Ali", [("r:1", 1, "Olma", 2)])
+        again = await ledger.add_returns(1, "Ali", [("r:1", 1, "Olma", 2)])
+        return first, again, ledger.balance(1), await ledger.reconcile()
+
+    (created_at, entries), again, balance, mismatches = run_db(scenario)
+    assert created_at is not None and entries == [("r:1", 1, "Olma", 2, 100, 200)]
+    assert again == (None, [])
+    assert balance == 200 and mismatches == []
+
+
+def test_parallel_duplicate_handouts_add_stock_once(run_db):
+    async def scenario():
+        from queries import seller_balances
+        ledger = await _seed()
+
+        results = await asyncio.gather(*(
+            ledger.add_handout(2, "Bek", "h:9", 2, "Nok", 4, 50) for _ in range(3)
+        ))
+        return results, await seller_balances([2])
+
+    results, balances = run_db(scenario)
+    assert sum(created_at is not None for created_at, _ in results) == 1
+    assert balances == [(2, "Bek", "Bozor", 200, 0)]
+
+
+def test_deltas_match_reconcile_after_mixed_writes(run_db):
+    async def scenario():
+        ledger = await _seed()
+
+        await asyncio.gather(
+            ledger.add_handout(1, "Ali", "h:3", 2, "Nok", 4, 50),
+            ledger.add_payment(1, "Ali", 120, "p:1"),
+            ledger.add_handouts(2, "Bek", [("h:4", 1, "Olma", 1, 100)]),
+        )
+        await ledger.add_returns(1, "Ali", [("r:1", 2, "Nok", 1)])
+        return ledger.balance(1), ledger.balance(2), ledger.total(), await ledger.reconcile()
+
+    first, second, total, mismatches = run_db(scenario)
+    # Ali: 300 + 100 (olma, nok) + 200 (nok) - 120 (to'lov) - 50 (qaytarish)
+    assert (first, second, total) == (430, 100, 530)
+    assert mismatches == []
+
+
+def test_writes_before_load_use_db_balance(run_db):
+    async def scenario():
+        from ledger import DebtLedger
+        ledger = await _seed()
+
+        # Yuklanmagan daftar: xotirada asos yo'q, balans DB dan olinadi
+        fresh = DebtLedger()
+        _, balance = await fresh.add_payment(1, "Ali", 100, "p:1")
+        await fresh.load()
+        return balance, fresh.balance(1), await fresh.reconcile()
+
+    balance, loaded, mismatches = run_db(scenario)
+    assert balance == loaded == 300 and mismatches == []
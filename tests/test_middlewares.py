@@ -0,0 +1,86 @@
+# tests/test_middlewares.py
+
+import asyncio
+import datetime
+
+import pytest
+
+pytest.importorskip("aiogram")
+pytest.importorskip("db") # middlewares.py sotuvchi sessiyasi uchun db.py dan import qiladi
+
+from aiogram.types import CallbackQuery, Chat, Message, User
+
+from middlewares import ThrottleMiddleware, THROTTLE_NOTICE
+
+ADMIN = User(id=1, is_bot=False, first_name="Admin")
+SELLER = User(id=2, is_bot=False, first_name="Sotuvchi")
+
+
+def _message(user: User, message_id: int, text: str = "1") -> Message:
+    return Message(
+        message_id=message_id, date=datetime.datetime.now(), text=text,
+        chat=Chat(id=user.id, type="private"), from_user=user,
+    )
+
+
+def _callback(user: User, message_id: int, data: str, query_id: str) -> CallbackQuery:
+    return CallbackQuery(
+        id=query_id, from_user=user, chat_instance="c", data=data, message=_message(user, message_id),
+    )
+
+
+@pytest.fixture
+def replies(monkeypatch):
+    sent = []
+
+    async def answer(self, text=None, *args, **kwargs):
+        sent.append((type(self).__name__, text))
+
+    monkeypatch.setattr(Message, "answer", answer)
+    monkeypatch.setattr(CallbackQuery, "answer", answer)
+    return sent
+
+
+def _feed(middleware: ThrottleMiddleware, events: list) -> list:
+    handled = []
+
+    async def handler(event, data):
+        handled.append(event)
+
+    async def run():
+        for event in events:
+            await middleware(handler, event, {"event_from_user": event.from_user})
+
+    asyncio.run(run())
+    return handled
+
+
+def test_repeated_text_in_new_messages_is_not_deduplicated(replies):
+    # FSM qadamida bir xil javob (masalan, "1") ketma-ket yuborilishi mumkin
+    middleware = ThrottleMiddleware(burst=10, exempt_user_ids={ADMIN.id})
+    handled = _feed(middleware, [_message(ADMIN, 10), _message(ADMIN, 11), _message(SELLER, 12), _message(SELLER, 13)])
+    assert len(handled) == 4 and middleware.duplicates == 0
+
+
+def test_redelivered_update_and_double_tapped_button_are_dropped(replies):
+    middleware = ThrottleMiddleware(burst=10)
+    handled = _feed(middleware, [
+        _message(SELLER, 10), _message(SELLER, 10),
+        _callback(SELLER, 20, "confirm", "q1"), _callback(SELLER, 20, "confirm", "q2"),
+        _callback(SELLER, 21, "confirm", "q3"), # Boshqa xabardagi tugma
+    ])
+    assert len(handled) == 3 and middleware.duplicates == 2
+    assert replies == [("CallbackQuery", None)]
+
+
+def test_throttled_user_is_told_once_per_interval(replies):
+    middleware = ThrottleMiddleware(burst=1, per_second=0.01, notice_interval=60)
+    handled = _feed(middleware, [_message(SELLER, i) for i in range(4)] + [_callback(SELLER, 9, "x", "q")])
+    assert len(handled) == 1 and middleware.throttled == 4
+    assert replies == [("Message", THROTTLE_NOTICE), ("CallbackQuery", THROTTLE_NOTICE)]
+
+
+def test_admin_is_not_rate_limited(replies):
+    middleware = ThrottleMiddleware(burst=1, per_second=0.01, exempt_user_ids={ADMIN.id})
+    handled = _feed(middleware, [_message(ADMIN, i) for i in range(5)])
+    assert len(handled) == 5 and replies == []
@@ -0,0 +1,51 @@
+# tests/test_outbox.py
+
+import pytest
+
+from outbox import SheetsOutbox
+
+
+@pytest.fixture
+def outbox(tmp_path):
+    journal = SheetsOutbox(str(tmp_path / "outbox.sqlite3"))
+    yield journal
+    journal.close()
+
+
+def test_put_is_idempotent(outbox):
+    assert outbox.put("t1", ["a", 1]) is True
+    assert outbox.put("t1", ["a", 2]) is False
+    assert outbox.put_many([("t1", ["a", 3]), ("t2", ["b", 1]), ("t2", ["b", 2])]) == 1
+
+    assert [(key, row) for _, key, row, _ in outbox.pending(10)] == [("t1", ["a", 1]), ("t2", ["b", 1])]
+    assert outbox.pending_keys() == {"t1", "t2"}
+
+
+def test_attempts_and_sent_rows(outbox):
+    outbox.put_many([(f"t{i}", [i]) for i in range(3)])
+    ids = [row_id for row_id, _, _, _ in outbox.pending(2)]
+
+    outbox.mark_attempt(ids)
+    assert [attempts for _, _, _, attempts in outbox.pending(10)] == [1, 1, 0]
+
+    outbox.mark_sent(ids)
+    assert outbox.pending_count() == 1
+    assert outbox.pending_keys() == {"t2"}
+    # Yuborilgan qatorlar saqlanish muddati tugamaguncha o'chirilmaydi
+    assert outbox.purge_sent() == 0
+    assert outbox.purge_sent(retention_days=-1) == 2
+
+
+def test_failed_batch_is_rolled_back(outbox):
+    outbox.put("t1", [1])
+    (row_id, _, _, _), = outbox.pending(1)
+
+    # Ikkinchi parametr SQLite ga o'tkazib bo'lmaydigan qiymat - butun paket bekor qilinadi
+    with pytest.raises(Exception):
+        outbox.mark_sent([row_id, object()])
+    assert outbox.pending_count() == 1
+
+    # Ulanish ochiq tranzaksiyada qolib ketmagan
+    assert outbox.put_many([("t2", [2])]) == 1
+    outbox.mark_sent([row_id])
+    assert outbox.pending_keys() == {"t2"}
@@ -0,0 +1,85 @@
+# tests/test_outgoing.py
+
+import asyncio
+
+import pytest
+
+pytest.importorskip("aiogram")
+
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import SendMessage
+
+import outgoing
+from outgoing import RateLimiter, SendGovernor
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Soxta vaqt: asyncio.sleep haqiqatda kutmaydi, faqat soatni suradi."""
+    now = [1000.0]
+
+    async def sleep(seconds):
+        now[0] += seconds
+
+    monkeypatch.setattr(outgoing.time, "monotonic", lambda: now[0])
+    monkeypatch.setattr(outgoing.asyncio, "sleep", sleep)
+    return now
+
+
+def test_burst_passes_then_rate_applies(clock):
+    limiter = RateLimiter(rate=2, burst=3)
+    waits = [limiter.reserve() for _ in range(5)]
+    assert waits == [0.0, 0.0, 0.0, 0.5, 1.0]
+
+
+def test_pause_blocks_burst_too(clock):
+    limiter = RateLimiter(rate=10, burst=5)
+    limiter.pause(3)
+    waits = [limiter.reserve() for _ in range(2)]
+    assert waits == pytest.approx([3.0, 3.1])
+
+
+def test_retry_after_pauses_chat_and_global_limiters(clock):
+    governor = SendGovernor(global_rate=100, global_burst=10, chat_rate=100, chat_burst=10, max_retries=0)
+    calls = []
+
+    async def make_request(bot, method):
+        calls.append((method.chat_id, clock[0]))
+        if len(calls) == 1:
+            raise TelegramRetryAfter(method=method, message="Too Many Requests", retry_after=5)
+        return True
+
+    async def scenario():
+        with pytest.raises(TelegramRetryAfter):
+            await governor(make_request, None, SendMessage(chat_id=1, text="a"))
+        # Boshqa chatga yuborish ham umumiy pauza tugashini kutadi
+        await governor(make_request, None, SendMessage(chat_id=2, text="b"))
+
+    asyncio.run(scenario())
+    assert calls == [(1, 1000.0), (2, 1005.0)]
+    assert governor.failed == 1 and governor.sent == 1
+
+
+def test_request_is_retried_after_pause(clock):
+    governor = SendGovernor(max_retries=1)
+    calls = []
+
+    async def make_request(bot, method):
+        calls.append(clock[0])
+        if len(calls) == 1:
+            raise TelegramRetryAfter(method=method, message="Too Many Requests", retry_after=2)
+        return True
+
+    assert asyncio.run(governor(make_request, None, SendMessage(chat_id=1, text="a"))) is True
+    assert calls == [1000.0, 1002.0] and governor.retries == 1
+
+
+def test_retries_are_bounded(clock):
+    governor = SendGovernor(max_retries=2)
+
+    async def make_request(bot, method):
+        raise TelegramRetryAfter(method=method, message="Too Many Requests", retry_after=1)
+
+    with pytest.raises(TelegramRetryAfter):
+        asyncio.run(governor(make_request, None, SendMessage(chat_id=1, text="a")))
+    assert governor.retries == 2 and governor.failed == 1
@@ -0,0 +1,74 @@
+# tests/test_pagination.py
+
+import pytest
+
+pytest.importorskip("aiogram") # pagination.py tugmalar uchun aiogram dan import qiladi
+
+from pagination import keyset_page, nav_buttons, parse_page_callback
+
+
+def _key(item):
+    return item
+
+
+# Bir xil ismli sotuvchilar: kalit (ism, id)
+ITEMS = [("Ali", 1), ("Ali", 2), ("Ali", 3), ("Bobur", 4), ("Vali", 5)]
+
+
+def test_pages_forward_and_back_with_duplicate_names():
+    first = keyset_page(ITEMS, _key, size=2)
+    assert first.items == ITEMS[:2] and not first.has_prev and first.has_next
+
+    second = keyset_page(ITEMS, _key, first.items[-1], size=2)
+    assert second.items == ITEMS[2:4] and second.start == 2 and second.has_prev and second.has_next
+
+    last = keyset_page(ITEMS, _key, second.items[-1], size=2)
+    assert last.items == ITEMS[4:] and last.has_prev and not last.has_next
+
+    back = keyset_page(ITEMS, _key, last.items[0], backward=True, size=2)
+    assert back == second
+
+
+def test_backward_from_near_start_returns_short_first_page():
+    page = keyset_page(ITEMS, _key, ITEMS[1], backward=True, size=3)
+    assert page.items == ITEMS[:1] and not page.has_prev and page.has_next
+
+
+def test_empty_side_of_cursor_falls_back_to_first_page():
+    # Kursordan keyin/oldin element qolmagan (o'chirilgan) - bo'sh sahifa o'rniga birinchi sahifa
+    assert keyset_page(ITEMS, _key, ("Vali", 5), size=2).items == ITEMS[:2]
+    assert keyset_page(ITEMS, _key, ("Ali", 1), backward=True, size=2).items == ITEMS[:2]
+    assert keyset_page([], _key, ("Ali", 1)).items == []
+
+
+def test_nav_buttons_and_callback_round_trip():
+    page = keyset_page(ITEMS, _key, ITEMS[1], size=2)
+    buttons = nav_buttons("page_sellers", page, 3, 4)
+    assert [b.callback_data for b in buttons] == ["page_sellers_prev_3", "page_sellers_next_4"]
+    assert parse_page_callback(buttons[0].callback_data) == (True, 3)
+    assert parse_page_callback(buttons[1].callback_data) == (False, 4)
+
+
+def test_sellers_page_in_database(run_db):
+    async def scenario():
+        from db_models import Seller
+        from dbpool import get_engine
+        from queries import sellers_page, create_indexes
+
+        await create_indexes()
+        async with get_engine().begin() as conn:
+            await conn.execute(Seller.__table__.insert(), [
+                {"id": seller_id, "name": name} for name, seller_id in ITEMS
+            ])
+
+        first = await sellers_page(size=2)
+        second = await sellers_page(first[0][-1][0], size=2)
+        back = await sellers_page(second[0][0][0], backward=True, size=2)
+        gone = await sellers_page(99, size=2) # O'chirilgan sotuvchi kursori
+        return first, second, back, gone
+
+    first, second, back, gone = run_db(scenario)
+    assert first == ([(1, "Ali"), (2, "Ali")], False, True)
+    assert second == ([(3, "Ali"), (4, "Bobur")], True, True)
+    assert back == first
+    assert gone == first
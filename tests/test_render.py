@@ -0,0 +1,68 @@
+# tests/test_render.py
+
+from types import SimpleNamespace
+
+from render import (
+    number, som, escape_md, split_text, render_products, render_seller_debt, render_seller_products,
+    render_debt_total,
+)
+
+
+def test_number_and_som():
+    assert number(0) == "0"
+    assert number(12500) == "12 500"
+    assert number(-1234567) == "-1 234 567"
+    assert som(1000000) == "1 000 000 so'm"
+
+
+def test_escape_md():
+    assert escape_md("Oddiy nom") == "Oddiy nom"
+    assert escape_md("Cola_zero *2* `x` [y]") == "Cola\\_zero \\*2\\* \\`x\\` \\[y]"
+    assert escape_md(42) == "42"
+
+
+def test_split_text_respects_limit_and_lines():
+    assert split_text("qisqa", limit=10) == ["qisqa"]
+
+    lines = [f"{i}. qator" for i in range(30)]
+    chunks = split_text("\n".join(lines), limit=40)
+    assert all(len(chunk) <= 40 for chunk in chunks)
+    assert "\n".join(chunks).split("\n") == lines
+
+    # Limitdan uzun bitta qator kesiladi
+    assert split_text("a" * 25 + "\nb", limit=10) == ["a" * 10, "b"]
+
+
+def test_products_list_escapes_names_and_formats_prices():
+    products = [SimpleNamespace(name="Olma, 1 kg", price=12500), SimpleNamespace(name="Cola_zero", price=900)]
+    assert render_products(products, start=21).split("\n")[2:] == [
+        "21. **Olma, 1 kg** - *12 500 so'm*",
+        "22. **Cola\\_zero** - *900 so'm*",
+    ]
+
+
+def test_seller_debt_report():
+    items = [
+        {"product_name": "Nok*", "quantity": 3, "unit_price": 1500, "subtotal": 4500},
+        {"product_name": "Olma", "quantity": 1, "unit_price": 100000, "subtotal": 100000},
+    ]
+    text = render_seller_debt("Ali_1", "Markaz", items, 104500, paid=4500)
+    assert text.startswith("💰 **Ali\\_1** (Markaz) dagi Mahsulotlar Ro'yxati:\n")
+    assert "1. **Nok\\***\n   Miqdor: 3 dona\n   Narxi: 1 500 so'm (dona)\n   Summa: **4 500 so'm**" in text
+    assert "Qabul qilingan to'lovlar: 4 500 so'm" in text
+    assert text.endswith("**💵 JAMI QARZDORLIK SUMMASI:** **100 000 so'm**")
+
+    assert render_seller_debt("Ali", "Markaz", [], 0).endswith("(Qarzdorlik 0 so'm).")
+
+
+def test_seller_products_and_debt_total():
+    items = [{"product_name": "Olma", "quantity": 2, "unit_price": 12000}]
+    assert render_seller_products("Ali", items).endswith("1. **Olma** - 12 000 so'm\n   Miqdor: **2 dona**")
+    assert render_seller_products("Ali", []).endswith("Hozircha sizda mahsulot yo'q.")
+    assert render_debt_total("Ali", 0).endswith("Baraka toping!")
+    assert render_debt_total("Ali", 25000).endswith("**25 000 so'm**")
+
+
+def test_names_with_separator_character_are_escaped_one_by_one():
+    products = [SimpleNamespace(name="a\0_b", price=1), SimpleNamespace(name="c_d", price=2)]
+    assert render_products(products).split("\n")[2:] == ["1. **a\0\\_b** - *1 so'm*", "2. **c\\_d** - *2 so'm*"]
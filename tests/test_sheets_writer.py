@@ -0,0 +1,127 @@
+# tests/test_sheets_writer.py
+
+import asyncio
+
+import pytest
+
+import integrations
+from integrations import SheetsBatchWriter, IntegrationExecutor, IntegrationQueueFull
+from outbox import SheetsOutbox
+
+
+class FakeSheet:
+    """_sync_append_rows o'rnini bosadi: fail_times marta muvaffaqiyatsiz, keyin yozadi."""
+
+    def __init__(self, fail_times: int = 0, error: Exception = None):
+        self.fail_times = fail_times
+        self.error = error
+        self.calls = []
+        self.rows = []
+
+    def __call__(self, rows, skip_existing=False):
+        self.calls.append((len(rows), skip_existing))
+        if self.fail_times:
+            self.fail_times -= 1
+            if self.error:
+                raise self.error
+            return False
+        self.rows += rows
+        return True
+
+
+@pytest.fixture
+def outbox(tmp_path):
+    journal = SheetsOutbox(str(tmp_path / "outbox.sqlite3"))
+    yield journal
+    journal.close()
+
+
+def make_writer(outbox, **kwargs):
+    return SheetsBatchWriter(outbox, IntegrationExecutor(workers=1, queue_size=10), **kwargs)
+
+
+def test_failed_flush_keeps_rows_and_retries_with_dedup(outbox, monkeypatch):
+    sheet = FakeSheet(fail_times=1)
+    monkeypatch.setattr(integrations, "_sync_append_rows", sheet)
+
+    async def scenario():
+        writer = make_writer(outbox)
+        assert await writer.add_many([(["r1"], "t1"), (["r2"], "t2")]) == 2
+        assert await writer.add(["r1"], "t1") is False
+
+        assert await writer.flush() == 0
+        assert outbox.pending_count() == 2
+
+        # Qayta urinishda jadvaldagi mavjud ID lar tekshiriladi (skip_existing=True)
+        assert await writer.flush() == 2
+        assert outbox.pending_count() == 0
+        return writer
+
+    writer = asyncio.run(scenario())
+    assert sheet.calls == [(2, False), (2, True)]
+    assert sheet.rows == [["r1"], ["r2"]]
+    assert writer.stats()["duplicates_skipped"] == 1
+    assert writer.rows_flushed == 2 and writer.batches_flushed == 1
+
+
+def test_queue_full_leaves_rows_in_outbox(outbox, monkeypatch):
+    monkeypatch.setattr(integrations, "_sync_append_rows", FakeSheet(fail_times=1, error=IntegrationQueueFull("to'ldi")))
+
+    async def scenario():
+        writer = make_writer(outbox)
+        await writer.add(["r1"], "t1")
+        assert await writer.flush() == 0
+        assert await writer.flush() == 1
+
+    asyncio.run(scenario())
+    assert outbox.pending_count() == 0
+
+
+def test_background_loop_survives_flush_error(outbox, monkeypatch):
+    sheet = FakeSheet()
+    monkeypatch.setattr(integrations, "_sync_append_rows", sheet)
+
+    async def scenario():
+        writer = make_writer(outbox, max_delay=0, max_retry_delay=1)
+        flush = writer.flush
+        failures = []
+
+        async def flaky_flush():
+            if not failures:
+                failures.append(1)
+                raise RuntimeError("jurnal band")
+            return await flush()
+
+        writer.flush = flaky_flush
+        writer.start()
+        await writer.add(["r1"], "t1")
+        for _ in range(50):
+            if sheet.rows:
+                break
+            await asyncio.sleep(0.1)
+        await writer.stop()
+        return failures
+
+    assert asyncio.run(scenario()) == [1]
+    assert sheet.rows == [["r1"]]
+    assert outbox.pending_count() == 0
+
+
+def test_stop_leaves_unsent_rows_for_next_start(outbox, monkeypatch):
+    monkeypatch.setattr(integrations, "_sync_append_rows", FakeSheet(fail_times=100))
+
+    async def scenario():
+        writer = make_writer(outbox, max_delay=60)
+        writer.start()
+        await writer.add(["r1"], "t1")
+        await writer.stop()
+
+        # Keyingi ishga tushish jurnaldagi qatorni topadi
+        restarted = make_writer(outbox)
+        restarted.start()
+        pending = restarted._pending
+        await restarted.stop()
+        return pending
+
+    assert asyncio.run(scenario()) == 1
+    assert outbox.pending_count() == 1
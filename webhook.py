@@ -0,0 +1,93 @@
+# webhook.py
+
+import os
+import asyncio
+import signal
+import logging
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+
+logger = logging.getLogger(__name__)
+
+# --- 1. SOZLAMALAR ---
+# RUN_MODE=webhook bo'lsa bot Long Polling o'rniga aiohttp server orqali update qabul qiladi.
+# WEBHOOK_URL - tashqi manzil (masalan: https://sotuvchibot.onrender.com). Berilmasa, webhook
+# Telegramda o'rnatilmaydi - bu lokal sinov rejimi: update larni o'zingiz POST qilasiz:
+#   curl -X POST http://localhost:8080/webhook \
+#        -H "X-Telegram-Bot-Api-Secret-Token: $WEBHOOK_SECRET" \
+#        -H "Content-Type: application/json" \
+#        -d '{"update_id": 1, "message": {...}}'
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+WEBAPP_HOST = os.getenv("WEBAPP_HOST", "0.0.0.0")
+WEBAPP_PORT = int(os.getenv("PORT", "8080")) # Render.com PORT ni o'zi beradi
+HEALTH_PATH = "/healthz"
+
+
+# --- 2. AIOHTTP ILOVASI ---
+
+def build_webhook_app(dp: Dispatcher, bot: Bot, health_info=None) -> web.Application:
+    """
+    Webhook va health endpointlariga ega aiohttp ilovasini yaratadi.
+    health_info - /healthz javobiga qo'shiladigan ma'lumotlarni qaytaruvchi funksiya.
+    """
+    app = web.Application()
+
+    async def health(request: web.Request):
+        payload = {"status": "ok"}
+        if health_info:
+            payload.update(health_info())
+        return web.json_response(payload)
+
+    app.router.add_get(HEALTH_PATH, health)
+
+    # Secret token mos kelmasa so'rov 401 bilan rad etiladi.
+    # handle_in_background=True - har bir update alohida vazifada qayta ishlanadi,
+    # Telegram esa javobni kutmasdan keyingi update larni yubora oladi.
+    SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        secret_token=WEBHOOK_SECRET,
+        handle_in_background=True,
+    ).register(app, path=WEBHOOK_PATH)
+    setup_application(app, dp, bot=bot)
+    return app
+
+
+async def run_webhook(dp: Dispatcher, bot: Bot, health_info=None):
+    """Webhook serverini ishga tushiradi va SIGTERM/SIGINT kelguncha ishlaydi."""
+    if WEBHOOK_URL:
+        await bot.set_webhook(
+            url=f"{WEBHOOK_URL.rstrip('/')}{WEBHOOK_PATH}",
+            secret_token=WEBHOOK_SECRET,
+            allowed_updates=dp.resolve_used_update_types(),
+        )
+        logger.info(f"Webhook o'rnatildi: {WEBHOOK_URL.rstrip('/')}{WEBHOOK_PATH}")
+    else:
+        logger.warning("WEBHOOK_URL berilmagan: webhook Telegramda o'rnatilmadi (lokal sinov rejimi).")
+
+    if not WEBHOOK_SECRET:
+        logger.warning("WEBHOOK_SECRET berilmagan: kelayotgan so'rovlar tekshirilmaydi.")
+
+    runner = web.AppRunner(build_webhook_app(dp, bot, health_info))
+    await runner.setup()
+    site = web.TCPSite(runner, host=WEBAPP_HOST, port=WEBAPP_PORT)
+    await site.start()
+    logger.info(f"Webhook serveri ishga tushdi: {WEBAPP_HOST}:{WEBAPP_PORT}{WEBHOOK_PATH}")
+
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except NotImplementedError:
+            pass # Windows
+
+    try:
+        await stop_event.wait()
+    finally:
+        logger.info("Webhook serveri to'xtatilmoqda...")
+        await runner.cleanup()